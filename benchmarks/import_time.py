@@ -0,0 +1,93 @@
+"""Import time regression check for the CLI entry points.
+
+Importing effort.cli (which happens on every effort_grid_* invocation) and
+effort.calculate (imported by effort_grid_show and most of the other
+commands) must not import the heavy dependencies; they are imported only
+when they are used. The start up time of effort_grid_show --help, end to
+end, is measured too. Run with
+
+    python benchmarks/import_time.py
+
+Exits with a non-zero status if a heavy module is imported, or if an import
+(or effort_grid_show --help) takes longer than --max-ms milliseconds.
+"""
+
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# The modules are imported from this repository (the working directory of
+# the subprocesses), so that the check can be run without installing effort.
+ROOT = Path(__file__).resolve().parent.parent
+MODULES = ("effort", "effort.cli", "effort.calculate")
+HEAVY_MODULES = ("pynput", "sklearn", "matplotlib", "scipy")
+
+
+def get_import_times(module: str) -> dict[str, int]:
+    """Cumulative import time (microseconds) of each module imported when
+    importing module in a fresh interpreter."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=ROOT,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[12:].split("|"))
+        times[name] = int(cumulative)
+    return times
+
+
+def get_help_time() -> float:
+    """Time (seconds) of running effort_grid_show --help in a fresh
+    interpreter."""
+    start = time.perf_counter()
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys; from effort.cli import cli_effort_grid_show; sys.argv = ['effort_grid_show', '--help']; cli_effort_grid_show()",
+        ],
+        capture_output=True,
+        check=True,
+        cwd=ROOT,
+    )
+    return time.perf_counter() - start
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-ms", type=float, default=500.0)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in MODULES:
+        times = get_import_times(module)
+        total_ms = times[module] / 1000
+        heavy = sorted(name for name in times if name.split(".")[0] in HEAVY_MODULES)
+        print(f"import {module}: {total_ms:.1f} ms")
+        if heavy:
+            print(f"  FAIL: imports heavy modules: {', '.join(heavy)}")
+            failed = True
+        if total_ms > args.max_ms:
+            print(f"  FAIL: slower than {args.max_ms:.0f} ms")
+            failed = True
+
+    help_ms = get_help_time() * 1000
+    print(f"effort_grid_show --help: {help_ms:.1f} ms")
+    if help_ms > args.max_ms:
+        print(f"  FAIL: slower than {args.max_ms:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
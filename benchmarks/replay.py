@@ -0,0 +1,162 @@
+"""Benchmark of the trigram timing recorder with replayed key events.
+
+Synthetic trials (see effort.replay.generate_trial_events) of random
+trigrams of the layout of effortconfig.yaml, with virtual timestamps and
+some mistyped keys, are fed to the recorder state machine without a
+keyboard. This measures:
+
+    throughput   key events processed per second (the output of the
+                 recorder is discarded)
+    fidelity     each recorded timing must be exactly the time between the
+                 injected timestamps of the release completing the starting
+                 sequence and the release completing the final sequence
+    event log    the same trials written to an event log: the timings
+                 calculated from the log (effort.eventlog.get_trial_timings)
+                 and replaying the log (effort.replay.replay_event_log) must
+                 give the same timings
+
+Run with
+
+    python benchmarks/replay.py [--trials 10000] [--error-rate 0.1]
+
+An event log recorded with effort_grid_record --event-log can be checked
+with --event-log FILE. The command exits with a non-zero status if any
+timing does not match.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+# The effort package is imported from this repository, so that the benchmarks
+# can be run without installing it.
+sys.path.insert(0, str(ROOT))
+
+from effort.config import read_config_file
+from effort.eventlog import EventLogWriter, get_trial_timings, read_event_log
+from effort.layout import HANDS, compile_layout
+from effort.recorder import TrigramTimingRecorder
+from effort.replay import generate_trial_events, replay_event_log, replay_trial
+from effort.synthetic import generate_records, get_ground_truth
+
+DEFAULT_CONFIG = ROOT / "effortconfig.yaml"
+
+
+def generate_trials(
+    config: dict, n_trials: int, error_rate: float, seed: int
+) -> list[tuple[str, str, list, int]]:
+    """Trigram, wait sequence, events and the expected timing (ns) of each
+    trial. The trials follow each other in (virtual) time."""
+    layout = compile_layout(config)
+    records = generate_records(
+        config, n_trials, get_ground_truth(config, seed=seed), n_repeats=1, seed=seed
+    )
+    rng = np.random.default_rng(seed)
+    trials = []
+    t_ns = 0
+    for trigram in records.trigrams.tolist():
+        hand = HANDS[layout.key_hand[layout.encode(np.array([ord(trigram[1])]))[0]]]
+        sequence = config[f"home_key_sequence_{hand}"]
+        events, expected_ns = generate_trial_events(
+            trigram, sequence, rng, start_ns=t_ns, error_rate=error_rate
+        )
+        trials.append((trigram, sequence, events, expected_ns))
+        t_ns = events[-1][2]
+    return trials
+
+
+def replay_trials(trials, out, event_log=None) -> tuple[list[float], float]:
+    """Replays the trials with a single recorder. Returns the timings and
+    the time (seconds) used."""
+    recorder = TrigramTimingRecorder("", "", out=out)
+    timings = []
+    start = time.perf_counter()
+    for trigram, sequence, events, _ in trials:
+        timings.append(
+            replay_trial(
+                events,
+                trigram,
+                sequence,
+                recorder=recorder,
+                out=out,
+                event_log=event_log,
+            )
+        )
+    return timings, time.perf_counter() - start
+
+
+def count_mismatches(timings, expected) -> int:
+    return int(np.count_nonzero(np.asarray(timings) != np.asarray(expected)))
+
+
+def check_event_log(file: Path, config: dict) -> int:
+    """Replays the event log and compares with the logged timings. Returns
+    the number of mismatching trials."""
+    results = replay_event_log(read_event_log(file), config)
+    mismatches = [r for r in results if r[2] != r[3]]
+    print(
+        f"{file}: {len(results)} completed trials, {len(mismatches)} mismatching timings"
+    )
+    for trial, trigram, replayed, logged in mismatches[:10]:
+        print(f"  trial {trial} ({trigram}): replayed {replayed}, logged {logged}")
+    return len(mismatches)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trials", type=int, default=10_000)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--config", type=Path, default=DEFAULT_CONFIG)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--event-log", type=Path)
+    args = parser.parse_args(argv)
+
+    config = read_config_file(args.config)
+    if args.event_log is not None:
+        return 1 if check_event_log(args.event_log, config) else 0
+
+    trials = generate_trials(config, args.trials, args.error_rate, args.seed)
+    n_events = sum(len(events) for _, _, events, _ in trials)
+    expected = [expected_ns / 1e9 for *_, expected_ns in trials]
+    print(f"{len(trials)} trials, {n_events} key events")
+
+    with open(os.devnull, "w") as devnull:
+        seconds = []
+        for _ in range(args.repeat):
+            timings, elapsed = replay_trials(trials, devnull)
+            seconds.append(elapsed)
+        best = min(seconds)
+        print(
+            f"  throughput: {n_events / best:,.0f} events/s ({best * 1e6 / n_events:.2f} µs per event)"
+        )
+        failed = 0
+        n_wrong = count_mismatches(timings, expected)
+        print(f"  fidelity: {'OK' if not n_wrong else 'FAIL'} ({n_wrong} mismatches)")
+        failed += n_wrong
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file = Path(tmpdir) / "events.bin"
+            with EventLogWriter(file) as writer:
+                replay_trials(trials, devnull, event_log=writer)
+            events = read_event_log(file)
+            _, logged = get_trial_timings(events)
+            replayed = [r[2] for r in replay_event_log(events, config)]
+        n_wrong = count_mismatches(logged, expected) + count_mismatches(
+            replayed, expected
+        )
+        print(f"  event log: {'OK' if not n_wrong else 'FAIL'} ({n_wrong} mismatches)")
+        failed += n_wrong
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
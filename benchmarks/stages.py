@@ -0,0 +1,249 @@
+"""Benchmark of the effort calculation stages on synthetic record files.
+
+Record files with 10^3 to 10^7 trigrams are generated (see effort.synthetic)
+from random ground truth efforts on the layout of effortconfig.yaml, and the
+time and peak memory (tracemalloc) of each stage is measured:
+
+    parse             load_records of the text record file
+    iterate_trigrams  iterating over the record file with iterate_trigrams
+    read_xy_data      the design matrices of both hands
+    show_model        fitting and printing the effort model
+    show_averages     the average timings of each character
+    get_trigrams      random trigrams for all the characters of the layout
+
+The fitted effort model is also checked to recover the ground truth. Run with
+
+    python benchmarks/stages.py [--sizes 1000 100000 10000000]
+
+The results are compared with the baseline file (benchmarks/baseline.json),
+and the command exits with a non-zero status if a stage is slower than
+--max-ratio times its baseline, or if the ground truth is not recovered. Use
+--save-baseline to write the results as the new baseline.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+# The effort package is imported from this repository, so that the benchmarks
+# can be run without installing it.
+sys.path.insert(0, str(ROOT))
+
+from effort.calculate import (
+    fit_effort_model,
+    get_model_data,
+    iterate_trigrams,
+    read_xy_data,
+    show_averages,
+    show_model,
+)
+from effort.config import read_config_file
+from effort.effort import get_trigrams, iterate_chars
+from effort.grid import HANDS
+from effort.layout import compile_layout
+from effort.records import load_records, save_text_records
+from effort.synthetic import (
+    DEFAULT_NOISE,
+    generate_records,
+    get_expected_coefficients,
+    get_ground_truth,
+)
+
+DEFAULT_CONFIG = ROOT / "effortconfig.yaml"
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+# The fitted coefficients must be within this many standard errors of the
+# ground truth.
+MAX_Z = 5.0
+
+
+def measure(func, repeat: int) -> dict[str, float]:
+    """The best time (seconds) of repeat runs of func, and its peak memory
+    allocation (MB). The memory is measured in a separate run, as tracemalloc
+    slows down the allocations."""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(seconds), "peak_mb": peak / 2**20}
+
+
+def quiet(func):
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func()
+
+    return run
+
+
+def benchmark_size(
+    config: dict, n_trigrams: int, repeat: int, seed: int, noise: float, tmpdir: Path
+) -> tuple[dict, dict]:
+    """Benchmarks the stages on a record file of n_trigrams trigrams.
+
+    Returns
+    -------
+    stages, recovery : dict
+        The measurements of each stage, and the ground truth recovery check.
+    """
+    truth = get_ground_truth(config, seed=seed)
+    records = generate_records(config, n_trigrams, truth, noise=noise, seed=seed)
+    file = tmpdir / f"records-{n_trigrams}.txt"
+    save_text_records(records, file)
+
+    n_best = config["trigram_use_n_best"]
+    records = load_records(file)
+    layout = compile_layout(config)
+    stages = {
+        "parse": measure(lambda: load_records(file), repeat),
+        "iterate_trigrams": measure(
+            lambda: sum(1 for _ in iterate_trigrams(file, n_best)), repeat
+        ),
+        "read_xy_data": measure(
+            lambda: [read_xy_data(records, n_best, layout, hand) for hand in HANDS],
+            repeat,
+        ),
+        "show_model": measure(quiet(lambda: show_model(records, config)), repeat),
+        "show_averages": measure(quiet(lambda: show_averages(records, config)), repeat),
+    }
+    return stages, check_recovery(records, config, truth, noise)
+
+
+def check_recovery(records, config: dict, truth, noise: float) -> dict:
+    """Compares the fitted effort model coefficients with the coefficients
+    expected from the ground truth, in standard errors (z) and milliseconds."""
+    expected = get_expected_coefficients(
+        truth,
+        n_repeats=records.timings.shape[1],
+        n_best=config["trigram_use_n_best"],
+        noise=noise,
+    )
+    expected = dict(zip(expected.chars, expected.values.tolist()))
+    max_z = max_error = 0.0
+    for hand in HANDS:
+        chars, X, y, weights = get_model_data(records, config, hand)
+        coefs = fit_effort_model(X, y, weights)
+        residuals = y - X @ coefs
+        sigma2 = (weights * residuals**2).sum() / max(len(y) - len(coefs), 1)
+        xtwx = (X.T @ X.multiply(weights[:, None])).toarray()
+        se = np.sqrt(sigma2 * np.diag(np.linalg.pinv(xtwx)))
+        error = coefs - np.array([expected[char] for char in chars])
+        max_z = max(max_z, float(np.max(np.abs(error) / se)))
+        max_error = max(max_error, float(np.max(np.abs(error))))
+    return {"max_z": max_z, "max_error_ms": max_error * 1000, "ok": max_z < MAX_Z}
+
+
+def benchmark_get_trigrams(config: dict, repeat: int) -> dict:
+    chars = list(iterate_chars(config))
+
+    def run():
+        for finger, hand, char in chars:
+            get_trigrams(char, hand, finger, config)
+
+    return measure(run, repeat)
+
+
+def compare(results: dict, baseline: dict, max_ratio: float) -> list[str]:
+    """The stages slower than max_ratio times the baseline."""
+    slower = []
+    for size, stages in results.items():
+        for stage, result in stages.items():
+            base = baseline.get(size, {}).get(stage)
+            if base and result["seconds"] > max_ratio * base["seconds"]:
+                slower.append(f"{size} {stage}")
+    return slower
+
+
+def format_row(name: str, result: dict, base: dict | None) -> str:
+    line = (
+        f"  {name:<17} {result['seconds'] * 1000:10.2f} ms {result['peak_mb']:9.2f} MB"
+    )
+    if base:
+        line += f"   ({result['seconds'] / base['seconds']:.2f}x baseline)"
+    return line
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--config", type=Path, default=DEFAULT_CONFIG)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--noise", type=float, default=DEFAULT_NOISE)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--max-ratio", type=float, default=1.5)
+    args = parser.parse_args(argv)
+
+    config = read_config_file(args.config)
+    baseline = {}
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text())["results"]
+
+    results = {}
+    failed = False
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for size in args.sizes:
+            stages, recovery = benchmark_size(
+                config, size, args.repeat, args.seed, args.noise, Path(tmpdir)
+            )
+            results[str(size)] = stages
+            print(f"{size} trigrams:")
+            for name, result in stages.items():
+                print(format_row(name, result, baseline.get(str(size), {}).get(name)))
+            status = "OK" if recovery["ok"] else "FAIL"
+            print(
+                f"  ground truth recovery: {status} (max error {recovery['max_error_ms']:.2f} ms, {recovery['max_z']:.1f} standard errors)"
+            )
+            failed |= not recovery["ok"]
+
+    results["layout"] = {"get_trigrams": benchmark_get_trigrams(config, args.repeat)}
+    print("layout:")
+    print(
+        format_row(
+            "get_trigrams",
+            results["layout"]["get_trigrams"],
+            baseline.get("layout", {}).get("get_trigrams"),
+        )
+    )
+
+    if args.save_baseline:
+        info = {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+        }
+        args.baseline.write_text(
+            json.dumps({"info": info, "results": results}, indent=2) + "\n"
+        )
+        print(f"Saved the baseline to {args.baseline}")
+    else:
+        slower = compare(results, baseline, args.max_ratio)
+        for name in slower:
+            print(f"FAIL: {name} is more than {args.max_ratio}x slower than baseline")
+        failed |= bool(slower)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,2 +1,11 @@
 from .config import read_config_file as read_config_file
-from .effort import effort_record as effort_record
+
+
+def __getattr__(name):
+    # effort_record is imported lazily, as it pulls in pynput (which needs a
+    # display), and importing it is not needed for calculating the results.
+    if name == "effort_record":
+        from .effort import effort_record
+
+        return effort_record
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
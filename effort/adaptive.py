@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from effort.layout import HANDS, compile_layout
+
+if TYPE_CHECKING:
+    from effort.online import OnlineEffortModel
+
+# Defaults for the config keys "adaptive_tolerance" (seconds) and
+# "adaptive_min_repeats" (None: trigram_use_n_best + 1).
+DEFAULT_TOLERANCE = 0.01
+DEFAULT_MIN_REPEATS = None
+
+
+class AdaptiveRepetitions:
+    """Sequential stopping of the trigram repetitions.
+
+    Only the trigram_use_n_best timings of a trigram are used, and the mean
+    of them often stops changing after a few repetitions. The repetitions of
+    a trigram are stopped when the mean of the best timings changed less
+    than tolerance with the latest repetition (after at least min_repeats
+    repetitions, and at most trigram_repeat_times).
+
+    The repetitions saved this way are used for extra trigrams of the
+    characters whose effort model coefficient is the most uncertain (see
+    pick_uncertain_char).
+
+    Enabled with "adaptive_repetitions: true" in the config.
+    """
+
+    def __init__(self, config: dict):
+        self.n_best = int(config["trigram_use_n_best"])
+        self.max_repeats = int(config["trigram_repeat_times"])
+        min_repeats = config.get("adaptive_min_repeats", DEFAULT_MIN_REPEATS)
+        if min_repeats is None:
+            min_repeats = self.n_best + 1
+        self.min_repeats = min(max(int(min_repeats), 2), self.max_repeats)
+        self.tolerance = float(config.get("adaptive_tolerance", DEFAULT_TOLERANCE))
+        layout = compile_layout(config)
+        self.fingers = {
+            hand: {
+                char: finger
+                for finger, chars in layout.finger_chars[hand].items()
+                for char in chars
+            }
+            for hand in HANDS
+        }
+
+    def is_stable(self, times: list[float]) -> bool:
+        """True if no more repetitions are needed for a trigram with the
+        given timings."""
+        if len(times) >= self.max_repeats:
+            return True
+        if len(times) < self.min_repeats:
+            return False
+        previous = sorted(times[:-1])[: self.n_best]
+        current = sorted(times)[: self.n_best]
+        change = sum(current) / len(current) - sum(previous) / len(previous)
+        return abs(change) < self.tolerance
+
+    def pick_uncertain_char(self, model: OnlineEffortModel) -> tuple[str, str, str]:
+        """The (finger, hand, char) with the largest coefficient variance in
+        the effort model."""
+        variances = model.coefficient_variances()
+        hand = max(variances, key=lambda hand: variances[hand].max())
+        char = model.chars[hand][int(np.argmax(variances[hand]))]
+        return self.fingers[hand][char], hand, char
+
+
+def is_adaptive(config: dict) -> bool:
+    return bool(config.get("adaptive_repetitions", False))
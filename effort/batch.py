@@ -0,0 +1,215 @@
+"""Batch calculation of the efforts of many record files with many configs.
+
+Each record file is parsed once (in a worker process), and the efforts of
+each config and calculation type are calculated from it. The records of all
+the files are also pooled, and the efforts of the pooled records are
+calculated for each config. The results are collected into one tidy table
+with a row per (source, config, type, character).
+"""
+
+from __future__ import annotations
+
+import csv
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+from effort.records import TrigramRecords, concat_records, load_records
+from effort.report import CALCULATION_TYPES, get_effort_grids
+
+# The source of the rows calculated from the pooled records.
+POOLED = "pooled"
+
+COLUMNS = ("source", "config", "type", "hand", "char", "effort", "seconds", "count")
+
+
+def find_record_files(paths) -> list[Path]:
+    """Expands the paths into record files. A path may be a record file, a
+    directory (all the files in it) or a glob pattern."""
+    files = []
+    for path in map(str, paths):
+        if os.path.isdir(path):
+            found = [p for p in sorted(Path(path).iterdir()) if p.is_file()]
+            found = [p for p in found if not p.name.startswith(".")]
+        elif glob.has_magic(path):
+            found = [Path(p) for p in sorted(glob.glob(path)) if os.path.isfile(p)]
+        else:
+            found = [Path(path)]
+        files.extend(found)
+    return list(dict.fromkeys(files))
+
+
+def get_table_rows(
+    source: str, config_name: str, records: TrigramRecords, config: dict, calctypes
+) -> list[tuple]:
+    rows = []
+    for calctype, grid in get_effort_grids(records, config, calctypes).items():
+        normalized = grid.as_dict()
+        sample_sizes = grid.sample_sizes or {}
+        for hand, (chars, values) in grid.efforts.items():
+            for char, value in zip(chars, np.asarray(values, dtype=float).tolist()):
+                rows.append(
+                    (
+                        source,
+                        config_name,
+                        calctype,
+                        hand,
+                        char,
+                        normalized[char],
+                        value,
+                        sample_sizes.get(char, 0),
+                    )
+                )
+    return rows
+
+
+def process_record_file(
+    file, configs: dict[str, dict], calctypes, return_records: bool = False
+) -> tuple[list[tuple], int, TrigramRecords | None, float, float]:
+    """Parses a record file and calculates its efforts with each config.
+
+    Parameters
+    ----------
+    return_records : bool
+        If True, the parsed records are returned too (for pooling). Otherwise
+        only the summary of the file is sent back from the worker process.
+
+    Returns
+    -------
+    rows, n_trigrams, records, parse_seconds, calculation_seconds
+        records is None, unless return_records is True.
+    """
+    start = time.perf_counter()
+    records = load_records(file, mmap=False)
+    if not records.n_repeats.sum():
+        raise ValueError("no timings in the file")
+    parsed = time.perf_counter()
+    rows = []
+    for config_name, config in configs.items():
+        rows += get_table_rows(str(file), config_name, records, config, calctypes)
+    return (
+        rows,
+        len(records),
+        records if return_records else None,
+        parsed - start,
+        time.perf_counter() - parsed,
+    )
+
+
+def process_pooled(
+    records: TrigramRecords, config_name: str, config: dict, calctypes
+) -> tuple[list[tuple], float]:
+    start = time.perf_counter()
+    rows = get_table_rows(POOLED, config_name, records, config, calctypes)
+    return rows, time.perf_counter() - start
+
+
+def run_batch(
+    record_files,
+    configs: dict[str, dict],
+    calctypes=CALCULATION_TYPES,
+    pool: bool = True,
+    n_jobs: int | None = None,
+) -> list[tuple]:
+    """Calculates the efforts of each record file with each config in n_jobs
+    worker processes, and prints the progress. Files that cannot be processed
+    are reported and skipped.
+
+    Parameters
+    ----------
+    configs : dict
+        The configs by name (for example the path of the config file).
+    pool : bool
+        If True, the efforts of all the records pooled together are also
+        calculated (source "pooled").
+
+    Returns
+    -------
+    rows : list[tuple]
+        The rows of the table, with COLUMNS.
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    record_files = list(record_files)
+    n_files = len(record_files)
+    rows = []
+    pooled_records = {}
+    with ProcessPoolExecutor(max_workers=max(min(n_jobs, n_files), 1)) as executor:
+        futures = {
+            executor.submit(
+                process_record_file, file, configs, calctypes, pool and n_files > 1
+            ): file
+            for file in record_files
+        }
+        for i, future in enumerate(as_completed(futures), start=1):
+            file = futures[future]
+            try:
+                file_rows, n_trigrams, records, parse_seconds, calc_seconds = (
+                    future.result()
+                )
+            except Exception as e:
+                print(f"[{i}/{n_files}] {file}: FAILED ({e})")
+                continue
+            rows += file_rows
+            if records is not None:
+                pooled_records[file] = records
+            print(
+                f"[{i}/{n_files}] {file}: {n_trigrams} trigrams, parse {parse_seconds:.3f} s, calculate {calc_seconds:.3f} s"
+            )
+
+        if pool and len(pooled_records) > 1:
+            # Pooled in the order of the files, not in the order of completion.
+            records = concat_records(
+                [pooled_records.pop(f) for f in record_files if f in pooled_records]
+            )
+            futures = {
+                executor.submit(
+                    process_pooled, records, config_name, config, calctypes
+                ): config_name
+                for config_name, config in configs.items()
+            }
+            for future in as_completed(futures):
+                pooled_rows, seconds = future.result()
+                rows += pooled_rows
+                print(
+                    f"{POOLED} ({len(records.trigrams)} trigrams) with {futures[future]}: calculate {seconds:.3f} s"
+                )
+    return sort_rows(rows, record_files, configs, calctypes)
+
+
+def sort_rows(rows: list[tuple], record_files, configs, calctypes) -> list[tuple]:
+    """Sorts the rows by source (in the given order, pooled last), config and
+    type. The order of the characters is kept."""
+    sources = {str(f): i for i, f in enumerate(record_files)}
+    sources[POOLED] = len(sources)
+    config_order = {name: i for i, name in enumerate(configs)}
+    type_order = {calctype: i for i, calctype in enumerate(calctypes)}
+    return sorted(
+        rows,
+        key=lambda row: (sources[row[0]], config_order[row[1]], type_order[row[2]]),
+    )
+
+
+def write_table(rows: list[tuple], file):
+    """Writes the table as CSV, or as NPZ (one array per column) if the file
+    name ends with .npz."""
+    if Path(file).suffix == ".npz":
+        columns = list(zip(*rows)) if rows else [()] * len(COLUMNS)
+        arrays = {}
+        for name, values in zip(COLUMNS, columns):
+            if name in ("effort", "seconds"):
+                arrays[name] = np.array(values, dtype=float)
+            elif name == "count":
+                arrays[name] = np.array(values, dtype=np.int64)
+            else:
+                arrays[name] = np.array(values, dtype=str)
+        with open(file, "wb") as f:
+            np.savez(f, **arrays)
+        return
+    with open(file, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
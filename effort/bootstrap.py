@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Callable
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from scipy.sparse import csr_matrix
+
+# Number of resamples solved in one batch.
+BATCH_SIZE = 1000
+
+# Upper limit for the number of elements in one (resamples x trigrams) weight
+# matrix. Limits the memory used per batch (and per worker process).
+MAX_BATCH_ELEMENTS = 2**22
+
+
+def get_pair_matrix(X: csr_matrix) -> csr_matrix:
+    """Row-wise Kronecker product of X with itself.
+
+    Row i of the returned matrix is the flattened outer product x_i x_iᵀ, so
+    for a weight matrix W of shape (n_batch, n_rows), (W @ P) reshaped to
+    (n_batch, k, k) is XᵀWX for each row of W."""
+    # Imported here to keep scipy out of the CLI start up time.
+    from scipy.sparse import csr_matrix
+
+    X = X.tocsr()
+    n_rows, k = X.shape
+    nnz = np.diff(X.indptr)
+    rows, cols = [], []
+    for a in range(int(nnz.max(initial=0))):
+        for b in range(int(nnz.max(initial=0))):
+            has_pair = np.flatnonzero(nnz > max(a, b))
+            col_a = X.indices[X.indptr[has_pair] + a]
+            col_b = X.indices[X.indptr[has_pair] + b]
+            rows.append(has_pair)
+            cols.append(col_a * k + col_b)
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.intp)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.intp)
+    return csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n_rows, k * k))
+
+
+def solve_weighted_batch(
+    P: csr_matrix, Xy: csr_matrix, W: np.ndarray, k: int
+) -> np.ndarray:
+    """Solves a batch of weighted least squares problems at once.
+
+    Parameters
+    ----------
+    P : csr_matrix
+        The pair matrix of the design matrix X (see get_pair_matrix).
+    Xy : csr_matrix
+        The design matrix X with each row multiplied by the target y.
+    W : np.ndarray
+        The weights, an array of shape (n_batch, n_rows). Each row of W
+        defines one least squares problem.
+    k : int
+        Number of coefficients (columns of X).
+
+    Returns
+    -------
+    np.ndarray
+        The (minimum norm) least squares coefficients, in an array of shape
+        (n_batch, k).
+    """
+    xtx = np.asarray((P.T @ W.T).T).reshape(-1, k, k)
+    xty = np.asarray((Xy.T @ W.T).T)
+    try:
+        return np.linalg.solve(xtx, xty[:, :, None])[:, :, 0]
+    except np.linalg.LinAlgError:
+        # Some problem in the batch is singular (for example, a character is
+        # missing from a resample).
+        return (np.linalg.pinv(xtx, hermitian=True) @ xty[:, :, None])[:, :, 0]
+
+
+def bootstrap_coefficients(
+    X: csr_matrix,
+    y: np.ndarray,
+    weights: np.ndarray,
+    n_resamples: int,
+    seed: int | None = None,
+    n_jobs: int | None = None,
+) -> np.ndarray:
+    """Bootstrap distribution of the weighted least squares coefficients.
+
+    The trigrams (rows of X) are resampled with replacement. A resample is
+    represented as the number of times each row was drawn, which multiplies
+    the sample weight of the row. The resamples are solved in batches with
+    solve_weighted_batch, and the batches are spread over n_jobs worker
+    processes.
+
+    Returns
+    -------
+    np.ndarray
+        Coefficients for each resample, in an array of shape
+        (n_resamples, k).
+    """
+    P = get_pair_matrix(X)
+    Xy = X.multiply(y[:, None]).tocsr()
+    return map_batches(
+        _bootstrap_batch,
+        (P, Xy, weights),
+        n_resamples,
+        n_rows=X.shape[0],
+        seed=seed,
+        n_jobs=n_jobs,
+    )
+
+
+def map_batches(
+    func: Callable[..., np.ndarray],
+    args: tuple,
+    n_total: int,
+    n_rows: int,
+    seed: int | None = None,
+    n_jobs: int | None = None,
+) -> np.ndarray:
+    """Calls func(*args, batch_size, seed_sequence) for batches totalling
+    n_total items, in n_jobs worker processes, and concatenates the results.
+
+    The batch sizes are limited so that a (batch_size x n_rows) array stays
+    below MAX_BATCH_ELEMENTS. The batches do not depend on n_jobs, so the
+    results for a given seed are the same regardless of the number of
+    workers."""
+    n_jobs = n_jobs or os.cpu_count() or 1
+    batch_size = max(1, min(BATCH_SIZE, MAX_BATCH_ELEMENTS // max(n_rows, 1)))
+    n_batches = -(-n_total // batch_size)
+    sizes = [batch_size] * (n_batches - 1) + [n_total - batch_size * (n_batches - 1)]
+    seeds = np.random.SeedSequence(seed).spawn(n_batches)
+    tasks = [(*args, size, seed) for size, seed in zip(sizes, seeds)]
+
+    if n_jobs == 1 or n_batches == 1:
+        results = [func(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, n_batches)) as executor:
+            results = list(executor.map(func, *zip(*tasks)))
+    return np.concatenate(results)
+
+
+def _bootstrap_batch(
+    P: csr_matrix,
+    Xy: csr_matrix,
+    weights: np.ndarray,
+    n_resamples: int,
+    seed: np.random.SeedSequence,
+) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    n_rows = Xy.shape[0]
+    counts = rng.multinomial(n_rows, np.full(n_rows, 1 / n_rows), size=n_resamples)
+    return solve_weighted_batch(P, Xy, counts * weights, Xy.shape[1])
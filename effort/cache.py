@@ -0,0 +1,174 @@
+"""On-disk cache for the results of effort_grid_show.
+
+The results are keyed by a hash of the record file contents, the parts of
+the config used in the calculations and the calculation type (and options).
+Each entry stores the printed output and the effort grid (efforts and
+sample sizes). The cache has a maximum size, and the least recently used
+entries are removed when it is exceeded. The cache is best effort: if it
+cannot be written, a warning is logged and the results are not cached.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from effort.grid import HANDS, EffortGrid
+
+# Bumped when the calculations (or the entry format) change, so that old
+# entries are not used.
+CACHE_VERSION = 2
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 64 * 2**20
+
+# The config keys used in the calculations.
+CONFIG_KEYS = (
+    "left",
+    "right",
+    "trigram_use_n_best",
+    "home_key_sequence_timing_left",
+    "home_key_sequence_timing_right",
+)
+
+
+class ResultCache:
+    """Size bounded LRU cache of effort_grid_show results in a directory.
+
+    Each entry is an .npz file named by its key. Reading an entry updates the
+    modification time of the file, which is used as the last use time.
+    """
+
+    def __init__(self, directory=None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory) if directory else get_default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.npz"
+
+    def get(self, key: str) -> tuple[str, EffortGrid] | None:
+        """The cached (printed output, effort grid), or None."""
+        path = self._path(key)
+        try:
+            with np.load(path) as entry:
+                output = str(entry["output"])
+                efforts = {
+                    hand: (str(entry[f"chars_{hand}"]), entry[f"efforts_{hand}"])
+                    for hand in HANDS
+                }
+                sample_sizes = dict(
+                    zip(
+                        str(entry["sample_size_chars"]),
+                        entry["sample_sizes"].tolist(),
+                    )
+                )
+        except (OSError, KeyError, ValueError):
+            return None
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        return output, EffortGrid(efforts, sample_sizes=sample_sizes)
+
+    def put(self, key: str, output: str, grid: EffortGrid):
+        """Saves an entry. Errors writing the cache (like a read-only cache
+        directory) are logged as warnings."""
+        sample_sizes = grid.sample_sizes or {}
+        entry = {
+            "output": np.array(output),
+            "sample_size_chars": np.array("".join(sample_sizes)),
+            "sample_sizes": np.array(list(sample_sizes.values()), dtype=np.int64),
+        }
+        for hand in HANDS:
+            chars, efforts = grid.efforts[hand]
+            entry[f"chars_{hand}"] = np.array(chars)
+            entry[f"efforts_{hand}"] = np.asarray(efforts, dtype=float)
+        # Write to a temporary file first, so that a reader never sees a
+        # partially written entry.
+        path = self._path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "wb") as f:
+                np.savez(f, **entry)
+            os.replace(tmp, path)
+            self.evict()
+        except OSError as e:
+            logger.warning(f"Could not write the result cache {self.directory}: {e}")
+            with contextlib.suppress(OSError):
+                tmp.unlink(missing_ok=True)
+
+    def evict(self):
+        """Removes the least recently used entries until the total size is
+        at most max_bytes."""
+        entries = []
+        for path in self.directory.glob("*.npz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def get_default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "effort-grid"
+
+
+def is_cacheable(calctype: str, model_kwargs: dict) -> bool:
+    """Bootstrap results are random unless a seed is given."""
+    return not (model_kwargs.get("bootstrap") and model_kwargs.get("seed") is None)
+
+
+def get_cache_key(file, config: dict, calctype: str, model_kwargs: dict) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(file, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            h.update(block)
+    settings = {
+        "version": CACHE_VERSION,
+        "config": {key: config.get(key) for key in CONFIG_KEYS},
+        "calctype": calctype,
+        # n_jobs does not change the results.
+        "options": {k: v for k, v in model_kwargs.items() if k != "n_jobs"},
+    }
+    h.update(json.dumps(settings, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class _Tee(io.StringIO):
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+
+    def write(self, text):
+        self.stream.write(text)
+        return super().write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+@contextlib.contextmanager
+def capture_output(enabled: bool = True):
+    """Captures what is printed (while still printing it). Yields a StringIO
+    with the captured output."""
+    if not enabled:
+        yield io.StringIO()
+        return
+    tee = _Tee(sys.stdout)
+    with contextlib.redirect_stdout(tee):
+        yield tee
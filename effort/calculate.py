@@ -1,120 +1,389 @@
-from collections import defaultdict
-from typing import Callable, Iterable
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
 
 import numpy as np
-from matplotlib.colors import LinearSegmentedColormap, Normalize, to_hex
-from sklearn.linear_model import LinearRegression
 
-from effort.config import get_chars_for_hand
+from effort import metrics
+from effort.bootstrap import bootstrap_coefficients
+from effort.cache import ResultCache, capture_output, get_cache_key, is_cacheable
+from effort.colors import get_hex_func
+from effort.grid import EffortGrid
+from effort.layout import CompiledLayout, compile_layout
+from effort.records import TrigramRecords, load_records
+from effort.svg import get_layout, render_svg
+
+if TYPE_CHECKING:
+    from scipy.sparse import csr_matrix
 
 
 def read_xy_data(
-    file, n_best: int, hand_chars: str, average: bool = False
-) -> tuple[np.ndarray, np.ndarray]:
-    """
+    records: TrigramRecords,
+    n_best: int,
+    layout: CompiledLayout,
+    hand: str,
+    average: bool = False,
+) -> tuple[csr_matrix, np.ndarray, np.ndarray]:
+    """Reads the data for fitting the effort model of one hand.
+
+    Each row of X corresponds to one trigram using at least one of the
+    characters of the hand (layout.hand_chars[hand]). The repetitions of a trigram are not duplicated as rows; y is
+    the mean of the n_best timings and the sample weight is the number of
+    timings used. A weighted least squares fit with these gives the same
+    coefficients as fitting each of the timings separately.
+
     Parameters
     ----------
     average : bool
-        If True, the timings will be averaged over the n_best timings.
+        If True, the timings will be averaged over the n_best timings, and
+        each trigram gets a sample weight of 1.
     """
+    X, rows = get_design_matrix(records, layout, hand)
+    y = records.mean_best_timings(n_best)[rows]
+    if average:
+        weights = np.ones(len(rows))
+    else:
+        weights = records.n_used(n_best)[rows].astype(float)
+    return X, y, weights
 
-    y_all = []
-    x_all = []
 
-    for chars, best_timings in iterate_trigrams(file, n_best):
-        if average:
-            y_all.append(np.mean(best_timings))
-        else:
-            y_all.extend(best_timings)
-        x = []
+def get_design_matrix(
+    records: TrigramRecords, layout: CompiledLayout, hand: str
+) -> tuple[csr_matrix, np.ndarray]:
+    """Sparse 0/1 matrix telling which of the characters of the hand are
+    used in a trigram.
 
-        for char in hand_chars:
-            is_used = 1 if char in chars else 0
-            x.append(is_used)
+    Returns
+    -------
+    X : csr_matrix
+        Matrix of shape (n_rows, len(layout.hand_chars[hand])). A trigram with three different
+        chars has three nonzeros.
+    rows : np.ndarray
+        Index of the trigram (in records) for each row of X. Trigrams which
+        do not use any of the chars, or have no timings, are left out.
+    """
+    # Imported here to keep scipy out of the CLI start up time.
+    from scipy.sparse import csr_matrix
 
-        number_of_x = 1 if average else len(best_timings)
-        for _ in range(number_of_x):
-            x_all.append(x)
+    # A character used twice in a trigram is still just "used".
+    cols = records.char_indices(layout, hand, unique=True)
+    is_used = (cols >= 0) & (records.n_repeats > 0)[:, None]
 
-    return np.array(x_all), np.array(y_all)
+    n_used = is_used.sum(axis=1)
+    rows = np.flatnonzero(n_used)
+    indptr = np.zeros(len(rows) + 1, dtype=np.intp)
+    np.cumsum(n_used[rows], out=indptr[1:])
+    X = csr_matrix(
+        (np.ones(indptr[-1]), cols[rows][is_used[rows]], indptr),
+        shape=(len(rows), len(layout.hand_chars[hand])),
+    )
+    return X, rows
 
 
-def read_trigram_timings(file, n_best: int) -> tuple[list[str], list[float]]:
-    timings = []
-    trigrams = []
-    for chars, best_timings in iterate_trigrams(file, n_best):
-        timings.append(sum(best_timings) / len(best_timings))
-        trigrams.append(chars)
-    return trigrams, timings
+def iterate_trigrams(file, n_best: int) -> Iterable[tuple[str, list[float]]]:
+    records = load_records(file)
+    best_timings = np.sort(records.best_timings(n_best), axis=1).tolist()
+    n_used = records.n_used(n_best).tolist()
+    for chars, timings, n in zip(records.trigrams.tolist(), best_timings, n_used):
+        yield chars, timings[:n]
 
 
-def iterate_trigrams(file, n_best: int) -> Iterable[tuple[str, list[float]]]:
-    with open(file, "r") as f:
-        data = f.readlines()
-    for line in data:
-        chars, *timings = line.strip().split()
-        best_timings = sorted(float(timing) for timing in timings)[: int(n_best)]
-        yield chars, best_timings
+def calculate(
+    file,
+    config: dict,
+    calctype="model",
+    mmap: bool = True,
+    sample_sizes_file=None,
+    svg_file=None,
+    cache: ResultCache | None = None,
+    **model_kwargs,
+) -> EffortGrid:
+    """Shows the effort grid calculated from the records in file.
+
+    If svg_file is given, the effort grid is also saved as an SVG heatmap.
+    The model_kwargs are passed to show_model (calctype "model" only). If a
+    cache is given, the results are taken from it when the same calculation
+    has been done before (see effort.cache).
+    """
+    key = None
+    if cache is not None and is_cacheable(calctype, model_kwargs):
+        with metrics.stage("show.cache"):
+            key = get_cache_key(file, config, calctype, model_kwargs)
+            cached = cache.get(key)
+        if cached is not None:
+            output, grid = cached
+            print(output, end="")
+            if sample_sizes_file is not None:
+                write_sample_sizes(grid.sample_sizes, sample_sizes_file)
+            if svg_file is not None:
+                Path(svg_file).write_text(render_svg(grid, layout=get_layout(config)))
+            return grid
+
+    with capture_output(enabled=key is not None) as output:
+        with metrics.stage("show.parse"):
+            records = load_records(file, mmap=mmap)
+        if calctype in ("average", "average-center"):
+            grid = show_averages(
+                records,
+                config,
+                center=calctype == "average-center",
+                sample_sizes_file=sample_sizes_file,
+            )
+        elif calctype == "model":
+            grid = show_model(
+                records, config, sample_sizes_file=sample_sizes_file, **model_kwargs
+            )
+        else:
+            raise ValueError(f"Unknown calculation type: {calctype}")
+    if key is not None:
+        with metrics.stage("show.cache"):
+            cache.put(key, output.getvalue(), grid)
+
+    if svg_file is not None:
+        with metrics.stage("show.svg"):
+            Path(svg_file).write_text(render_svg(grid, layout=get_layout(config)))
+    return grid
+
+
+def show_model(
+    records: TrigramRecords,
+    config: dict,
+    sample_sizes_file=None,
+    bootstrap: int = 0,
+    confidence: float = 0.95,
+    n_jobs: int | None = None,
+    seed: int | None = None,
+) -> EffortGrid:
+    """Fits the effort model for each hand and shows the effort grid. Returns
+    the effort model coefficients (seconds) as an effort grid.
 
+    Parameters
+    ----------
+    bootstrap : int
+        If positive, the number of bootstrap resamples (of trigrams) used to
+        calculate confidence intervals for the efforts.
+    confidence : float
+        Confidence level of the bootstrap percentile intervals.
+    n_jobs : int | None
+        Number of worker processes for the bootstrap. None uses all CPUs.
+    seed : int | None
+        Seed for the bootstrap resampling.
+    """
+    grid = get_model_grid(records, config)
+    intervals = None
+    if bootstrap > 0:
+        intervals = get_bootstrap_intervals(
+            records, config, bootstrap, confidence, n_jobs=n_jobs, seed=seed
+        )
+    with metrics.stage("show.colors"):
+        print_model_efforts(grid.efforts, intervals=intervals)
 
-def calculate(file, config: dict, calctype="model"):
-    if calctype in ("average", "average-center"):
-        show_averages(file, config, center=calctype == "average-center")
-    elif calctype == "model":
-        show_model(file, config)
+    if sample_sizes_file is not None:
+        write_sample_sizes(grid.sample_sizes, sample_sizes_file)
+    return grid
 
 
-def show_model(file, config: dict):
-    models = {}
+def get_bootstrap_intervals(
+    records: TrigramRecords,
+    config: dict,
+    n_resamples: int,
+    confidence: float = 0.95,
+    n_jobs: int | None = None,
+    seed: int | None = None,
+) -> dict[str, np.ndarray]:
+    """Bootstrap percentile intervals of the effort model coefficients (see
+    get_model_grid) of each hand, as arrays of shape (2, n_chars) with the
+    lower and the upper limits."""
+    alpha = (1 - confidence) / 2
+    intervals = {}
     for hand in ("left", "right"):
-        chars = get_chars_for_hand(hand, config)
-        X, y = read_xy_data(file, n_best=config["trigram_use_n_best"], hand_chars=chars)
-        bias = (
-            config["home_key_sequence_timing_left"]
-            if hand == "left"
-            else config["home_key_sequence_timing_right"]
+        _, X, y, weights = get_model_data(records, config, hand)
+        with metrics.stage("show.bootstrap"):
+            samples = bootstrap_coefficients(
+                X, y, weights, n_resamples, seed=seed, n_jobs=n_jobs
+            )
+        intervals[hand] = np.quantile(samples, [alpha, 1 - alpha], axis=0)
+    return intervals
+
+
+def get_model_data(
+    records: TrigramRecords, config: dict, hand: str
+) -> tuple[str, csr_matrix, np.ndarray, np.ndarray]:
+    """The characters of the hand and the data (X, y with the bias removed,
+    weights) for fitting its effort model."""
+    layout = compile_layout(config)
+    chars = layout.hand_chars[hand]
+    with metrics.stage("show.design_matrix"):
+        X, y, weights = read_xy_data(
+            records, config["trigram_use_n_best"], layout, hand
         )
-        y = y - bias
+    bias = (
+        config["home_key_sequence_timing_left"]
+        if hand == "left"
+        else config["home_key_sequence_timing_right"]
+    )
+    return chars, X, y - bias, weights
+
+
+def get_model_grid(records: TrigramRecords, config: dict) -> EffortGrid:
+    """The effort model coefficients (seconds) as an effort grid, without
+    printing anything (see show_model)."""
+    coefs = {}
+    sample_sizes = {}
+    for hand in ("left", "right"):
+        chars, X, y, weights = get_model_data(records, config, hand)
+        sample_sizes.update(zip(chars, X.getnnz(axis=0).tolist()))
+        with metrics.stage("show.fit"):
+            coefs[hand] = (chars, fit_effort_model(X, y, weights))
+    return EffortGrid(coefs, sample_sizes=sample_sizes)
+
+
+def fit_effort_model(X: csr_matrix, y: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Fits the weighted least squares effort model (without an intercept).
+
+    The normal equations XᵀWX b = XᵀWy are formed from the sparse X (XᵀWX
+    is only k x k) and solved with np.linalg.lstsq, which gives the minimum
+    norm solution also when some of the characters are missing from the
+    data."""
+    Xw = X.multiply(weights[:, None]).tocsr()
+    return solve_normal_equations((X.T @ Xw).toarray(), Xw.T @ y)
+
 
-        model = LinearRegression(fit_intercept=False)
-        model.fit(X, y)
-        models[hand] = (model, chars)
+def solve_normal_equations(xtx: np.ndarray, xty: np.ndarray) -> np.ndarray:
+    return np.linalg.lstsq(xtx, xty, rcond=None)[0]
 
-    mineffort = min(min(models["left"][0].coef_), min(models["right"][0].coef_))
-    maxeffort = max(max(models["left"][0].coef_), max(models["right"][0].coef_))
+
+def print_model_efforts(
+    coefs: dict[str, tuple[str, np.ndarray]],
+    intervals: dict[str, np.ndarray] | None = None,
+):
+    """Prints the effort grid from the effort model coefficients.
+
+    Parameters
+    ----------
+    coefs : dict
+        Maps hand ("left" or "right") to a tuple of the characters of the hand
+        and the effort model coefficients for each of the characters.
+    intervals : dict | None
+        Maps hand to an array of shape (2, n_chars) with the lower and upper
+        limits of the confidence intervals of the coefficients. The limits
+        are normalized with the same effort scale as the coefficients.
+    """
+    mineffort = min(min(hand_coefs) for _, hand_coefs in coefs.values())
+    maxeffort = max(max(hand_coefs) for _, hand_coefs in coefs.values())
     get_color = get_hex_func(1.0, maxeffort / mineffort)
     print("Effort scale: ", mineffort)
 
-    for hand, (model, chars) in models.items():
+    for hand, (chars, hand_coefs) in coefs.items():
         print(f"\nHand: {hand}")
-        coefs = model.coef_
-        coefs = coefs / mineffort
-        for i, coef in enumerate(coefs):
-            print(f"Char {chars[i]}: {coef:.2f}   color: {get_color(coef)}")
+        hand_coefs = hand_coefs / mineffort
+        for i, coef in enumerate(hand_coefs):
+            line = f"Char {chars[i]}: {coef:.2f}   color: {get_color(coef)}"
+            if intervals is not None:
+                low, high = intervals[hand][:, i] / mineffort
+                line += f"   CI: [{low:.2f}, {high:.2f}]"
+            print(line)
 
 
-def show_averages(file, config: dict, center: bool = False):
-    data = defaultdict(lambda: defaultdict(int))
-    trigrams, timings = read_trigram_timings(file, config["trigram_use_n_best"])
+class CharTimingStats:
+    """Statistics of the trigram timings (mean of the n_best timings of each
+    trigram) grouped by the characters used in the trigrams.
 
-    for hand in ("left", "right"):
-        chars = get_chars_for_hand(hand, config)
-        for char in chars:
-            char_timings = []
-            for trigram, timing in zip(trigrams, timings):
-                if not center and char in trigram:
-                    char_timings.append(timing)
-                elif center and char == trigram[1]:
-                    char_timings.append(timing)
-            char_ave_timing = sum(char_timings) / len(char_timings)
-            bias = (
-                config["home_key_sequence_timing_left"]
-                if hand == "left"
-                else config["home_key_sequence_timing_right"]
-            )
-            char_ave_timing -= bias
-            data[hand][char] = char_ave_timing
+    The count, mean and var attributes are arrays of shape
+    (1 + trigram_length, len(chars)). Row 0 has the statistics over trigrams
+    using the character at any position, and row i (i >= 1) the statistics
+    over trigrams having the character at position i. The variance is the
+    sample variance (NaN if there are less than two trigrams).
+    """
+
+    def __init__(
+        self, chars: str, count: np.ndarray, mean: np.ndarray, var: np.ndarray
+    ):
+        self.chars = chars
+        self.count = count
+        self.mean = mean
+        self.var = var
+
+    @property
+    def center(self) -> int:
+        """Row index of the center position."""
+        return (self.count.shape[0] - 1) // 2 + 1
 
+
+def get_char_timing_stats(
+    records: TrigramRecords, layout: CompiledLayout, hand: str, n_best: int
+) -> CharTimingStats:
+    """Groups the trigram timings by character, for all positions at once.
+
+    The trigram characters are encoded to indices of chars, and the sums are
+    calculated with np.bincount, so this is a single linear pass over the
+    trigrams regardless of the number of characters."""
+    chars = layout.hand_chars[hand]
+    timings = records.mean_best_timings(n_best)
+    idx = records.char_indices(layout, hand)
+    first_idx = records.char_indices(layout, hand, unique=True)
+    # Trigrams without timings (NaN mean) are not counted.
+    idx[records.n_repeats == 0] = -1
+    first_idx[records.n_repeats == 0] = -1
+    n_chars = len(chars)
+    n_positions = idx.shape[1]
+
+    count = np.zeros((1 + n_positions, n_chars))
+    total = np.zeros((1 + n_positions, n_chars))
+    total_sq = np.zeros((1 + n_positions, n_chars))
+    groups = [first_idx.ravel()] + [idx[:, i] for i in range(n_positions)]
+    values = [np.repeat(timings, n_positions)] + [timings] * n_positions
+    for row, (group, value) in enumerate(zip(groups, values)):
+        is_char = group >= 0
+        group, value = group[is_char], value[is_char]
+        count[row] = np.bincount(group, minlength=n_chars)
+        total[row] = np.bincount(group, weights=value, minlength=n_chars)
+        total_sq[row] = np.bincount(group, weights=value**2, minlength=n_chars)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        var = (total_sq - count * mean**2) / (count - 1)
+    var[count < 2] = np.nan
+    return CharTimingStats(chars, count.astype(int), mean, np.maximum(var, 0))
+
+
+def show_averages(
+    records: TrigramRecords,
+    config: dict,
+    center: bool = False,
+    sample_sizes_file=None,
+) -> EffortGrid:
+    """Shows the average timing of the trigrams containing each character.
+    Returns the average timings (seconds, bias removed) as an effort grid.
+
+    Parameters
+    ----------
+    center : bool
+        If True, only the trigrams having the character in the middle are
+        used.
+    sample_sizes_file : str | Path | None
+        If given, the number of trigrams used for each character is written
+        into this file.
+    """
+    with metrics.stage("show.averages"):
+        grid = get_average_grid(records, config, center=center)
+    data = {
+        hand: dict(zip(chars, values.tolist()))
+        for hand, (chars, values) in grid.efforts.items()
+    }
+
+    with metrics.stage("show.colors"):
+        print_average_efforts(data)
+
+    if sample_sizes_file is not None:
+        write_sample_sizes(grid.sample_sizes, sample_sizes_file)
+    return grid
+
+
+def print_average_efforts(data: dict[str, dict[str, float]]):
+    """Prints the effort grid from the average timings (by hand and
+    character)."""
     mineffort = min(min(data["left"].values()), min(data["right"].values()))
     maxeffort = max(max(data["left"].values()), max(data["right"].values()))
     get_color = get_hex_func(1.0, maxeffort / mineffort)
@@ -127,18 +396,45 @@ def show_averages(file, config: dict, center: bool = False):
             print(f"Char {char}: {effort:.2f}  color: {get_color(effort)}")
 
 
-def get_hex_func(
-    min_value: float,
-    max_value: float,
-    min_color=(1, 1, 1),
-    max_color=(0.542, 0.211, 0.973),
-    n_bins=100,
-) -> Callable[[float], str]:
-    colors = [min_color, max_color]
-    custom_cmap = LinearSegmentedColormap.from_list(
-        "custom_color_map", colors, N=n_bins
-    )
+def get_average_grid(
+    records: TrigramRecords,
+    config: dict,
+    center: bool = False,
+    stats: dict[str, CharTimingStats] | None = None,
+) -> EffortGrid:
+    """The average timings (seconds, bias removed) of the trigrams containing
+    each character as an effort grid, without printing anything (see
+    show_averages).
+
+    Parameters
+    ----------
+    stats : dict | None
+        The CharTimingStats of each hand. Calculated if not given; pass them
+        to share them between the "average" and "average-center" grids.
+    """
+    efforts = {}
+    sample_sizes = {}
+    layout = compile_layout(config)
+    for hand in ("left", "right"):
+        chars = layout.hand_chars[hand]
+        if stats is not None:
+            hand_stats = stats[hand]
+        else:
+            hand_stats = get_char_timing_stats(
+                records, layout, hand, config["trigram_use_n_best"]
+            )
+        row = hand_stats.center if center else 0
+        bias = (
+            config["home_key_sequence_timing_left"]
+            if hand == "left"
+            else config["home_key_sequence_timing_right"]
+        )
+        efforts[hand] = (chars, hand_stats.mean[row] - bias)
+        sample_sizes.update(zip(chars, hand_stats.count[row].tolist()))
+    return EffortGrid(efforts, sample_sizes=sample_sizes)
 
-    norm = Normalize(vmin=min_value, vmax=max_value)
 
-    return lambda x: to_hex(custom_cmap(norm(x)))
+def write_sample_sizes(sample_sizes: dict[str, int], file):
+    with open(file, "w") as f:
+        for char, count in sample_sizes.items():
+            f.write(f"{char}: {count}\n")
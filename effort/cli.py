@@ -3,7 +3,7 @@ from __future__ import annotations
 import logging
 from enum import Enum
 from pathlib import Path
-from typing import Literal
+from typing import Literal, Optional
 
 import typer
 
@@ -13,10 +13,11 @@ except ImportError:
     # For older python versions
     from typing_extensions import Annotated  # type: ignore
 
-from effort import effort_record
-from effort.calculate import calculate
 from effort.config import read_config_file
 
+# The modules doing the actual work (and their dependencies, like pynput and
+# scipy) are imported inside the commands, so that the CLI starts fast.
+
 ARG_CONFIG_FILE = Annotated[
     Path,
     typer.Argument(
@@ -43,14 +44,99 @@ ARG_FORCE = Annotated[
 ]
 
 
+ARG_LIVE = Annotated[
+    bool,
+    typer.Option(
+        "--live",
+        help="Print the current effort grid (effort model) after each recorded trigram.",
+    ),
+]
+
+ARG_MODEL_STATE = Annotated[
+    Optional[Path],
+    typer.Option(
+        "--model-state",
+        help="Save the state of the online effort model into this file after each recorded trigram. If the file exists, the new recordings are added to it.",
+        show_default=False,
+    ),
+]
+
+ARG_EVENT_LOG = Annotated[
+    Optional[Path],
+    typer.Option(
+        "--event-log",
+        help="Save every key press and release (with timestamps) into this binary event log file. If the file exists, the new events are appended to it.",
+        show_default=False,
+    ),
+]
+
+ARG_PROFILE = Annotated[
+    bool,
+    typer.Option(
+        "--profile",
+        help="Print the time used in each stage (and its distribution, for stages run many times) after running.",
+    ),
+]
+
+ARG_METRICS_JSON = Annotated[
+    Optional[Path],
+    typer.Option(
+        "--metrics-json",
+        help="Write the time used in each stage (with histograms) into this JSON file.",
+        show_default=False,
+    ),
+]
+
+ARG_RESUME = Annotated[
+    bool,
+    typer.Option(
+        "--resume",
+        help="Continue an interrupted recording from its journal (<output file>.journal), from the first repetition not recorded yet.",
+    ),
+]
+
+
+ARG_PLAN = Annotated[
+    Optional[Path],
+    typer.Option(
+        "--plan",
+        help="Record a shard of this plan file (see effort_grid_plan) instead of a new random recording order.",
+        show_default=False,
+    ),
+]
+
+ARG_SHARD = Annotated[
+    int,
+    typer.Option(
+        "--shard",
+        help="The shard of the plan file to record (0, 1, ...).",
+    ),
+]
+
+
 def effort_grid_record(
     config_file: ARG_CONFIG_FILE,
     output_file: ARG_OUTPUT_FILE,
     force: ARG_FORCE = False,
+    live: ARG_LIVE = False,
+    model_state: ARG_MODEL_STATE = None,
+    event_log: ARG_EVENT_LOG = None,
+    resume: ARG_RESUME = False,
+    plan_file: ARG_PLAN = None,
+    shard: ARG_SHARD = 0,
+    profile: ARG_PROFILE = False,
+    metrics_json: ARG_METRICS_JSON = None,
 ):
     """Records effort grid data."""
+    from effort import metrics
+    from effort.journal import get_journal_file
 
-    if output_file.exists():
+    if resume:
+        if not get_journal_file(output_file).exists():
+            raise typer.BadParameter(
+                f"No journal file {get_journal_file(output_file)} to resume from."
+            )
+    elif output_file.exists():
         if not force:
             raise typer.BadParameter(
                 f"Output file {output_file} already exists. Use --force to overwrite."
@@ -59,7 +145,26 @@ def effort_grid_record(
             output_file.unlink()
 
     config = read_config_file(config_file)
-    effort_record(config, output_file)
+    plan = None
+    if plan_file is not None and not resume:
+        from effort.plan import get_shard, load_plan
+
+        try:
+            plan = get_shard(load_plan(plan_file), shard, config)
+        except ValueError as e:
+            raise typer.BadParameter(f"{plan_file}: {e}")
+    from effort.effort import effort_record
+
+    with metrics.profile(profile, metrics_json):
+        effort_record(
+            config,
+            output_file,
+            live=live,
+            model_state_file=model_state,
+            event_log_file=event_log,
+            resume=resume,
+            plan=plan,
+        )
     print(f"Done! Raw data saved to {output_file}")
 
 
@@ -76,13 +181,111 @@ class CalculationType(str, Enum):
     model = "model"
     average = "average"
     average_center = "average-center"
+    all = "all"
 
 
 ARG_TYPE = Annotated[
-    CalculationType,
+    Optional[list[CalculationType]],
     typer.Option(
         "--type",
-        help="How to calculate the results. 'model' will fit a linear model, 'average' will just average over the trigrams timings, and 'average-center' will average over the trigrams timings where given character is in the middle of the trigram.",
+        help="How to calculate the results. 'model' will fit a linear model, 'average' will just average over the trigrams timings, and 'average-center' will average over the trigrams timings where given character is in the middle of the trigram. Give --type more than once (or 'all') to show a combined table of several types. Defaults to 'model'.",
+        show_default=False,
+    ),
+]
+
+
+class ReportFormat(str, Enum):
+    text = "text"
+    json = "json"
+    csv = "csv"
+
+
+ARG_FORMAT = Annotated[
+    ReportFormat,
+    typer.Option(
+        "--format",
+        help="Format of the combined table of several calculation types.",
+    ),
+]
+
+ARG_REPORT_OUTPUT = Annotated[
+    Optional[Path],
+    typer.Option(
+        "--output",
+        help="Write the combined table of several calculation types into this file instead of printing it.",
+        show_default=False,
+    ),
+]
+
+
+ARG_MMAP = Annotated[
+    bool,
+    typer.Option(
+        "--mmap/--no-mmap",
+        help="Read binary record files through a memory map instead of loading them into memory. Has no effect on text record files.",
+    ),
+]
+
+
+ARG_SAMPLE_SIZES = Annotated[
+    Optional[Path],
+    typer.Option(
+        "--sample-sizes",
+        help="Write the number of trigrams used for each character into this file.",
+        show_default=False,
+    ),
+]
+
+
+ARG_BOOTSTRAP = Annotated[
+    int,
+    typer.Option(
+        "--bootstrap",
+        help="Number of bootstrap resamples used to calculate confidence intervals for the efforts (only with '--type model'). 0 disables the bootstrap.",
+    ),
+]
+
+ARG_CONFIDENCE = Annotated[
+    float,
+    typer.Option(
+        "--confidence",
+        help="Confidence level of the bootstrap confidence intervals.",
+    ),
+]
+
+ARG_JOBS = Annotated[
+    Optional[int],
+    typer.Option(
+        "--jobs",
+        help="Number of worker processes. Defaults to the number of CPUs.",
+        show_default=False,
+    ),
+]
+
+ARG_SEED = Annotated[
+    Optional[int],
+    typer.Option(
+        "--seed",
+        help="Seed for the random number generator.",
+        show_default=False,
+    ),
+]
+
+
+ARG_SVG = Annotated[
+    Optional[Path],
+    typer.Option(
+        "--svg",
+        help="Save the effort grid as an SVG keyboard heatmap into this file.",
+        show_default=False,
+    ),
+]
+
+ARG_CACHE = Annotated[
+    bool,
+    typer.Option(
+        "--cache/--no-cache",
+        help="Reuse the results of earlier runs with the same record file contents, config and options (cached in ~/.cache/effort-grid).",
     ),
 ]
 
@@ -90,12 +293,571 @@ ARG_TYPE = Annotated[
 def effort_grid_show(
     config_file: ARG_CONFIG_FILE,
     record_file: ARG_RAW_EFFORT_GRID_RECORD,
-    calctype: ARG_TYPE = "model",
+    calctypes: ARG_TYPE = None,
+    mmap: ARG_MMAP = True,
+    sample_sizes: ARG_SAMPLE_SIZES = None,
+    svg: ARG_SVG = None,
+    bootstrap: ARG_BOOTSTRAP = 0,
+    confidence: ARG_CONFIDENCE = 0.95,
+    jobs: ARG_JOBS = None,
+    seed: ARG_SEED = None,
+    cache: ARG_CACHE = True,
+    fmt: ARG_FORMAT = ReportFormat.text,
+    output: ARG_REPORT_OUTPUT = None,
+    profile: ARG_PROFILE = False,
+    metrics_json: ARG_METRICS_JSON = None,
 ):
     """Shows results based on recorded effort grid data."""
+    from effort import metrics
+
+    calctypes = [CalculationType(t) for t in calctypes or [CalculationType.model]]
+    if CalculationType.all in calctypes:
+        calctypes = [t for t in CalculationType if t != CalculationType.all]
+    calctypes = list(dict.fromkeys(calctypes))
+    if bootstrap and calctypes != [CalculationType.model]:
+        raise typer.BadParameter("--bootstrap can only be used with '--type model'")
+    if len(calctypes) > 1 and (sample_sizes is not None or svg is not None):
+        raise typer.BadParameter(
+            "--sample-sizes and --svg can only be used with a single --type"
+        )
+
+    with metrics.profile(profile, metrics_json, track_memory=True):
+        with metrics.stage("show.config"):
+            config = read_config_file(config_file)
+        if len(calctypes) > 1:
+            from effort.report import show_report
+
+            show_report(
+                record_file,
+                config,
+                [t.value for t in calctypes],
+                fmt=ReportFormat(fmt).value,
+                output_file=output,
+                mmap=mmap,
+            )
+            return
+
+        calctype = calctypes[0]
+        model_kwargs = {}
+        if calctype == CalculationType.model:
+            model_kwargs = dict(
+                bootstrap=bootstrap, confidence=confidence, n_jobs=jobs, seed=seed
+            )
+        from effort.cache import ResultCache
+        from effort.calculate import calculate
+
+        calculate(
+            record_file,
+            config,
+            calctype=CalculationType(calctype).value,
+            mmap=mmap,
+            sample_sizes_file=sample_sizes,
+            svg_file=svg,
+            cache=ResultCache() if cache else None,
+            **model_kwargs,
+        )
+
+
+ARG_CONVERT_SOURCE = Annotated[
+    Path,
+    typer.Argument(
+        help="Effort grid record file to convert (text or binary format).",
+        show_default=False,
+    ),
+]
+
+ARG_CONVERT_TARGET = Annotated[
+    Path,
+    typer.Argument(
+        help="Output file path for the converted effort grid record.",
+        show_default=False,
+    ),
+]
+
+
+class RecordFormat(str, Enum):
+    text = "text"
+    binary = "binary"
+
+
+ARG_TO = Annotated[
+    Optional[RecordFormat],
+    typer.Option(
+        "--to",
+        help="Format of the output file. By default, text files are converted to binary and binary files to text.",
+        show_default=False,
+    ),
+]
+
+
+def effort_grid_convert(
+    source: ARG_CONVERT_SOURCE,
+    target: ARG_CONVERT_TARGET,
+    to: ARG_TO = None,
+    force: ARG_FORCE = False,
+):
+    """Converts effort grid records between the text and the binary format."""
+
+    if target.exists() and not force:
+        raise typer.BadParameter(
+            f"Output file {target} already exists. Use --force to overwrite."
+        )
+
+    to_binary = None if to is None else to == RecordFormat.binary
+    from effort.records import convert_record_file
+
+    convert_record_file(source, target, to_binary=to_binary)
+    print(f"Done! Converted {source} to {target}")
+
+
+ARG_RECORD_A = Annotated[
+    Path,
+    typer.Argument(
+        help="First effort grid record file (A).",
+        show_default=False,
+    ),
+]
+
+ARG_RECORD_B = Annotated[
+    Path,
+    typer.Argument(
+        help="Second effort grid record file (B).",
+        show_default=False,
+    ),
+]
+
+
+class ComparisonType(str, Enum):
+    model = "model"
+    average = "average"
+
+
+ARG_COMPARE_TYPE = Annotated[
+    ComparisonType,
+    typer.Option(
+        "--type",
+        help="What to compare. 'model' compares the effort model coefficients and 'average' the average timings of the trigrams containing each character.",
+    ),
+]
+
+ARG_PERMUTATIONS = Annotated[
+    int,
+    typer.Option(
+        "--permutations",
+        help="Number of random permutations in the permutation test.",
+    ),
+]
+
+
+def effort_grid_compare(
+    config_file: ARG_CONFIG_FILE,
+    record_a: ARG_RECORD_A,
+    record_b: ARG_RECORD_B,
+    calctype: ARG_COMPARE_TYPE = "model",
+    permutations: ARG_PERMUTATIONS = 10_000,
+    jobs: ARG_JOBS = None,
+    seed: ARG_SEED = None,
+):
+    """Compares the per-character efforts of two effort grid records with a permutation test."""
+
+    from effort.compare import compare_records, show_comparison
+    from effort.records import load_records
+
+    config = read_config_file(config_file)
+    results = compare_records(
+        load_records(record_a),
+        load_records(record_b),
+        config,
+        calctype=ComparisonType(calctype).value,
+        n_permutations=permutations,
+        seed=seed,
+        n_jobs=jobs,
+    )
+    show_comparison(results, names=(record_a, record_b))
+
+
+ARG_EFFORT_FILES = Annotated[
+    list[Path],
+    typer.Argument(
+        help="Effort grid files (each line has a character and its effort, like effort-grid-estimates.txt).",
+        show_default=False,
+    ),
+]
+
+ARG_OUTPUT_DIR = Annotated[
+    Path,
+    typer.Option(
+        "--output-dir",
+        help="Directory for the SVG files. Each effort grid file <name>.txt is saved as <name>.svg.",
+    ),
+]
+
+ARG_COMMON_SCALE = Annotated[
+    bool,
+    typer.Option(
+        "--common-scale",
+        help="Use the same color scale for all the heatmaps.",
+    ),
+]
+
+
+def effort_grid_svg(
+    config_file: ARG_CONFIG_FILE,
+    effort_files: ARG_EFFORT_FILES,
+    output_dir: ARG_OUTPUT_DIR = Path("."),
+    common_scale: ARG_COMMON_SCALE = False,
+):
+    """Renders effort grid files as SVG keyboard heatmaps."""
+
+    from effort.grid import read_effort_file
+    from effort.svg import get_layout, render_svgs, write_svgs
+
+    config = read_config_file(config_file)
+    grids = {str(file): read_effort_file(file, config) for file in effort_files}
+    svgs = render_svgs(grids, layout=get_layout(config), common_scale=common_scale)
+    try:
+        files = write_svgs(svgs, output_dir)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    for file in files:
+        print(f"Saved {file}")
+
+
+class DesignCriterion(str, Enum):
+    d_optimal = "d-optimal"
+    a_optimal = "a-optimal"
+
+
+ARG_CRITERION = Annotated[
+    DesignCriterion,
+    typer.Option(
+        "--criterion",
+        help="'d-optimal' maximizes the determinant of XᵀWX of the effort model, and 'a-optimal' minimizes the sum of the coefficient variances.",
+    ),
+]
+
+ARG_RECORDINGS = Annotated[
+    Optional[int],
+    typer.Option(
+        "--recordings",
+        help="Target number of recordings (trigram repetitions, both hands). Defaults to the number of recordings in the config.",
+        show_default=False,
+    ),
+]
+
+ARG_NOISE_RECORDS = Annotated[
+    Optional[Path],
+    typer.Option(
+        "--records",
+        help="Effort grid record file for estimating the timing noise. With it, the expected standard deviations are given in milliseconds.",
+        show_default=False,
+    ),
+]
+
+
+def effort_grid_design(
+    config_file: ARG_CONFIG_FILE,
+    criterion: ARG_CRITERION = "d-optimal",
+    recordings: ARG_RECORDINGS = None,
+    records: ARG_NOISE_RECORDS = None,
+    seed: ARG_SEED = None,
+):
+    """Shows the expected precision of the effort model with optimally selected trigrams, compared to random trigrams. Use "trigram_selection" in the config to record the optimal trigrams."""
+
+    from effort.design import estimate_noise_variance, show_design_report
+
+    config = read_config_file(config_file)
+    sigma2 = None
+    if records is not None:
+        from effort.records import load_records
+
+        sigma2 = estimate_noise_variance(load_records(records), config)
+        print(f"Timing noise (std of a single timing): {sigma2**0.5 * 1000:.1f} ms")
+    show_design_report(
+        config,
+        criterion=DesignCriterion(criterion).value,
+        n_recordings=recordings,
+        sigma2=sigma2,
+        seed=seed,
+    )
+
+
+ARG_EFFORT_FILE = Annotated[
+    Path,
+    typer.Argument(
+        help="Effort grid file (each line has a character and its effort, like effort-grid-estimates.txt).",
+        show_default=False,
+    ),
+]
+
+ARG_CORPUS_FILES = Annotated[
+    list[Path],
+    typer.Argument(
+        help="UTF-8 text files to score.",
+        show_default=False,
+    ),
+]
+
+
+def effort_grid_score(
+    config_file: ARG_CONFIG_FILE,
+    effort_file: ARG_EFFORT_FILE,
+    corpus_files: ARG_CORPUS_FILES,
+    jobs: ARG_JOBS = None,
+):
+    """Scores text files with an effort grid: the total effort per character, finger and hand, and the same finger bigrams."""
+
+    from effort.grid import read_effort_file
+    from effort.score import score_files
+
+    config = read_config_file(config_file)
+    score_files(
+        corpus_files, read_effort_file(effort_file, config), config, n_jobs=jobs
+    )
+
+
+ARG_RESTARTS = Annotated[
+    int,
+    typer.Option(
+        "--restarts",
+        help="Number of independent simulated annealing runs.",
+    ),
+]
+
+ARG_ITERATIONS = Annotated[
+    int,
+    typer.Option(
+        "--iterations",
+        help="Number of swaps tried in each simulated annealing run.",
+    ),
+]
+
+ARG_SFB_PENALTY = Annotated[
+    float,
+    typer.Option(
+        "--sfb-penalty",
+        help="Cost of a same finger bigram, in the units of the effort grid.",
+    ),
+]
+
+ARG_FIXED = Annotated[
+    str,
+    typer.Option(
+        "--fixed",
+        help="Characters that are kept on their current keys. The characters of the home key sequences are always kept.",
+    ),
+]
+
+ARG_TOP = Annotated[
+    int,
+    typer.Option(
+        "--top",
+        help="Number of the best layouts to save.",
+    ),
+]
+
+
+ARG_LAYOUT_OUTPUT_DIR = Annotated[
+    Path,
+    typer.Option(
+        "--output-dir",
+        help="Directory for the best layouts, saved as config files layout-<rank>.yaml.",
+    ),
+]
+
+
+def effort_grid_optimize(
+    config_file: ARG_CONFIG_FILE,
+    effort_file: ARG_EFFORT_FILE,
+    corpus_files: ARG_CORPUS_FILES,
+    restarts: ARG_RESTARTS = 8,
+    iterations: ARG_ITERATIONS = 200_000,
+    sfb_penalty: ARG_SFB_PENALTY = 1.0,
+    fixed: ARG_FIXED = "",
+    top: ARG_TOP = 3,
+    output_dir: ARG_LAYOUT_OUTPUT_DIR = Path("."),
+    jobs: ARG_JOBS = None,
+    seed: ARG_SEED = None,
+):
+    """Searches for the character to key assignment with the smallest effort for the text files. The efforts of the keys are taken from the effort grid file (the effort of the character on the key in the config). The best layouts are saved as config files layout-<rank>.yaml."""
+
+    import numpy as np
+
+    from effort.grid import read_effort_file
+    from effort.optimize import LayoutProblem, optimize_layout, write_layout_configs
+    from effort.score import count_corpus, get_layout_chars
 
     config = read_config_file(config_file)
-    calculate(record_file, config, calctype=calctype)
+    counts = count_corpus(corpus_files, get_layout_chars(config), n_jobs=jobs)
+    try:
+        problem = LayoutProblem(
+            counts,
+            read_effort_file(effort_file, config),
+            config,
+            sfb_penalty=sfb_penalty,
+            fixed=fixed,
+        )
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--fixed")
+    print(f"Current layout cost: {problem.cost(np.arange(len(problem.chars))):.4f}")
+    results = optimize_layout(
+        problem, n_restarts=restarts, n_iterations=iterations, seed=seed, n_jobs=jobs
+    )
+    for file, (cost, _) in zip(
+        write_layout_configs(problem, results, output_dir, n_best=top), results
+    ):
+        print(f"Saved {file} (cost: {cost:.4f})")
+
+
+ARG_BATCH_RECORD_FILES = Annotated[
+    list[str],
+    typer.Argument(
+        help="Effort grid record files, directories (all the files in them) or glob patterns (like 'data/*.txt').",
+        show_default=False,
+    ),
+]
+
+ARG_BATCH_CONFIG_FILES = Annotated[
+    list[Path],
+    typer.Option(
+        "--config",
+        help="Path to a Effort grid record configuration YAML file. Give more than once to calculate the efforts with several configs (layout variants).",
+        show_default=False,
+    ),
+]
+
+ARG_BATCH_OUTPUT = Annotated[
+    Path,
+    typer.Option(
+        "--output",
+        help="Write the results into this file: CSV, or NPZ (one array per column) if the name ends with .npz.",
+        show_default=False,
+    ),
+]
+
+ARG_POOL = Annotated[
+    bool,
+    typer.Option(
+        "--pool/--no-pool",
+        help="Also calculate the efforts of all the record files pooled together.",
+    ),
+]
+
+
+def effort_grid_batch(
+    record_files: ARG_BATCH_RECORD_FILES,
+    config_files: ARG_BATCH_CONFIG_FILES,
+    output: ARG_BATCH_OUTPUT,
+    calctypes: ARG_TYPE = None,
+    pool: ARG_POOL = True,
+    jobs: ARG_JOBS = None,
+):
+    """Calculates the efforts of many record files with one or more configs in parallel, and writes them into one table with a row per record file, config, calculation type and character."""
+
+    from effort.batch import find_record_files, run_batch, write_table
+
+    calctypes = [CalculationType(t) for t in calctypes or [CalculationType.model]]
+    if CalculationType.all in calctypes:
+        calctypes = [t for t in CalculationType if t != CalculationType.all]
+    files = find_record_files(record_files)
+    if not files:
+        raise typer.BadParameter("No record files found")
+    configs = {str(file): read_config_file(file) for file in config_files}
+    rows = run_batch(
+        files,
+        configs,
+        calctypes=list(dict.fromkeys(t.value for t in calctypes)),
+        pool=pool,
+        n_jobs=jobs,
+    )
+    write_table(rows, output)
+    print(f"Done! Saved {len(rows)} rows to {output}")
+
+
+ARG_PLAN_FILE = Annotated[
+    Path,
+    typer.Argument(
+        help="Path to the recording plan (JSON) file.",
+        show_default=False,
+    ),
+]
+
+ARG_SHARDS = Annotated[
+    int,
+    typer.Option(
+        "--shards",
+        help="Split the plan into this many shards, to be recorded separately (by different people or on different machines).",
+    ),
+]
+
+
+def effort_grid_plan(
+    config_file: ARG_CONFIG_FILE,
+    plan_file: ARG_PLAN_FILE,
+    shards: ARG_SHARDS = 1,
+    seed: ARG_SEED = None,
+    force: ARG_FORCE = False,
+):
+    """Plans the recording order (characters and trigrams) with a seed, split into shards. Record each shard with effort_grid_record --plan <plan file> --shard <shard>, and combine the record files with effort_grid_merge."""
+
+    if plan_file.exists() and not force:
+        raise typer.BadParameter(
+            f"Plan file {plan_file} already exists. Use --force to overwrite."
+        )
+    config = read_config_file(config_file)
+    from effort.plan import create_plan, format_plan_summary, save_plan
+
+    try:
+        plan = create_plan(config, n_shards=shards, seed=seed)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    save_plan(plan, plan_file)
+    print(format_plan_summary(plan))
+    print(f"Done! Plan saved to {plan_file}")
+
+
+ARG_SHARD_RECORD_FILES = Annotated[
+    list[Path],
+    typer.Argument(
+        help="The effort grid record files of the shards of the plan (in any order).",
+        show_default=False,
+    ),
+]
+
+ARG_MERGE_OUTPUT = Annotated[
+    Path,
+    typer.Option(
+        "--output",
+        help="Write the merged records into this (binary) effort grid record file.",
+        show_default=False,
+    ),
+]
+
+
+def effort_grid_merge(
+    plan_file: ARG_PLAN_FILE,
+    record_files: ARG_SHARD_RECORD_FILES,
+    output: ARG_MERGE_OUTPUT,
+    force: ARG_FORCE = False,
+):
+    """Merges the record files of the shards of a plan into one binary record file, with the shard, plan index and source file of each trigram as extra columns. The merged file can be used like any record file (for example with effort_grid_show)."""
+
+    if output.exists() and not force:
+        raise typer.BadParameter(
+            f"Output file {output} already exists. Use --force to overwrite."
+        )
+    from effort.plan import load_plan, merge_shards
+
+    try:
+        coverage = merge_shards(load_plan(plan_file), record_files, output)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    for shard, (n_recorded, n_planned) in coverage.items():
+        status = "" if n_recorded == n_planned else "  (incomplete)"
+        if not n_recorded:
+            status = "  (missing)"
+        print(f"Shard {shard}: {n_recorded}/{n_planned} trigrams{status}")
+    print(f"Done! Merged records saved to {output}")
 
 
 def cli_effort_grid_record():
@@ -108,6 +870,51 @@ def cli_effort_grid_show():
     typer.run(effort_grid_show)
 
 
+def cli_effort_grid_convert():
+    setup_logging()
+    typer.run(effort_grid_convert)
+
+
+def cli_effort_grid_compare():
+    setup_logging()
+    typer.run(effort_grid_compare)
+
+
+def cli_effort_grid_svg():
+    setup_logging()
+    typer.run(effort_grid_svg)
+
+
+def cli_effort_grid_design():
+    setup_logging()
+    typer.run(effort_grid_design)
+
+
+def cli_effort_grid_score():
+    setup_logging()
+    typer.run(effort_grid_score)
+
+
+def cli_effort_grid_optimize():
+    setup_logging()
+    typer.run(effort_grid_optimize)
+
+
+def cli_effort_grid_batch():
+    setup_logging()
+    typer.run(effort_grid_batch)
+
+
+def cli_effort_grid_plan():
+    setup_logging()
+    typer.run(effort_grid_plan)
+
+
+def cli_effort_grid_merge():
+    setup_logging()
+    typer.run(effort_grid_merge)
+
+
 def setup_logging():
     logging.basicConfig(
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
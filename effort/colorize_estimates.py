@@ -1,24 +1,12 @@
-from typing import Callable, Iterable
+"""Prints the color of each character of an effort grid file.
 
-from matplotlib.colors import LinearSegmentedColormap, Normalize, to_hex, to_rgb
+Usage: python -m effort.colorize_estimates [<effort-file> [<min-color> <max-color>]]
 
+The colors can be hex colors ("#8a36f8" or "#f00"), gray levels ("0.5") or
+names of basic colors ("red", "purple", see effort.colors.NAMED_COLORS).
+"""
 
-def get_hex_func(
-    min_value: float,
-    max_value: float,
-    min_color=(1, 1, 1),
-    max_color=(0.542, 0.211, 0.973),
-    n_bins=100,
-) -> Callable[[float], str]:
-    colors = [min_color, max_color]
-    custom_cmap = LinearSegmentedColormap.from_list(
-        "custom_color_map", colors, N=n_bins
-    )
-
-    norm = Normalize(vmin=min_value, vmax=max_value)
-
-    return lambda x: to_hex(custom_cmap(norm(x)))
-
+from effort.colors import get_hex_func, to_rgb
 
 if __name__ == "__main__":
     import sys
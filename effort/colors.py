@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+from typing import Callable
+
+import numpy as np
+
+DEFAULT_MIN_COLOR = (1, 1, 1)
+DEFAULT_MAX_COLOR = (0.542, 0.211, 0.973)
+
+# Color used for missing (NaN) values.
+BAD_COLOR = "#000000"
+
+
+def get_color_lut(min_color=DEFAULT_MIN_COLOR, max_color=DEFAULT_MAX_COLOR, n_bins=100):
+    """Linearly interpolated colors (RGB, 0..1) from min_color to max_color, in
+    an array of shape (n_bins, 3). Gives the same colors as a matplotlib
+    LinearSegmentedColormap.from_list with N=n_bins."""
+    min_color = np.asarray(min_color, dtype=float)
+    max_color = np.asarray(max_color, dtype=float)
+    distance = np.linspace(0, 1, n_bins)[:, None]
+    lut = distance * (max_color - min_color) + min_color
+    lut[0], lut[-1] = min_color, max_color
+    return np.clip(lut, 0, 1)
+
+
+def get_hex_lut(
+    min_color=DEFAULT_MIN_COLOR, max_color=DEFAULT_MAX_COLOR, n_bins=100
+) -> np.ndarray:
+    """The colors of get_color_lut as an array of hex strings."""
+    lut = get_color_lut(min_color, max_color, n_bins)
+    return np.array([rgb_to_hex(rgb) for rgb in lut])
+
+
+def get_color_bins(values, min_value: float, max_value: float, n_bins=100):
+    """Color bin index for each value. The values from min_value to max_value
+    are split into n_bins equally wide bins. Values outside the range get the
+    first or the last bin, and NaN values get -1."""
+    values = np.asarray(values, dtype=float)
+    scale = max_value - min_value
+    with np.errstate(invalid="ignore", divide="ignore"):
+        normed = (values - min_value) / scale if scale else np.zeros_like(values)
+        bins = np.clip(normed * n_bins, 0, n_bins - 1).astype(int)
+    return np.where(np.isnan(values), -1, bins)
+
+
+def values_to_hex(
+    values,
+    min_value: float,
+    max_value: float,
+    min_color=DEFAULT_MIN_COLOR,
+    max_color=DEFAULT_MAX_COLOR,
+    n_bins=100,
+) -> np.ndarray:
+    """Maps an array of values to hex colors (an array of strings of the same
+    shape) in a single lookup."""
+    lut = np.append(get_hex_lut(min_color, max_color, n_bins), BAD_COLOR)
+    return lut[get_color_bins(values, min_value, max_value, n_bins)]
+
+
+def get_hex_func(
+    min_value: float,
+    max_value: float,
+    min_color=DEFAULT_MIN_COLOR,
+    max_color=DEFAULT_MAX_COLOR,
+    n_bins=100,
+) -> Callable[[float], str]:
+    """Returns a function mapping a single value to a hex color (see
+    values_to_hex)."""
+    lut = np.append(get_hex_lut(min_color, max_color, n_bins), BAD_COLOR)
+    return lambda x: str(lut[get_color_bins(x, min_value, max_value, n_bins)])
+
+
+def rgb_to_hex(rgb) -> str:
+    return "#" + "".join(format(round(val * 255), "02x") for val in rgb)
+
+
+def to_rgb(color: str) -> tuple[float, float, float]:
+    """Converts a color to RGB (0..1), like matplotlib.colors.to_rgb for the
+    color strings: hex colors ("#rrggbb", "#rgb", or with an alpha channel,
+    which is ignored), a gray level ("0.0" to "1.0"), the single letter
+    colors ("r", "g", "b", "c", "m", "y", "k", "w") and the NAMED_COLORS."""
+    name = color.strip().lower()
+    name = NAMED_COLORS.get(name, name)
+    if isinstance(name, tuple):
+        return name
+    if name.startswith("#"):
+        digits = name[1:]
+        if len(digits) in (3, 4):
+            digits = "".join(d * 2 for d in digits)
+        if len(digits) in (6, 8):
+            try:
+                return tuple(int(digits[i : i + 2], 16) / 255 for i in (0, 2, 4))
+            except ValueError:
+                pass
+    else:
+        try:
+            gray = float(name)
+        except ValueError:
+            gray = None
+        if gray is not None and 0 <= gray <= 1:
+            return (gray, gray, gray)
+    raise ValueError(f"Invalid color: {color}")
+
+
+# The colors which can be given by name (see to_rgb): the single letter
+# colors of matplotlib and the basic CSS colors.
+NAMED_COLORS: dict[str, str | tuple[float, float, float]] = {
+    "b": (0.0, 0.0, 1.0),
+    "g": (0.0, 0.5, 0.0),
+    "r": (1.0, 0.0, 0.0),
+    "c": (0.0, 0.75, 0.75),
+    "m": (0.75, 0.0, 0.75),
+    "y": (0.75, 0.75, 0.0),
+    "k": (0.0, 0.0, 0.0),
+    "w": (1.0, 1.0, 1.0),
+    "black": "#000000",
+    "white": "#ffffff",
+    "gray": "#808080",
+    "grey": "#808080",
+    "silver": "#c0c0c0",
+    "red": "#ff0000",
+    "maroon": "#800000",
+    "orange": "#ffa500",
+    "yellow": "#ffff00",
+    "olive": "#808000",
+    "lime": "#00ff00",
+    "green": "#008000",
+    "aqua": "#00ffff",
+    "cyan": "#00ffff",
+    "teal": "#008080",
+    "blue": "#0000ff",
+    "navy": "#000080",
+    "fuchsia": "#ff00ff",
+    "magenta": "#ff00ff",
+    "purple": "#800080",
+    "pink": "#ffc0cb",
+    "brown": "#a52a2a",
+}
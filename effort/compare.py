@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from effort.bootstrap import get_pair_matrix, map_batches, solve_weighted_batch
+from effort.calculate import get_design_matrix
+from effort.layout import compile_layout
+from effort.records import TrigramRecords, concat_records
+
+
+class ComparisonResult:
+    """Per-character effort difference between two sets of records and its
+    permutation test p-values (for one hand).
+
+    Attributes
+    ----------
+    chars : str
+        The characters of the hand.
+    effort_a, effort_b : np.ndarray
+        The efforts (seconds, bias removed) calculated from the records A and
+        B. NaN for the characters without trigrams in the records.
+    pvalues : np.ndarray
+        Two-sided permutation test p-value for the difference effort_a -
+        effort_b of each character. NaN for the characters without trigrams
+        in A or in B, as their difference cannot be calculated.
+    """
+
+    def __init__(self, chars: str, effort_a: np.ndarray, effort_b: np.ndarray, pvalues):
+        self.chars = chars
+        self.effort_a = effort_a
+        self.effort_b = effort_b
+        self.pvalues = pvalues
+
+    @property
+    def difference(self) -> np.ndarray:
+        return self.effort_a - self.effort_b
+
+
+def compare_records(
+    records_a: TrigramRecords,
+    records_b: TrigramRecords,
+    config: dict,
+    calctype: str = "model",
+    n_permutations: int = 10_000,
+    seed: int | None = None,
+    n_jobs: int | None = None,
+) -> dict[str, ComparisonResult]:
+    """Tests if the per-character efforts differ between two sets of records.
+
+    The trigrams of A and B are pooled, and the A/B labels of the trigrams
+    are permuted n_permutations times. For each permutation the efforts of
+    both groups are recalculated. A label permutation is just a pair of row
+    weight vectors, so the permutations are evaluated in batches (see
+    solve_weighted_batch) and the batches are spread over n_jobs processes.
+
+    The characters without trigrams in A or in B (a zero diagonal element
+    of XᵀWX of the group) are not tested: their efforts in the group without
+    trigrams and their p-values are NaN. A permutation leaving a tested
+    character without trigrams in one of the groups gives it a NaN effort
+    in that group (with both calculation types), and counts as extreme.
+
+    Parameters
+    ----------
+    calctype : str
+        "model" compares the effort model coefficients, and "average" the
+        average timing of the trigrams containing the character.
+    """
+    pooled = concat_records([records_a, records_b])
+    is_a = np.arange(len(pooled)) < len(records_a)
+
+    n_best = config["trigram_use_n_best"]
+    layout = compile_layout(config)
+    results = {}
+    for hand in ("left", "right"):
+        chars = layout.hand_chars[hand]
+        X, rows = get_design_matrix(pooled, layout, hand)
+        y = pooled.mean_best_timings(n_best)[rows]
+        y = y - config[f"home_key_sequence_timing_{hand}"]
+        labels = is_a[rows]
+        if calctype == "model":
+            weights = pooled.n_used(n_best)[rows].astype(float)
+        else:
+            # Like in show_averages, each trigram has the same weight.
+            weights = np.ones(len(rows))
+
+        args = _get_batch_args(X, y, weights, calctype)
+        observed = _group_difference(*args, labels[None, :])[0]
+        permuted = map_batches(
+            _permutation_batch,
+            (*args, labels),
+            n_permutations,
+            n_rows=X.shape[0],
+            seed=seed,
+            n_jobs=n_jobs,
+        )
+        is_extreme = np.abs(permuted) >= np.abs(observed) - 1e-12
+        n_extreme = (is_extreme | np.isnan(permuted)).sum(axis=0)
+        pvalues = (1 + n_extreme) / (1 + n_permutations)
+
+        # The diagonal of XᵀWX of each group (X has only ones).
+        in_a = np.asarray(X.T @ (weights * labels)).ravel() > 0
+        in_b = np.asarray(X.T @ (weights * ~labels)).ravel() > 0
+        effort_a = _group_efforts(*args, (weights * labels)[None, :])[0]
+        effort_b = _group_efforts(*args, (weights * ~labels)[None, :])[0]
+        effort_a[~in_a] = np.nan
+        effort_b[~in_b] = np.nan
+        pvalues[~(in_a & in_b)] = np.nan
+        results[hand] = ComparisonResult(chars, effort_a, effort_b, pvalues)
+    return results
+
+
+def show_comparison(results: dict[str, ComparisonResult], names=("A", "B")):
+    name_a, name_b = names
+    print(f"A: {name_a}\nB: {name_b}")
+    for hand, result in results.items():
+        print(f"\nHand: {hand}")
+        for char, effort_a, effort_b, diff, pvalue in zip(
+            result.chars,
+            result.effort_a,
+            result.effort_b,
+            result.difference,
+            result.pvalues,
+        ):
+            if np.isnan(pvalue):
+                print(
+                    f"Char {char}: A {_format_ms(effort_a)}  B {_format_ms(effort_b)}  diff n/a  p=n/a"
+                )
+                continue
+            print(
+                f"Char {char}: A {effort_a * 1000:.0f} ms  B {effort_b * 1000:.0f} ms  diff {diff * 1000:+.0f} ms  p={pvalue:.4f}"
+            )
+
+
+def _format_ms(effort: float) -> str:
+    return "n/a" if np.isnan(effort) else f"{effort * 1000:.0f} ms"
+
+
+def _get_batch_args(X: csr_matrix, y: np.ndarray, weights: np.ndarray, calctype):
+    # The batch functions get (calctype, M, Xy, weights), where M is the pair
+    # matrix for "model" and the design matrix for "average".
+    Xy = csr_matrix(X.multiply(y[:, None]))
+    if calctype == "model":
+        return (calctype, get_pair_matrix(X), Xy, weights)
+    elif calctype == "average":
+        return (calctype, X, Xy, weights)
+    raise ValueError(f"Unknown calculation type: {calctype}")
+
+
+def _group_efforts(calctype, M, Xy, weights, W):
+    if calctype == "model":
+        k = Xy.shape[1]
+        efforts = solve_weighted_batch(M, Xy, W, k)
+        # solve_weighted_batch gives 0 for a character without trigrams in
+        # the group (a zero diagonal element of XᵀWX); it has no effort.
+        diagonal = np.asarray((M[:, np.arange(k) * (k + 1)].T @ W.T).T)
+        efforts[diagonal == 0] = np.nan
+        return efforts
+    # Weighted average of the trigram timings containing each character.
+    total = np.asarray((Xy.T @ W.T).T)
+    count = np.asarray((M.T @ W.T).T)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return total / count
+
+
+def _group_difference(calctype, M, Xy, weights, labels):
+    efforts_a = _group_efforts(calctype, M, Xy, weights, weights * labels)
+    efforts_b = _group_efforts(calctype, M, Xy, weights, weights * ~labels)
+    return efforts_a - efforts_b
+
+
+def _permutation_batch(calctype, M, Xy, weights, labels, n_permutations, seed):
+    rng = np.random.default_rng(seed)
+    permuted = rng.permuted(np.tile(labels, (n_permutations, 1)), axis=1)
+    return _group_difference(calctype, M, Xy, weights, permuted)
@@ -13,19 +13,23 @@ class Config(TypedDict):
     right: str
 
 
-def get_chars_for_hand(hand: Hand, config: dict):
-    chars_lst = []
-    chars_hand = config[hand]
-    for finger in FINGERS:
-        chars_lst.append(chars_hand[finger])
-    return "".join(chars_lst)
+def get_chars_for_hand(hand: Hand, config: dict) -> str:
+    from effort.layout import compile_layout
+
+    return compile_layout(config).hand_chars[hand]
 
 
 def read_config_file(file) -> Config:
+    """Reads a config file. The layout of the config is validated (and
+    compiled, see effort.layout.compile_layout)."""
+    from effort.layout import compile_layout
+
     file = Path(file)
     if not file.exists():
         raise FileNotFoundError(f"File {file} not found")
-    return parse_config(file.read_text())
+    config = parse_config(file.read_text())
+    compile_layout(config)
+    return config
 
 
 def parse_config(config: str) -> Config:
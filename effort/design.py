@@ -0,0 +1,267 @@
+"""Selection of the trigrams to record (experimental design).
+
+The effort model of a hand (see calculate.show_model) is a linear model
+where each trigram is a row with a 1 for each of its characters. The
+precision of the fitted efforts depends on which trigrams are recorded: the
+covariance of the coefficients is σ² (XᵀWX)⁻¹. Instead of picking random
+trigrams, the trigrams can be picked greedily to minimize the determinant
+(D-optimal) or the trace (A-optimal) of (XᵀWX)⁻¹.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from effort.layout import compile_layout
+
+CRITERIA = ("d-optimal", "a-optimal")
+
+# Initial XᵀWX is RIDGE * I, so that it can be inverted before the first
+# trigrams are selected.
+RIDGE = 1e-3
+
+
+class TrigramCandidates:
+    """All the valid (SFB free) trigrams of one hand.
+
+    A valid trigram has three characters typed with three different fingers,
+    like the trigrams from effort.effort.get_trigrams.
+
+    Attributes
+    ----------
+    chars : str
+        The characters of the hand (see get_chars_for_hand).
+    indices : np.ndarray
+        The trigrams as indices of chars, in an array of shape (n, 3).
+    """
+
+    def __init__(self, chars: str, indices: np.ndarray):
+        self.chars = chars
+        self.indices = indices
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def trigrams(self, rows=slice(None)) -> list[str]:
+        chars = np.array(list(self.chars))
+        return ["".join(t) for t in chars[self.indices[rows]].tolist()]
+
+    def design_matrix(self, rows=slice(None)) -> np.ndarray:
+        """The 0/1 model matrix (dense) of the trigrams."""
+        indices = self.indices[rows]
+        X = np.zeros((len(indices), len(self.chars)))
+        np.put_along_axis(X, indices, 1.0, axis=1)
+        return X
+
+
+def enumerate_trigrams(hand: str, config: dict) -> TrigramCandidates:
+    layout = compile_layout(config)
+    chars = layout.hand_chars[hand]
+    fingers = layout.key_finger[layout.hand_slice(hand)]
+    k = len(chars)
+    first, middle, last = (a.ravel() for a in np.indices((k, k, k)))
+    valid = (
+        (fingers[first] != fingers[middle])
+        & (fingers[last] != fingers[middle])
+        & (fingers[first] != fingers[last])
+    )
+    indices = np.column_stack((first[valid], middle[valid], last[valid]))
+    return TrigramCandidates(chars, indices)
+
+
+def select_trigrams(
+    candidates: TrigramCandidates,
+    n_trigrams: int,
+    criterion: str = "d-optimal",
+    weight: float = 1.0,
+    seed: int | None = None,
+) -> np.ndarray:
+    """Greedily selects n_trigrams (different) trigrams for the effort model.
+
+    At each step, the trigram giving the largest improvement of the
+    criterion is added, and (XᵀWX)⁻¹ is updated with the Sherman–Morrison
+    formula. A trigram row has only three nonzeros, so the score of all the
+    candidates is calculated from 3 x 3 blocks (and three columns) of the
+    inverse.
+
+    Parameters
+    ----------
+    criterion : str
+        "d-optimal" maximizes the determinant of XᵀWX, "a-optimal" minimizes
+        the trace of (XᵀWX)⁻¹ (the sum of the coefficient variances).
+    weight : float
+        The sample weight of a trigram: the number of its timings used in the
+        model (trigram_use_n_best).
+    seed : int | None
+        Seed for breaking ties between equally good trigrams.
+
+    Returns
+    -------
+    np.ndarray
+        The selected rows of candidates, in selection order.
+    """
+    if criterion not in CRITERIA:
+        raise ValueError(f"Unknown design criterion: {criterion}")
+    n_trigrams = min(n_trigrams, len(candidates))
+    # Ties are broken by a random order of the candidates.
+    order = np.random.default_rng(seed).permutation(len(candidates))
+    idx = candidates.indices[order]
+    available = np.ones(len(idx), dtype=bool)
+    M_inv = np.eye(len(candidates.chars)) / RIDGE
+
+    selected = []
+    for _ in range(n_trigrams):
+        # quad = xᵀ M⁻¹ x for each candidate x.
+        quad = M_inv[idx[:, :, None], idx[:, None, :]].sum(axis=(1, 2))
+        if criterion == "d-optimal":
+            # det(M + w x xᵀ) = det(M) (1 + w xᵀ M⁻¹ x)
+            score = quad
+        else:
+            # trace decreases by w |M⁻¹ x|² / (1 + w xᵀ M⁻¹ x)
+            v = M_inv[:, idx].sum(axis=2)
+            score = weight * (v**2).sum(axis=0) / (1 + weight * quad)
+        score[~available] = -np.inf
+        best = int(np.argmax(score))
+        available[best] = False
+        selected.append(order[best])
+
+        v = M_inv[:, idx[best]].sum(axis=1)
+        M_inv -= weight * np.outer(v, v) / (1 + weight * quad[best])
+    return np.array(selected, dtype=np.intp)
+
+
+def get_coefficient_variance(X: np.ndarray, weight: float = 1.0, sigma2=1.0):
+    """Expected variance of the effort model coefficients, σ² diag((XᵀWX)⁻¹),
+    for a design X where each trigram has the same weight. The coefficients
+    not identified by the design get an infinite variance."""
+    xtx = weight * X.T @ X
+    if np.linalg.matrix_rank(xtx) < len(xtx):
+        variance = np.full(len(xtx), np.inf)
+        identified = X.any(axis=0)
+        if identified.any():
+            sub = np.ix_(identified, identified)
+            variance[identified] = np.diag(np.linalg.pinv(xtx[sub]))
+        return sigma2 * variance
+    return sigma2 * np.diag(np.linalg.inv(xtx))
+
+
+def get_design_trigrams(
+    hand: str,
+    config: dict,
+    criterion: str,
+    n_trigrams: int | None = None,
+    seed: int | None = None,
+) -> list[str]:
+    """Optimal trigrams for the hand. By default, the same number of
+    trigrams is selected as in a random design (trigrams_per_char for each
+    character)."""
+    candidates = enumerate_trigrams(hand, config)
+    if n_trigrams is None:
+        n_trigrams = config["trigrams_per_char"] * len(candidates.chars)
+    rows = select_trigrams(
+        candidates, n_trigrams, criterion, weight=get_weight(config), seed=seed
+    )
+    return candidates.trigrams(rows)
+
+
+def get_weight(config: dict) -> int:
+    return min(config["trigram_use_n_best"], config["trigram_repeat_times"])
+
+
+def estimate_noise_variance(records, config: dict) -> float:
+    """Estimates σ², the variance of a single timing around the effort model,
+    from the residuals of the model fitted to the records."""
+    from effort.calculate import fit_effort_model, read_xy_data
+
+    layout = compile_layout(config)
+    total, dof = 0.0, 0
+    for hand in ("left", "right"):
+        X, y, weights = read_xy_data(
+            records, config["trigram_use_n_best"], layout, hand
+        )
+        y = y - config[f"home_key_sequence_timing_{hand}"]
+        residuals = y - X @ fit_effort_model(X, y, weights)
+        # The variance of a mean of w timings is σ² / w.
+        total += float(weights @ residuals**2)
+        dof += X.shape[0] - X.shape[1]
+    return total / dof
+
+
+def show_design_report(
+    config: dict,
+    criterion: str = "d-optimal",
+    n_recordings: int | None = None,
+    sigma2: float | None = None,
+    seed: int | None = None,
+):
+    """Prints the expected standard deviation of the effort of each
+    character for the optimal design and for a random design (like
+    get_trigrams) with the same number of recordings.
+
+    Parameters
+    ----------
+    n_recordings : int | None
+        The number of recordings (trigram repetitions) for both hands. By
+        default the same as with the random design of the config.
+    sigma2 : float | None
+        The variance (seconds²) of a single timing, see
+        estimate_noise_variance. If None, the standard deviations are given
+        in units of σ.
+    """
+    from effort.effort import get_trigrams
+
+    rng = np.random.default_rng(seed)
+    weight = get_weight(config)
+    repeats = config["trigram_repeat_times"]
+    unit = "ms" if sigma2 is not None else "σ"
+    scale = 1000 if sigma2 is not None else 1
+    total = {"optimal": 0.0, "random": 0.0}
+    n_total = 0
+
+    for hand in ("left", "right"):
+        candidates = enumerate_trigrams(hand, config)
+        random_trigrams = [
+            t
+            for finger, chars in compile_layout(config).finger_chars[hand].items()
+            for char in chars
+            for t in get_trigrams(char, hand, finger, config)
+        ]
+        n_trigrams = len(random_trigrams)
+        if n_recordings is not None:
+            n_trigrams = round(n_recordings / repeats / 2)
+        n_total += n_trigrams * repeats
+        rows = select_trigrams(
+            candidates,
+            n_trigrams,
+            criterion,
+            weight=weight,
+            seed=int(rng.integers(2**32)),
+        )
+        if n_recordings is None:
+            lookup = {t: i for i, t in enumerate(candidates.trigrams())}
+            random_rows = [lookup[t] for t in random_trigrams]
+        else:
+            random_rows = rng.choice(len(candidates), n_trigrams, replace=False)
+
+        variances = {}
+        for name, design_rows in (("optimal", rows), ("random", random_rows)):
+            X = candidates.design_matrix(design_rows)
+            variances[name] = get_coefficient_variance(X, weight, sigma2 or 1.0)
+            total[name] += variances[name].sum()
+
+        print(f"\nHand: {hand} ({n_trigrams} trigrams)")
+        for char, var_opt, var_random in zip(
+            candidates.chars, variances["optimal"], variances["random"]
+        ):
+            print(
+                f"Char {char}: std {np.sqrt(var_opt) * scale:.2f} {unit} ({criterion})  {np.sqrt(var_random) * scale:.2f} {unit} (random)"
+            )
+
+    ratio = total["random"] / total["optimal"]
+    print(f"\nTotal recordings: {n_total}")
+    print(
+        f"Sum of the coefficient variances: {criterion} {total['optimal'] * scale**2:.4g}, random {total['random'] * scale**2:.4g} ({unit}²)"
+    )
+    print(
+        f"A random design needs about {ratio:.2f}x the recordings ({n_total * ratio:.0f}) for the same total variance."
+    )
@@ -1,16 +1,25 @@
 from __future__ import annotations
 
 import datetime as dt
+import itertools
+import random
 import typing
+from contextlib import ExitStack
 from itertools import zip_longest
 from pathlib import Path
-from random import choice, sample, shuffle
 
+from effort import metrics
+from effort.adaptive import AdaptiveRepetitions, is_adaptive
 from effort.config import FINGERS
-from effort.keyboard import get_timing_for_trigram
+from effort.eventlog import EventLogWriter
+from effort.journal import RecordingJournal, get_journal_file
+from effort.layout import compile_layout
 
 if typing.TYPE_CHECKING:
-    from typing import Iterable, Tuple
+    from typing import Iterable, TextIO, Tuple
+
+    from effort.keyboard import KeyboardSession
+    from effort.online import OnlineEffortModel
 
 
 class TrigramCounter:
@@ -27,19 +36,91 @@ class TrigramCounter:
         self.count += 1
 
 
-def effort_record(config: dict, output_file: Path):
+def effort_record(
+    config: dict,
+    output_file: Path,
+    live: bool = False,
+    model_state_file: Path | None = None,
+    event_log_file: Path | None = None,
+    resume: bool = False,
+    plan: list[dict] | None = None,
+):
+    """Records the effort grid data into output_file.
+
+    The recording order (the characters and their trigrams) is planned up
+    front and saved into a journal next to the output file (see
+    effort.journal), together with every completed repetition.
+
+    Parameters
+    ----------
+    live : bool
+        If True, the current effort grid (effort model) is printed after each
+        recorded trigram.
+    model_state_file : Path | None
+        If given, the state of the online effort model is saved into this
+        file after each recorded trigram. If the file exists, the new data is
+        added to the saved state.
+    event_log_file : Path | None
+        If given, every key press and release is saved into this binary
+        event log (see effort.eventlog). If the file exists, the new events
+        are appended to it.
+    resume : bool
+        If True, continues an interrupted recording from the journal of
+        output_file, starting from the first repetition not recorded yet.
+        The output file is rewritten from the journal.
+    plan : list[dict] | None
+        The recording plan to use (like one shard of a plan file, see
+        effort.plan), instead of planning a new one with get_recording_plan.
+    """
+    # pynput needs a display, so it is imported only when recording. The
+    # planning helpers of this module (get_trigrams, ...) work without it.
+    from effort.keyboard import KeyboardSession
+
     start_time = dt.datetime.now()
     output_file.parent.mkdir(parents=True, exist_ok=True)
+    journal_file = get_journal_file(output_file)
+
+    if resume:
+        journal = RecordingJournal.open(journal_file)
+        if journal.n_repeats != config["trigram_repeat_times"]:
+            journal.close()
+            raise ValueError(
+                f"The journal {journal_file} has {journal.n_repeats} repetitions per trigram, but the config has {config['trigram_repeat_times']}"
+            )
+        write_completed_trigrams(journal, output_file)
+    else:
+        if plan is None:
+            plan = get_recording_plan(config)
+        journal = RecordingJournal.create(
+            journal_file, plan, config["trigram_repeat_times"]
+        )
+
+    adaptive = AdaptiveRepetitions(config) if is_adaptive(config) else None
+    model = None
+    if live or model_state_file is not None or adaptive is not None:
+        from effort.online import OnlineEffortModel
+
+        if model_state_file is not None and model_state_file.exists():
+            model = OnlineEffortModel.load(model_state_file, config)
+        else:
+            model = OnlineEffortModel(config)
+            for i, _, trigram in journal.trigrams():
+                if journal.is_complete(i):
+                    model.update(trigram, journal.completed[i])
 
-    total_chars = get_total_chars(config)
     counter = TrigramCounter(
-        total_chars,
-        trigram_repeat_times=config["trigram_repeat_times"],
+        len(journal.plan),
+        trigram_repeat_times=journal.n_repeats,
         trigrams_per_char=config["trigrams_per_char"],
     )
+    counter.n_trigrams = len(journal.trigrams())
+    counter.n_repeats = journal.budget
+    counter.count = journal.n_completed
     print(
         f"Total characters: {counter.n_chars}, Total trigrams: {counter.n_trigrams}, Total recordings: {counter.n_repeats}"
     )
+    if resume:
+        print(f"Resuming from recording {counter.count + 1}/{counter.n_repeats}")
     home_key_sequence_right = config["home_key_sequence_right"]
     home_key_sequence_left = config["home_key_sequence_left"]
 
@@ -50,71 +131,243 @@ def effort_record(config: dict, output_file: Path):
     print(
         "TIP: If you need to take a break: The timers are not running when waiting for the home key combo."
     )
-    for i, (finger, hand, char) in enumerate(iterate_chars_random(config), start=1):
-        print(f"(Char {i}/{total_chars}) {hand} {finger}: {char} ")
-        record_trigrams_for_char(
-            char, hand, finger, config, output_file=output_file, counter=counter
-        )
+    with ExitStack() as stack:
+        stack.enter_context(journal)
+        output = stack.enter_context(output_file.open("a"))
+        event_log = None
+        if event_log_file is not None:
+            event_log = stack.enter_context(EventLogWriter(event_log_file))
+        session = stack.enter_context(KeyboardSession(event_log=event_log))
+        trigram_index = 0
+        for i in itertools.count(1):
+            if i > len(journal.plan):
+                # With adaptive repetitions, the repetitions left in the budget
+                # are used for extra trigrams.
+                extra = get_extra_plan_item(journal, adaptive, model, config)
+                if extra is None:
+                    break
+                journal.add_plan_item(extra)
+                counter.n_chars += 1
+            item = journal.plan[i - 1]
+            trigram_indices = range(
+                trigram_index, trigram_index + len(item["trigrams"])
+            )
+            trigram_index += len(item["trigrams"])
+            if all(journal.is_complete(j) for j in trigram_indices):
+                continue
+            print(
+                f"(Char {i}/{counter.n_chars}) {item['hand']} {item['finger']}: {item['char']} "
+            )
+            record_trigrams_for_char(
+                item,
+                trigram_indices,
+                config,
+                output=output,
+                counter=counter,
+                session=session,
+                journal=journal,
+                adaptive=adaptive,
+                model=model,
+                live=live,
+                model_state_file=model_state_file,
+            )
 
     end_time = dt.datetime.now()
     time_used_min = (end_time - start_time).total_seconds() / 60
     print(f"Total time used: {time_used_min:.2f} minutes")
+    print(session.summary())
+
+
+def get_recording_plan(config: dict, rng: random.Random | None = None) -> list[dict]:
+    """Plans the recording order: the characters in random order, each with
+    the trigrams having the character in the middle.
+
+    The trigrams are random (see get_trigrams), unless the config has
+    "trigram_selection" set to "d-optimal" or "a-optimal". Then the trigrams
+    of each hand are selected with effort.design.get_design_trigrams, and
+    grouped by their middle character.
+
+    Parameters
+    ----------
+    rng : random.Random | None
+        The random number generator, for a reproducible plan. By default,
+        the global one of the random module is used."""
+    selection = config.get("trigram_selection", "random")
+    design_trigrams = {}
+    if selection != "random":
+        from effort.design import get_design_trigrams
+
+        for hand in ("left", "right"):
+            for trigram in get_design_trigrams(hand, config, selection):
+                design_trigrams.setdefault(trigram[1], []).append(trigram)
+
+    plan = []
+    for finger, hand, char in iterate_chars_random(config, rng=rng):
+        if selection == "random":
+            trigrams = get_trigrams(char, hand, finger, config, rng=rng)
+        else:
+            trigrams = design_trigrams.get(char, [])
+        plan.append(
+            {"char": char, "hand": hand, "finger": finger, "trigrams": trigrams}
+        )
+    return plan
 
 
 def record_trigrams_for_char(
-    char: str,
-    hand: str,
-    finger: str,
+    item: dict,
+    trigram_indices: range,
     config: dict,
-    output_file: Path,
+    output: TextIO,
     counter: TrigramCounter,
+    session: KeyboardSession,
+    journal: RecordingJournal,
+    adaptive: AdaptiveRepetitions | None = None,
+    model: OnlineEffortModel | None = None,
+    live: bool = False,
+    model_state_file: Path | None = None,
 ):
+    """Records the trigrams of one character of the recording plan (item),
+    skipping the trigrams already completed in the journal."""
+    for trigram_index, trigram in zip(trigram_indices, item["trigrams"]):
+        if journal.is_complete(trigram_index):
+            continue
+        times = get_times_for_trigram(
+            trigram,
+            item["hand"],
+            config,
+            counter=counter,
+            session=session,
+            journal=journal,
+            trigram_index=trigram_index,
+            adaptive=adaptive,
+        )
+        with metrics.stage("record.write_output"):
+            write_trigram_times(output, trigram, times)
+            output.flush()
 
-    trigrams = get_trigrams(char, hand, finger, config)
-
-    for trigram in trigrams:
-        times = get_times_for_trigram(trigram, hand, config, counter=counter)
-        with output_file.open("a") as f:
-            timestxt = " ".join(str(t) for t in times)
-            f.write(f"{trigram} {timestxt}\n")
+        if model is None:
+            continue
+        with metrics.stage("record.model_update"):
+            model.update(trigram, times)
+            if model_state_file is not None:
+                model.save(model_state_file)
+        if live:
+            model.print_efforts()
+
+
+def get_extra_plan_item(
+    journal: RecordingJournal,
+    adaptive: AdaptiveRepetitions | None,
+    model: OnlineEffortModel | None,
+    config: dict,
+) -> dict | None:
+    """A new trigram for the character with the most uncertain effort, if
+    the repetitions left in the budget are enough for it."""
+    if adaptive is None or model is None:
+        return None
+    if journal.budget - journal.n_completed < adaptive.min_repeats:
+        return None
+    finger, hand, char = adaptive.pick_uncertain_char(model)
+    recorded = {trigram for _, _, trigram in journal.trigrams()}
+    trigrams = get_trigrams(char, hand, finger, config, n=1, exclude=recorded)
+    if not trigrams:
+        return None
+    return {
+        "char": char,
+        "hand": hand,
+        "finger": finger,
+        "trigrams": trigrams,
+        "extra": True,
+    }
+
+
+def write_completed_trigrams(journal: RecordingJournal, output_file: Path):
+    """Writes the trigrams with all repetitions completed in the journal into
+    output_file (overwriting it)."""
+    with output_file.open("w") as f:
+        for i, _, trigram in journal.trigrams():
+            if journal.is_complete(i):
+                write_trigram_times(f, trigram, journal.completed[i])
+
+
+def write_trigram_times(f, trigram: str, times: list[float]):
+    timestxt = " ".join(str(t) for t in times)
+    f.write(f"{trigram} {timestxt}\n")
 
 
 def get_times_for_trigram(
-    trigram: str, hand: str, config: dict, counter: TrigramCounter
+    trigram: str,
+    hand: str,
+    config: dict,
+    counter: TrigramCounter,
+    session: KeyboardSession,
+    journal: RecordingJournal,
+    trigram_index: int,
+    adaptive: AdaptiveRepetitions | None = None,
 ):
+    """Records the repetitions of a trigram, continuing from the repetitions
+    already in the journal. Each repetition is added to the journal. With
+    adaptive, the repetitions are stopped once the best timings are stable
+    (see AdaptiveRepetitions.is_stable)."""
     combo_left = config["home_key_sequence_right"]
     combo_right = config["home_key_sequence_left"]
     sequence = combo_right if hand == "left" else combo_left
-    times = []
-    for _ in range(config["trigram_repeat_times"]):
+    n_recorded = len(journal.completed.get(trigram_index, ()))
+    for _ in range(n_recorded, journal.n_repeats):
         counter.increment()
-        time_seconds = get_timing_for_trigram(
+        time_seconds = session.get_timing_for_trigram(
             trigram,
             wait_sequence=sequence,
             wait_text=f'({counter.count}/{counter.n_repeats}) Trigram: {trigram} -- Press "{sequence}"" with {hand.upper()} hand to start the timer for recording the trigram.',
         )
-        times.append(time_seconds)
-    return times
+        with metrics.stage("record.write_journal"):
+            journal.add(trigram_index, time_seconds)
+        times = journal.completed[trigram_index]
+        if adaptive is not None and adaptive.is_stable(times):
+            if len(times) < journal.n_repeats:
+                journal.stop(trigram_index)
+            break
+    return list(journal.completed[trigram_index])
 
 
-def get_trigrams(char: str, hand: str, finger: str, config: dict):
+def get_trigrams(
+    char: str,
+    hand: str,
+    finger: str,
+    config: dict,
+    n: int | None = None,
+    exclude: Iterable[str] = (),
+    rng: random.Random | None = None,
+):
     """Gets a list of random trigrams where the char is in the middle.
-    Trigrams returned do not contain any Single Finger Bigrams (SFBs)"""
+    Trigrams returned do not contain any Single Finger Bigrams (SFBs)
+
+    By default, trigrams_per_char trigrams are returned. The trigrams in
+    exclude are not returned. The random numbers are drawn from rng (by
+    default, the global generator of the random module)."""
 
+    if rng is None:
+        rng = random  # the global generator
     trigrams = []
-    hand_chars = config[hand].copy()
-    hand_chars.pop(finger)
+    seen = set(exclude)
+    hand_chars = {
+        other: chars
+        for other, chars in compile_layout(config).finger_chars[hand].items()
+        if other != finger
+    }
     other_fingers = sorted(hand_chars.keys())
 
-    n = config["trigrams_per_char"]
+    if n is None:
+        n = config["trigrams_per_char"]
 
     for _ in range(100_000):  # prevent infinite loop
-        fingers = sample(other_fingers, 2)
-        char1 = choice(hand_chars[fingers[0]])
-        char3 = choice(hand_chars[fingers[1]])
+        fingers = rng.sample(other_fingers, 2)
+        char1 = rng.choice(hand_chars[fingers[0]])
+        char3 = rng.choice(hand_chars[fingers[1]])
         trigram = "".join((char1, char, char3))
-        if trigram in trigrams:
+        if trigram in seen:
             continue
+        seen.add(trigram)
         trigrams.append(trigram)
         if len(trigrams) >= n:
             break
@@ -133,9 +386,10 @@ def iterate_chars(config: dict) -> Iterable[Tuple[str, str, str]]:
     finger is one of "index", "middle", "ring", "pinky", "thumb"
     hand is one of "left" or "right"
     """
+    finger_chars = compile_layout(config).finger_chars
     for finger in FINGERS:
-        chars_left = list(config["left"][finger])
-        chars_right = list(config["right"][finger])
+        chars_left = finger_chars["left"][finger]
+        chars_right = finger_chars["right"][finger]
 
         for char_left, char_right in zip_longest(chars_left, chars_right):
             if char_right is not None:
@@ -144,13 +398,15 @@ def iterate_chars(config: dict) -> Iterable[Tuple[str, str, str]]:
                 yield finger, "left", char_left
 
 
-def iterate_chars_random(config):
+def iterate_chars_random(config, rng: random.Random | None = None):
+    if rng is None:
+        rng = random  # the global generator
     chars = list(iterate_chars(config))
     chars_left = chars[::2]
     chars_right = chars[1::2]
 
-    shuffle(chars_left)
-    shuffle(chars_right)
+    rng.shuffle(chars_left)
+    rng.shuffle(chars_right)
     for left, right in zip_longest(chars_left, chars_right):
         if left is not None:
             yield left
@@ -159,10 +415,4 @@ def iterate_chars_random(config):
 
 
 def get_total_chars(config: dict) -> int:
-    left = config["left"]
-    right = config["right"]
-
-    total_chars = 0
-    for finger in FINGERS:
-        total_chars += len(left[finger]) + len(right[finger])
-    return total_chars
+    return len(compile_layout(config))
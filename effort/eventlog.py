@@ -0,0 +1,292 @@
+"""Binary log of every key event seen by the trigram timing recorder.
+
+The record file only keeps one timing per repetition of a trigram. The event
+log keeps every key press and release of every trial (one call of
+KeyboardSession.get_timing_for_trigram), so that things like dwell times,
+bigram intervals and the home key sequence bias can be calculated later
+from the same recording.
+
+The file starts with EVENT_LOG_MAGIC, a uint32 (little endian) header length
+and a JSON header. The rest of the file is an array of EVENT_DTYPE records.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+from effort import metrics
+
+EVENT_LOG_MAGIC = b"EFFEVTS\x01"
+EVENT_LOG_VERSION = 1
+
+# The state of the recorder when the event arrived (see keyboard.State).
+STATES = (
+    "NOT_STARTED",
+    "RECORDING_STARTING_SEQUENCE",
+    "RECORDING_TRIGRAM",
+    "RECORDING_FINAL_SEQUENCE",
+)
+STATE_CODES = {state: code for code, state in enumerate(STATES)}
+
+PRESS_CODE = 0
+RELEASE_CODE = 1
+
+EVENT_DTYPE = np.dtype(
+    [
+        ("trial", "<u4"),
+        ("t_ns", "<i8"),  # time.perf_counter_ns() in the listener callback
+        ("kind", "u1"),  # PRESS_CODE or RELEASE_CODE
+        ("state", "u1"),  # index to STATES
+        ("key", "<u4"),  # the character (code point), 0 for special keys
+        ("trigram", "<U3"),
+    ]
+)
+
+# Number of events kept in memory before writing them to the file.
+BUFFER_SIZE = 4096
+
+
+class EventLogWriter:
+    """Buffered writer for the key event log.
+
+    The events are stored into a preallocated array, which is written to the
+    file when it is full (and when closing), so adding an event does not
+    touch the file. If the file exists, the events are appended to it and
+    the trial numbering continues from the last trial in the file.
+
+    Use as a context manager:
+
+        with EventLogWriter(file) as writer:
+            trial = writer.new_trial()
+            writer.add(trial, t_ns, PRESS_CODE, "RECORDING_TRIGRAM", "a", "abc")
+    """
+
+    def __init__(self, file, buffer_size: int = BUFFER_SIZE):
+        self.file = Path(file)
+        self.buffer = np.zeros(buffer_size, dtype=EVENT_DTYPE)
+        self.n_buffered = 0
+        self.next_trial = 0
+        if self.file.exists() and self.file.stat().st_size > 0:
+            events = read_event_log(self.file)
+            if len(events):
+                self.next_trial = int(events["trial"].max()) + 1
+            self._f = open(self.file, "ab")
+        else:
+            self.file.parent.mkdir(parents=True, exist_ok=True)
+            self._f = open(self.file, "wb")
+            self._f.write(_get_header_bytes())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def new_trial(self) -> int:
+        trial = self.next_trial
+        self.next_trial += 1
+        return trial
+
+    def add(self, trial: int, t_ns: int, kind: int, state: str, char, trigram: str):
+        self.buffer[self.n_buffered] = (
+            trial,
+            t_ns,
+            kind,
+            STATE_CODES[state],
+            ord(char) if char else 0,
+            trigram,
+        )
+        self.n_buffered += 1
+        if self.n_buffered == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        with metrics.stage("record.write_event_log"):
+            if self.n_buffered:
+                self._f.write(self.buffer[: self.n_buffered].tobytes())
+                self.n_buffered = 0
+            self._f.flush()
+
+    def close(self):
+        if not self._f.closed:
+            self.flush()
+            self._f.close()
+
+
+def read_event_log(file, mmap: bool = False) -> np.ndarray:
+    """Reads the events of an event log file into an array of EVENT_DTYPE."""
+    with open(file, "rb") as f:
+        if f.read(len(EVENT_LOG_MAGIC)) != EVENT_LOG_MAGIC:
+            raise ValueError(f"File {file} is not an effort grid event log file")
+        header_length = int.from_bytes(f.read(4), "little")
+        header = json.loads(f.read(header_length))
+        if header["version"] > EVENT_LOG_VERSION:
+            raise ValueError(
+                f"Unsupported event log file version {header['version']} in {file}"
+            )
+        offset = f.tell()
+        size = f.seek(0, 2) - offset
+    count = size // EVENT_DTYPE.itemsize
+    if mmap and count:
+        return np.memmap(file, dtype=EVENT_DTYPE, mode="r", offset=offset, shape=count)
+    return np.fromfile(file, dtype=EVENT_DTYPE, count=count, offset=offset)
+
+
+def get_trial_timings(events: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """The recorded timing (seconds) of each completed trial, calculated from
+    the events in the same way as TrigramTimingRecorder does it: from the key
+    release completing the starting sequence to the key release completing
+    the final sequence.
+
+    Returns
+    -------
+    trials, timings: np.ndarray
+        The trial numbers and the timing of each trial.
+    """
+    trials, first, last = _trial_bounds(events)
+    trials_out, timings = [], []
+    for trial, i, j in zip(trials, first, last):
+        states = events["state"][i:j]
+        if states[-1] != STATE_CODES["RECORDING_FINAL_SEQUENCE"]:
+            continue  # not completed (quit)
+        starting = np.flatnonzero(states == STATE_CODES["RECORDING_STARTING_SEQUENCE"])
+        trials_out.append(trial)
+        timings.append((events["t_ns"][j - 1] - events["t_ns"][i + starting[-1]]) / 1e9)
+    return np.array(trials_out, dtype=np.uint32), np.array(timings)
+
+
+def get_dwell_times(events: np.ndarray) -> np.ndarray:
+    """Time (seconds) each key was held down. Each press is matched with the
+    next release of the same key in the same trial.
+
+    Returns
+    -------
+    np.ndarray
+        A structured array with the fields "trial", "key" (character),
+        "state" (at the press) and "dwell".
+    """
+    order = np.lexsort((events["t_ns"], events["key"], events["trial"]))
+    ev = events[order]
+    ev = ev[ev["key"] != 0]
+    is_pair = (
+        (ev["kind"][:-1] == PRESS_CODE)
+        & (ev["kind"][1:] == RELEASE_CODE)
+        & (ev["trial"][:-1] == ev["trial"][1:])
+        & (ev["key"][:-1] == ev["key"][1:])
+    )
+    idx = np.flatnonzero(is_pair)
+    out = np.zeros(
+        len(idx),
+        dtype=[("trial", "<u4"), ("key", "<U1"), ("state", "u1"), ("dwell", "<f8")],
+    )
+    out["trial"] = ev["trial"][idx]
+    out["key"] = _to_chars(ev["key"][idx])
+    out["state"] = ev["state"][idx]
+    out["dwell"] = (ev["t_ns"][idx + 1] - ev["t_ns"][idx]) / 1e9
+    return out
+
+
+def get_bigram_intervals(events: np.ndarray) -> np.ndarray:
+    """Press-to-press intervals (seconds) of the consecutive keys of the
+    trigrams. Only the presses in the last (successful) typing of the trigram
+    of each trial are used.
+
+    Returns
+    -------
+    np.ndarray
+        A structured array with the fields "trial", "trigram", "bigram" and
+        "interval".
+    """
+    trigram_state = STATE_CODES["RECORDING_TRIGRAM"]
+    trials, first, last = _trial_bounds(events)
+    rows = []
+    for trial, i, j in zip(trials, first, last):
+        ev = events[i:j]
+        if ev["state"][-1] != STATE_CODES["RECORDING_FINAL_SEQUENCE"]:
+            continue
+        # The last run of events in the trigram state is the successful one.
+        in_trigram = np.flatnonzero(ev["state"] == trigram_state)
+        if not len(in_trigram):
+            continue
+        run_start = in_trigram[-1]
+        while run_start > 0 and ev["state"][run_start - 1] == trigram_state:
+            run_start -= 1
+        run = ev[run_start : in_trigram[-1] + 1]
+        presses = run[run["kind"] == PRESS_CODE]
+        chars = _to_chars(presses["key"])
+        for k in range(len(presses) - 1):
+            rows.append(
+                (
+                    trial,
+                    ev["trigram"][0],
+                    chars[k] + chars[k + 1],
+                    (presses["t_ns"][k + 1] - presses["t_ns"][k]) / 1e9,
+                )
+            )
+    return np.array(
+        rows,
+        dtype=[
+            ("trial", "<u4"),
+            ("trigram", "<U3"),
+            ("bigram", "<U2"),
+            ("interval", "<f8"),
+        ],
+    )
+
+
+def get_home_sequence_bias(events: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Time (seconds) used for typing the final (home key) sequence of each
+    completed trial: from its first key press to the key release completing
+    the trial. This is the part of each recorded timing that comes from the
+    home key sequence (compare with home_key_sequence_timing_left/right in
+    the config, measured with estimate_bias).
+
+    Returns
+    -------
+    trials, bias: np.ndarray
+        The trial numbers and the home sequence time of each trial.
+    """
+    final_state = STATE_CODES["RECORDING_FINAL_SEQUENCE"]
+    trials, first, last = _trial_bounds(events)
+    trials_out, bias = [], []
+    for trial, i, j in zip(trials, first, last):
+        ev = events[i:j]
+        if ev["state"][-1] != final_state:
+            continue
+        not_final = np.flatnonzero(ev["state"] != final_state)
+        run = ev[not_final[-1] + 1 :] if len(not_final) else ev
+        presses = np.flatnonzero(run["kind"] == PRESS_CODE)
+        if not len(presses):
+            continue
+        trials_out.append(trial)
+        bias.append((run["t_ns"][-1] - run["t_ns"][presses[0]]) / 1e9)
+    return np.array(trials_out, dtype=np.uint32), np.array(bias)
+
+
+def _trial_bounds(events: np.ndarray):
+    # The events of each trial are contiguous in the log.
+    if not len(events):
+        empty = np.zeros(0, dtype=np.intp)
+        return empty.astype(np.uint32), empty, empty
+    starts = np.flatnonzero(np.diff(events["trial"].astype(np.int64)) != 0) + 1
+    first = np.concatenate(([0], starts))
+    last = np.concatenate((starts, [len(events)]))
+    return events["trial"][first], first, last
+
+
+def _to_chars(codes: np.ndarray) -> np.ndarray:
+    return np.asarray(codes, dtype="<u4").view("<U1")
+
+
+def _get_header_bytes() -> bytes:
+    header = json.dumps(
+        {
+            "version": EVENT_LOG_VERSION,
+            "states": STATES,
+            "dtype": EVENT_DTYPE.descr,
+        }
+    ).encode()
+    return EVENT_LOG_MAGIC + len(header).to_bytes(4, "little") + header
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import numpy as np
+
+from effort.config import get_chars_for_hand
+
+HANDS = ("left", "right")
+
+
+class EffortGrid:
+    """The effort of each key (character), for each hand.
+
+    Attributes
+    ----------
+    efforts : dict
+        Maps hand ("left" or "right") to a tuple of the characters of the hand
+        and an array with the effort of each of the characters. The efforts
+        may be in any unit (for example seconds); see normalized.
+    sample_sizes : dict | None
+        The number of trigrams used for calculating the effort of each
+        character, if known.
+    """
+
+    def __init__(
+        self,
+        efforts: dict[str, tuple[str, np.ndarray]],
+        sample_sizes: dict[str, int] | None = None,
+    ):
+        self.efforts = efforts
+        self.sample_sizes = sample_sizes
+
+    @property
+    def chars(self) -> str:
+        return "".join(chars for chars, _ in self.efforts.values())
+
+    @property
+    def values(self) -> np.ndarray:
+        return np.concatenate(
+            [np.asarray(v, dtype=float) for _, v in self.efforts.values()]
+        )
+
+    @property
+    def scale(self) -> float:
+        """The smallest effort. Normalized efforts are relative to this."""
+        return float(np.nanmin(self.values))
+
+    def normalized(self) -> np.ndarray:
+        """The efforts of all the characters (see chars) divided by scale, so
+        that the easiest key has an effort of 1.0."""
+        return self.values / self.scale
+
+    def as_dict(self) -> dict[str, float]:
+        """Maps each character to its normalized effort."""
+        return dict(zip(self.chars, self.normalized().tolist()))
+
+
+def read_effort_file(file, config: dict) -> EffortGrid:
+    """Reads an effort grid file, like effort-grid-estimates.txt. Each line
+    has a character and its (normalized) effort. The hands of the characters
+    are taken from the config."""
+    efforts = {}
+    with open(file) as f:
+        for line in f:
+            if line.strip():
+                char, effort = line.split()
+                efforts[char] = float(effort)
+
+    grid = {}
+    for hand in HANDS:
+        chars = get_chars_for_hand(hand, config)
+        grid[hand] = (chars, np.array([efforts.get(c, np.nan) for c in chars]))
+    return EffortGrid(grid)
+
+
+def write_effort_file(grid: EffortGrid, file):
+    """Writes the normalized efforts in the format read by read_effort_file."""
+    with open(file, "w") as f:
+        for char, effort in grid.as_dict().items():
+            f.write(f"{char} {effort:.2f}\n")
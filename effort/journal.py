@@ -0,0 +1,165 @@
+"""Journal of a recording session, for resuming an interrupted recording.
+
+The journal is a text file. The first line is a JSON header with the planned
+recording order (the characters and their trigrams), so that a resumed
+recording continues with exactly the same trigrams. Each following line is
+one completed repetition:
+
+    <trigram index> <repetition index> <time in seconds>
+
+where the trigram index runs over all the trigrams of the plan. A trigram
+whose repetitions were stopped early (see effort.adaptive) is marked with
+
+    <trigram index> stop
+
+and a character added to the plan during the recording with
+
+    plan <plan item as JSON>
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+JOURNAL_VERSION = 1
+
+# The journal is flushed to disk (fsync) after this many repetitions, so a
+# crash may lose at most this many repetitions.
+FSYNC_INTERVAL = 10
+
+
+class RecordingJournal:
+    """Journal of a recording session. Create a new journal with create and
+    open an existing one with open.
+
+    Attributes
+    ----------
+    plan : list[dict]
+        The planned recording order. Each item has the "char", "hand",
+        "finger" and "trigrams" (list of str) of one character.
+    n_repeats : int
+        The number of repetitions of each trigram.
+    completed : dict[int, list[float]]
+        The times of the completed repetitions of each trigram (by trigram
+        index).
+    stopped : set[int]
+        The trigrams whose repetitions were stopped before n_repeats.
+    budget : int
+        The number of repetitions planned at the start: n_repeats for each
+        trigram of the initial plan.
+    """
+
+    def __init__(self, file, plan: list[dict], n_repeats: int, f):
+        self.file = Path(file)
+        self.plan = plan
+        self.n_repeats = n_repeats
+        self.completed: dict[int, list[float]] = {}
+        self.stopped: set[int] = set()
+        self.budget = n_repeats * sum(len(item["trigrams"]) for item in plan)
+        self._f = f
+        self._n_unsynced = 0
+
+    @classmethod
+    def create(cls, file, plan: list[dict], n_repeats: int) -> RecordingJournal:
+        """Creates a new journal (overwriting file, if it exists)."""
+        header = {"version": JOURNAL_VERSION, "n_repeats": n_repeats, "plan": plan}
+        f = open(file, "w")
+        journal = cls(file, plan, n_repeats, f)
+        f.write(json.dumps(header) + "\n")
+        journal.sync()
+        return journal
+
+    @classmethod
+    def open(cls, file) -> RecordingJournal:
+        """Opens an existing journal for continuing the recording. A partially
+        written last line (from a crash) is discarded."""
+        with open(file) as f:
+            content = f.read()
+        complete, _, partial = content.rpartition("\n")
+        if partial:
+            with open(file, "r+") as f:
+                f.truncate(len(complete.encode()) + 1)
+
+        header_line, *lines = complete.split("\n")
+        header = json.loads(header_line)
+        if header["version"] > JOURNAL_VERSION:
+            raise ValueError(
+                f"Unsupported journal file version {header['version']} in {file}"
+            )
+        journal = cls(file, header["plan"], header["n_repeats"], open(file, "a"))
+        for line in lines:
+            if line.startswith("plan "):
+                journal.plan.append(json.loads(line[len("plan ") :]))
+                continue
+            if line.endswith(" stop"):
+                journal.stopped.add(int(line.split()[0]))
+                continue
+            trigram_index, repetition, seconds = line.split()
+            times = journal.completed.setdefault(int(trigram_index), [])
+            if int(repetition) != len(times):
+                raise ValueError(f"Journal {file} has a repetition out of order")
+            times.append(float(seconds))
+        return journal
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def trigrams(self) -> list[tuple[int, dict, str]]:
+        """All the (trigram index, plan item, trigram) of the plan, in the
+        recording order."""
+        items = []
+        for item in self.plan:
+            for trigram in item["trigrams"]:
+                items.append((len(items), item, trigram))
+        return items
+
+    def is_complete(self, trigram_index: int) -> bool:
+        if trigram_index in self.stopped:
+            return True
+        return len(self.completed.get(trigram_index, ())) >= self.n_repeats
+
+    @property
+    def n_completed(self) -> int:
+        """The number of completed repetitions (of all trigrams)."""
+        return sum(len(times) for times in self.completed.values())
+
+    def add(self, trigram_index: int, seconds: float):
+        """Adds the next repetition of a trigram."""
+        times = self.completed.setdefault(trigram_index, [])
+        self._f.write(f"{trigram_index} {len(times)} {seconds!r}\n")
+        times.append(seconds)
+        self._n_unsynced += 1
+        if self._n_unsynced >= FSYNC_INTERVAL:
+            self.sync()
+
+    def stop(self, trigram_index: int):
+        """Marks the repetitions of a trigram as completed."""
+        self._f.write(f"{trigram_index} stop\n")
+        self.stopped.add(trigram_index)
+
+    def add_plan_item(self, item: dict):
+        """Adds a character (with its trigrams) to the end of the plan."""
+        self._f.write(f"plan {json.dumps(item)}\n")
+        self.plan.append(item)
+        self.sync()
+
+    def sync(self):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._n_unsynced = 0
+
+    def close(self):
+        if not self._f.closed:
+            self.sync()
+            self._f.close()
+
+
+def get_journal_file(output_file) -> Path:
+    """The journal file used for a record file."""
+    output_file = Path(output_file)
+    return output_file.with_name(output_file.name + ".journal")
@@ -1,153 +1,167 @@
-import logging
+from __future__ import annotations
+
 import time
-from typing import Literal
+from queue import SimpleQueue
+from typing import TYPE_CHECKING
 
 from pynput import keyboard
 
-logger = logging.getLogger(__name__)
-
-State = Literal[
-    "NOT_STARTED",
-    "RECORDING_STARTING_SEQUENCE",
-    "RECORDING_TRIGRAM",
-    "RECORDING_FINAL_SEQUENCE",
-]
-
-
-class TrigramTimingRecorder:
-
-    def __init__(self, trigram: str, wait_sequence: str, wait_text: str = ""):
-        self.trigram = trigram
-        self.sequence = wait_sequence
-        self.sequence_keys = list(wait_sequence)
-        self.trigram_keys = list(trigram)
-        self.delta_time: float = 0
-        self.start_time: float = 0
-        self.state: State = "NOT_STARTED"
-        self.pressed_keys: list[str] = []
-        self.wait_text = wait_text
-        self.ctrl_pressed = False
-        self.asked_quit = False
-        self.start_recording_starting_sequence()
-
-    def start_recording_starting_sequence(self):
-        if self.wait_text:
-            print("\r" + self.wait_text)
-        else:
-            print(f'\rType sequence "{self.sequence}" to start recording')
-        self.restart_recording_sequence("RECORDING_STARTING_SEQUENCE")
-
-    def start_recording_final_sequence(self):
-        print(f'\rType sequence "{self.sequence}" to end recording')
-        self.restart_recording_sequence("RECORDING_FINAL_SEQUENCE")
-
-    def restart_recording_sequence(self, state: State):
-        self.state = state
-        self.pressed_keys = []
-        self.expected_keys = self.sequence_keys
+from effort import metrics
 
-    def start_recording_trigram(self):
-        self.state = "RECORDING_TRIGRAM"
-        self.pressed_keys = []
-        self.expected_keys = self.trigram_keys
-        print(f'\rType: "{self.trigram}":')
-        self.start_time = time.monotonic()
-
-    def finalize(self):
-        self.delta_time = time.monotonic() - self.start_time
-        print(f"\r OK! ({self.delta_time*1000:.0f} ms)")
-
-    def on_press(self, key):
-        char = get_char(key)
-        self.pressed_keys.append(char)
+# The recorder state machine is in effort.recorder (which works without
+# pynput).
+from effort.recorder import (
+    PRESS,
+    RELEASE,
+    LatencyStats,
+    TrigramTimingRecorder,
+    process_events,
+)
 
-        if key == keyboard.Key.ctrl_l or key == keyboard.Key.ctrl_r:
-            self.ctrl_pressed = True
-        elif char:
-            print(char, end="", flush=True)
+if TYPE_CHECKING:
+    from effort.eventlog import EventLogWriter
 
-        if self.ctrl_pressed and char == "c":
-            print("\nCtrl-C pressed, exiting...")
-            self.asked_quit = True
-            return False
 
-        if self.pressed_keys != self.expected_keys[: len(self.pressed_keys)]:
-            self._act_on_error()
+class KeyEventQueue:
+    """The pynput listener callbacks. They only take the timestamp and push the
+    event to a queue; all other work (the recorder state machine, echoing,
+    prompts) is done by the thread consuming the queue."""
 
-    def _act_on_error(self):
+    def __init__(self):
+        self.events: SimpleQueue[tuple[str, object, int]] = SimpleQueue()
 
-        if self.state == "RECORDING_STARTING_SEQUENCE":
-            self.restart_recording_sequence("RECORDING_STARTING_SEQUENCE")
-        elif (
-            self.state == "RECORDING_TRIGRAM"
-            or self.state == "RECORDING_FINAL_SEQUENCE"
-        ):
-            print(
-                ' Pressed wrong key! Pressed: "{}", expecting: "{}"'.format(
-                    self.pressed_keys, self.expected_keys
-                )
-            )
-            self.start_recording_starting_sequence()
+    def on_press(self, key):
+        t_ns = time.perf_counter_ns()
+        self.events.put((PRESS, key, t_ns))
 
     def on_release(self, key):
-
-        if key == keyboard.Key.ctrl_l or key == keyboard.Key.ctrl_r:
-            self.ctrl_pressed = False
-
-        if self.pressed_keys == self.expected_keys:
-            if self.state == "RECORDING_STARTING_SEQUENCE":
-                self.start_recording_trigram()
-            elif self.state == "RECORDING_TRIGRAM":
-                self.start_recording_final_sequence()
-            elif self.state == "RECORDING_FINAL_SEQUENCE":
-                self.finalize()
-                return False  # stop listening
-
-
-def get_timing_for_trigram(trigram: str, wait_sequence: str, wait_text: str) -> float:
-    recorder = TrigramTimingRecorder(trigram, wait_sequence, wait_text)
-    with keyboard.Listener(
-        on_press=recorder.on_press, on_release=recorder.on_release, suppress=True
-    ) as listener:
-        listener.join()
-
-    if recorder.asked_quit:
-        # Extra step: Pressing Ctrl-C _anywhere_ (in any application) would
-        # quit, and since the recording takes a long time, better ask for
-        # confirmation.
-        if (
-            input(
-                'Type "quit" + Enter to confirm quitting. Type anything else + Enter to continue:\n'
+        t_ns = time.perf_counter_ns()
+        self.events.put((RELEASE, key, t_ns))
+
+
+class KeyboardSession:
+    """A keyboard listener kept running for a whole recording session.
+
+    Installing the keyboard hook (starting a pynput listener) takes time, and
+    key presses may be lost while it is starting. The session starts the
+    listener once, and only the recorder state machine is reset between the
+    trials. Key events captured between the trials are skipped, like they
+    were when each trial had its own listener.
+
+    Use as a context manager:
+
+        with KeyboardSession() as session:
+            delta_time = session.get_timing_for_trigram(...)
+
+    Parameters
+    ----------
+    event_log : EventLogWriter | None
+        If given, all the key events of each trial are written to this event
+        log (see effort.eventlog).
+    """
+
+    def __init__(self, event_log: EventLogWriter | None = None):
+        self.event_log = event_log
+        self.queue = KeyEventQueue()
+        self.recorder: TrigramTimingRecorder | None = None
+        self.listener = None
+        self.latency = LatencyStats()
+        # Time from asking for a new trial to being ready to process its key
+        # events, and time from the end of a trial to the start of the next.
+        self.setup_times_ns: list[int] = []
+        self.gaps_ns: list[int] = []
+        self._last_trial_end_ns: int | None = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        with metrics.stage("record.listener_start"):
+            self.listener = keyboard.Listener(
+                on_press=self.queue.on_press,
+                on_release=self.queue.on_release,
+                suppress=True,
             )
-            == "quit"
-        ):
-            exit()
+            self.listener.start()
+            self.listener.wait()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def get_timing_for_trigram(
+        self, trigram: str, wait_sequence: str, wait_text: str
+    ) -> float:
+        t_start_ns = time.perf_counter_ns()
+        if self.recorder is None:
+            self.recorder = TrigramTimingRecorder(trigram, wait_sequence, wait_text)
         else:
-            return get_timing_for_trigram(trigram, wait_sequence, wait_text)
-    return recorder.delta_time
-
-
-def get_char(key) -> str | None:
-
-    try:
-        char = key.char.lower()
-    except AttributeError:
-        logger.warning(
-            f"Special key '{key}' pressed! If you did not press a special key, something is wrong."
+            self.recorder.reset(trigram, wait_sequence, wait_text)
+        t_ready_ns = time.perf_counter_ns()
+        self.setup_times_ns.append(t_ready_ns - t_start_ns)
+        metrics.observe("record.trial_setup", (t_ready_ns - t_start_ns) / 1e9)
+        if self._last_trial_end_ns is not None:
+            self.gaps_ns.append(t_ready_ns - self._last_trial_end_ns)
+
+        process_events(
+            self.queue.events,
+            self.recorder,
+            latency=self.latency,
+            since_ns=t_start_ns,
+            event_log=self.event_log,
+            trial=self.event_log.new_trial() if self.event_log is not None else 0,
         )
-        return None  # special key
+        self._last_trial_end_ns = time.perf_counter_ns()
+
+        if self.recorder.asked_quit:
+            # Extra step: Pressing Ctrl-C _anywhere_ (in any application) would
+            # quit, and since the recording takes a long time, better ask for
+            # confirmation. The keyboard is not suppressed while asking.
+            self.stop()
+            answer = input(
+                'Type "quit" + Enter to confirm quitting. Type anything else + Enter to continue:\n'
+            )
+            if answer == "quit":
+                exit()
+            self.start()
+            self._last_trial_end_ns = None
+            return self.get_timing_for_trigram(trigram, wait_sequence, wait_text)
+        return self.recorder.delta_time
+
+    def summary(self) -> str:
+        lines = [self.latency.summary()]
+        for name, times_ns in (
+            ("Trial setup", self.setup_times_ns),
+            ("Gap between trials", self.gaps_ns),
+        ):
+            if times_ns:
+                times_ms = sorted(t / 1e6 for t in times_ns)
+                lines.append(
+                    f"{name}: median {times_ms[len(times_ms) // 2]:.3f} ms, max {times_ms[-1]:.3f} ms ({len(times_ms)} trials)"
+                )
+        return "\n".join(lines)
 
-    if len(char) != 1:
-        return None  # something is wrong. (should not happen?)
 
-    return char
+def get_timing_for_trigram(trigram: str, wait_sequence: str, wait_text: str) -> float:
+    """Records the timing of a single trial with its own keyboard listener.
+    Use KeyboardSession for recording many trials."""
+    with KeyboardSession() as session:
+        return session.get_timing_for_trigram(trigram, wait_sequence, wait_text)
 
 
 def estimate_bias(repetitions: int = 10, wait_sequence: str = "lkj"):
     total_time = 0
-    for _ in range(repetitions):
-        # Divide by two as the time is recorded twice.
-        total_time += get_timing_for_trigram(wait_sequence, wait_sequence, "") / 2
+    with KeyboardSession() as session:
+        for _ in range(repetitions):
+            # Divide by two as the time is recorded twice.
+            total_time += (
+                session.get_timing_for_trigram(wait_sequence, wait_sequence, "") / 2
+            )
     return total_time / repetitions
 
 
@@ -0,0 +1,186 @@
+"""The keyboard layout of a config, compiled into lookup tables.
+
+The characters of the config are the keys of the layout. Each key has an
+index: the left hand keys first and then the right hand keys, the fingers in
+FINGERS order (the order of get_chars_for_hand). The compiled layout has the
+hand and the finger of each key as arrays, and a lookup table from Unicode
+code point to key index, so that for example the trigrams of the records
+can be encoded into key indices with a single array indexing.
+
+Use compile_layout(config). The layouts are cached, so that all the modules
+share the same CompiledLayout of a config.
+"""
+
+from __future__ import annotations
+
+import functools
+from types import MappingProxyType
+
+import numpy as np
+
+from effort.config import FINGERS
+
+HANDS = ("left", "right")
+
+# Size of the lookup tables: the Basic Multilingual Plane. Characters outside
+# of it are never keys.
+N_CODE_POINTS = 65536
+
+
+class CompiledLayout:
+    """Immutable, validated layout of a config.
+
+    Attributes
+    ----------
+    chars : str
+        The characters of all the keys, in key index order.
+    hand_chars : Mapping[str, str]
+        The characters of each hand (like get_chars_for_hand).
+    finger_chars : Mapping[str, Mapping[str, str]]
+        The characters of each finger of each hand (like config[hand]).
+    hand_offsets : Mapping[str, int]
+        The key index of the first key of each hand.
+    key_hand : np.ndarray
+        The hand (index of HANDS) of each key.
+    key_finger : np.ndarray
+        The finger (index of FINGERS) of each key.
+    finger_ids : np.ndarray
+        The finger of each key as key_hand * len(FINGERS) + key_finger, so
+        that the fingers of both hands are different.
+    char_lut : np.ndarray
+        Lookup table from code point to key index (-1 for other characters).
+    """
+
+    __slots__ = (
+        "chars",
+        "hand_chars",
+        "finger_chars",
+        "hand_offsets",
+        "key_hand",
+        "key_finger",
+        "finger_ids",
+        "char_lut",
+    )
+
+    def __init__(self, finger_chars: dict[str, dict[str, str]]):
+        finger_chars = {
+            hand: {finger: finger_chars[hand][finger] for finger in FINGERS}
+            for hand in HANDS
+        }
+        hand_chars = {hand: "".join(finger_chars[hand].values()) for hand in HANDS}
+        chars = "".join(hand_chars.values())
+        key_hand = np.repeat(
+            np.arange(len(HANDS), dtype=np.int8), [len(c) for c in hand_chars.values()]
+        )
+        key_finger = np.array(
+            [
+                i
+                for hand in HANDS
+                for i, finger in enumerate(FINGERS)
+                for _ in finger_chars[hand][finger]
+            ],
+            dtype=np.int8,
+        )
+        hand_offsets = {"left": 0, "right": len(hand_chars["left"])}
+        finger_ids = key_hand.astype(np.intp) * len(FINGERS) + key_finger
+        char_lut = get_char_lut(chars)
+        for array in (key_hand, key_finger, finger_ids):
+            array.flags.writeable = False
+
+        set_attr = super().__setattr__
+        set_attr(
+            "finger_chars",
+            MappingProxyType(
+                {hand: MappingProxyType(f) for hand, f in finger_chars.items()}
+            ),
+        )
+        set_attr("hand_chars", MappingProxyType(hand_chars))
+        set_attr("chars", chars)
+        set_attr("hand_offsets", MappingProxyType(hand_offsets))
+        set_attr("key_hand", key_hand)
+        set_attr("key_finger", key_finger)
+        set_attr("finger_ids", finger_ids)
+        set_attr("char_lut", char_lut)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledLayout is immutable")
+
+    def __len__(self) -> int:
+        return len(self.chars)
+
+    def hand_slice(self, hand: str) -> slice:
+        """The key indices of the hand."""
+        start = self.hand_offsets[hand]
+        return slice(start, start + len(self.hand_chars[hand]))
+
+    def encode(self, codes: np.ndarray) -> np.ndarray:
+        """The key index of each code point (-1 for characters which are not
+        keys), in an array of the same shape."""
+        return lookup(self.char_lut, codes)
+
+
+def lookup(lut: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """Looks up code points in a lookup table of N_CODE_POINTS entries. Code
+    points outside of the table get -1."""
+    codes = np.asarray(codes)
+    if codes.size and codes.max() >= N_CODE_POINTS:
+        return np.where(
+            codes < N_CODE_POINTS, lut[np.minimum(codes, N_CODE_POINTS - 1)], -1
+        )
+    return lut[codes]
+
+
+@functools.lru_cache(maxsize=64)
+def get_char_lut(chars: str, fold_case: bool = False) -> np.ndarray:
+    """Lookup table from code point to the index of the character in chars
+    (-1 for other characters). The table is shared (cached), so it is read
+    only.
+
+    Parameters
+    ----------
+    fold_case : bool
+        If True, the upper case characters are mapped to the same index as
+        the lower case ones.
+    """
+    lut = np.full(N_CODE_POINTS, -1, dtype=np.int16)
+    for i, char in enumerate(chars):
+        variants = {char, char.upper()} if fold_case else {char}
+        for variant in variants:
+            if len(variant) == 1 and ord(variant) < N_CODE_POINTS:
+                lut[ord(variant)] = i
+    lut.flags.writeable = False
+    return lut
+
+
+def compile_layout(config: dict) -> CompiledLayout:
+    """The compiled layout of the config. Raises ValueError if the layout is
+    not valid: a finger is missing, a key is not a single character of the
+    Basic Multilingual Plane, or a character is on more than one key."""
+    try:
+        key = tuple(
+            (hand, finger, config[hand][finger]) for hand in HANDS for finger in FINGERS
+        )
+    except (KeyError, TypeError) as e:
+        raise ValueError(
+            f"The config must have the characters of each finger ({', '.join(FINGERS)}) of both hands (left, right): missing {e}"
+        ) from None
+    return _compile_layout(key)
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_layout(key: tuple[tuple[str, str, str], ...]) -> CompiledLayout:
+    finger_chars: dict[str, dict[str, str]] = {hand: {} for hand in HANDS}
+    seen: dict[str, str] = {}
+    for hand, finger, chars in key:
+        if not isinstance(chars, str):
+            raise ValueError(f"The characters of {hand} {finger} must be a string")
+        for char in chars:
+            if ord(char) >= N_CODE_POINTS:
+                raise ValueError(f"Character {char!r} is not supported as a key")
+            if char in seen:
+                raise ValueError(
+                    f"Character {char!r} is on more than one key ({seen[char]} and {hand} {finger})"
+                )
+            seen[char] = f"{hand} {finger}"
+        finger_chars[hand][finger] = chars
+    return CompiledLayout(finger_chars)
@@ -0,0 +1,194 @@
+"""Timing (and memory) metrics of the processing stages.
+
+The code to be measured is wrapped in stages, and single durations (like the
+latency of a key event) are added with observe:
+
+    from effort import metrics
+
+    with metrics.stage("parse"):
+        records = load_records(file)
+    metrics.observe("record.event_latency", seconds)
+
+Nothing is collected unless a collection is active (see collect); then
+stage returns a shared no-op context manager and observe returns
+immediately. The --profile and --metrics-json options of effort_grid_show
+and effort_grid_record use this (see profile).
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+# The histogram bins (seconds): three per decade from 1 µs to 100 s.
+HISTOGRAM_EDGES = 10.0 ** np.arange(-6, 2 + 1 / 3, 1 / 3)
+
+_NULL_STAGE = contextlib.nullcontext()
+_active: Metrics | None = None
+
+
+class Metrics:
+    """The durations (seconds) of each stage or observation, by name, and
+    the peak memory allocated during each stage (with track_memory)."""
+
+    def __init__(self, track_memory: bool = False):
+        self.track_memory = track_memory
+        self.durations: dict[str, list[float]] = {}
+        self.peak_bytes: dict[str, int] = {}
+        # The stages being run: [name, memory at start, peak so far].
+        self._stack: list[list] = []
+
+    def observe(self, name: str, seconds: float):
+        self.durations.setdefault(name, []).append(seconds)
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        if self.track_memory and tracemalloc.is_tracing():
+            self._fold_peak()
+            tracemalloc.reset_peak()
+            self._stack.append([name, tracemalloc.get_traced_memory()[0], 0])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+            if self._stack and self._stack[-1][0] == name:
+                self._fold_peak()
+                _, start_bytes, peak = self._stack.pop()
+                self.peak_bytes[name] = max(
+                    self.peak_bytes.get(name, 0), peak - start_bytes
+                )
+
+    def _fold_peak(self):
+        # tracemalloc has a single peak; it is reset at the start of each
+        # stage, so the peak so far is first recorded for the outer stages.
+        peak = tracemalloc.get_traced_memory()[1]
+        for entry in self._stack:
+            entry[2] = max(entry[2], peak)
+
+    def to_dict(self) -> dict:
+        """The summary statistics and the histogram of each metric."""
+        result = {}
+        for name, durations in self.durations.items():
+            values = np.array(durations)
+            counts, _ = np.histogram(
+                np.clip(values, HISTOGRAM_EDGES[0], HISTOGRAM_EDGES[-1]),
+                bins=HISTOGRAM_EDGES,
+            )
+            result[name] = {
+                "count": len(values),
+                "total_s": float(values.sum()),
+                "mean_s": float(values.mean()),
+                "min_s": float(values.min()),
+                "median_s": float(np.median(values)),
+                "p90_s": float(np.quantile(values, 0.9)),
+                "p99_s": float(np.quantile(values, 0.99)),
+                "max_s": float(values.max()),
+                "histogram": {
+                    "edges_s": HISTOGRAM_EDGES.tolist(),
+                    "counts": counts.tolist(),
+                },
+            }
+            if name in self.peak_bytes:
+                result[name]["peak_mb"] = self.peak_bytes[name] / 2**20
+        return result
+
+    def report(self) -> str:
+        """The metrics as text. Metrics with more than one duration also get
+        a histogram."""
+        lines = []
+        for name, stats in self.to_dict().items():
+            line = f"{name}: {_ms(stats['total_s'])} total"
+            if stats["count"] > 1:
+                line += f", {stats['count']} times, median {_ms(stats['median_s'])}, p99 {_ms(stats['p99_s'])}, max {_ms(stats['max_s'])}"
+            if "peak_mb" in stats:
+                line += f", peak memory {stats['peak_mb']:.1f} MB"
+            lines.append(line)
+            if stats["count"] > 1:
+                lines += _format_histogram(stats["histogram"])
+        return "\n".join(lines)
+
+    def write_json(self, file):
+        with open(file, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.write("\n")
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.3f} ms"
+
+
+def _format_histogram(histogram: dict, width: int = 40) -> list[str]:
+    counts = histogram["counts"]
+    edges = histogram["edges_s"]
+    used = [i for i, count in enumerate(counts) if count]
+    lines = []
+    for i in range(used[0], used[-1] + 1):
+        bar = "#" * round(width * counts[i] / max(counts))
+        lines.append(
+            f"  {_ms(edges[i]):>13} - {_ms(edges[i + 1]):>13} {counts[i]:7d} {bar}"
+        )
+    return lines
+
+
+def stage(name: str):
+    """Context manager measuring a stage, if a collection is active."""
+    if _active is None:
+        return _NULL_STAGE
+    return _active.stage(name)
+
+
+def observe(name: str, seconds: float):
+    """Adds a duration, if a collection is active."""
+    if _active is not None:
+        _active.observe(name, seconds)
+
+
+def is_enabled() -> bool:
+    return _active is not None
+
+
+@contextlib.contextmanager
+def collect(track_memory: bool = False):
+    """Collects the metrics of the stages run inside the with block. Yields
+    the Metrics. With track_memory, the peak memory of the stages is
+    measured with tracemalloc (which slows down memory allocation)."""
+    global _active
+    previous = _active
+    metrics = Metrics(track_memory=track_memory)
+    started_tracing = track_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    _active = metrics
+    try:
+        yield metrics
+    finally:
+        _active = previous
+        if started_tracing:
+            tracemalloc.stop()
+
+
+@contextlib.contextmanager
+def profile(show_report: bool = False, json_file=None, track_memory: bool = False):
+    """Collects the metrics of the with block if show_report or json_file is
+    given, and then prints the report (to stderr) and/or writes the metrics
+    into json_file. The report is also given if the block raises (for
+    example when quitting a recording)."""
+    if not show_report and json_file is None:
+        yield None
+        return
+    metrics = None
+    try:
+        with collect(track_memory=track_memory) as metrics:
+            yield metrics
+    finally:
+        if metrics is not None:
+            if show_report:
+                print(f"\nProfile:\n{metrics.report()}", file=sys.stderr)
+            if json_file is not None:
+                metrics.write_json(json_file)
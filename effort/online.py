@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from effort.calculate import (
+    print_model_efforts,
+    read_xy_data,
+    solve_normal_equations,
+)
+from effort.layout import compile_layout
+from effort.records import TrigramRecords
+
+HANDS = ("left", "right")
+
+
+class OnlineEffortModel:
+    """Incrementally updated least squares effort model (one model per hand).
+
+    Keeps the sufficient statistics XᵀWX, XᵀWy and XᵀW1 of the weighted
+    least squares problem solved by show_model, so the coefficients can be
+    solved at any time without rereading the timings. Each trigram is added
+    as the mean of its n_best timings with a weight equal to the number of
+    timings used, exactly like in read_xy_data. The home key sequence bias is
+    applied only when solving, so the state does not depend on it.
+    """
+
+    def __init__(self, config: dict):
+        self.n_best = int(config["trigram_use_n_best"])
+        self.layout = compile_layout(config)
+        self.chars = {hand: self.layout.hand_chars[hand] for hand in HANDS}
+        self.bias = {hand: config[f"home_key_sequence_timing_{hand}"] for hand in HANDS}
+        self.xtx = {hand: np.zeros((len(c), len(c))) for hand, c in self.chars.items()}
+        self.xty = {hand: np.zeros(len(c)) for hand, c in self.chars.items()}
+        self.xtw = {hand: np.zeros(len(c)) for hand, c in self.chars.items()}
+        self.n_trigrams = 0
+        self._char_index = {
+            hand: {char: i for i, char in enumerate(chars)}
+            for hand, chars in self.chars.items()
+        }
+
+    def update(self, trigram: str, timings: Iterable[float]):
+        """Adds the recorded timings (seconds) of a trigram to the model. This
+        is O(k²) in the number of characters in the trigram."""
+        best_timings = sorted(timings)[: self.n_best]
+        if not best_timings:
+            return
+        weight = len(best_timings)
+        y = sum(best_timings) / weight
+
+        for hand in HANDS:
+            index = self._char_index[hand]
+            idx = sorted({index[char] for char in trigram if char in index})
+            if not idx:
+                continue
+            self.xtx[hand][np.ix_(idx, idx)] += weight
+            self.xty[hand][idx] += weight * y
+            self.xtw[hand][idx] += weight
+        self.n_trigrams += 1
+
+    def update_records(self, records: TrigramRecords):
+        """Adds all trigrams of the records to the model."""
+        for hand in HANDS:
+            X, y, weights = read_xy_data(records, self.n_best, self.layout, hand)
+            Xw = X.multiply(weights[:, None]).tocsr()
+            self.xtx[hand] += (X.T @ Xw).toarray()
+            self.xty[hand] += Xw.T @ y
+            self.xtw[hand] += np.asarray(Xw.sum(axis=0)).ravel()
+        self.n_trigrams += int(np.count_nonzero(records.n_repeats))
+
+    def coefficients(self) -> dict[str, tuple[str, np.ndarray]]:
+        """The effort model coefficients (seconds) for each hand, as a dict
+        from hand to a tuple of the hand characters and the coefficients."""
+        coefs = {}
+        for hand in HANDS:
+            xty = self.xty[hand] - self.bias[hand] * self.xtw[hand]
+            coefs[hand] = (
+                self.chars[hand],
+                solve_normal_equations(self.xtx[hand], xty),
+            )
+        return coefs
+
+    def coefficient_variances(self) -> dict[str, np.ndarray]:
+        """The variances of the coefficients of each hand, in units of the
+        variance of a single timing: diag((XᵀWX)⁻¹). The characters without
+        any data get an infinite variance."""
+        variances = {}
+        for hand in HANDS:
+            xtx = self.xtx[hand]
+            variance = np.full(len(xtx), np.inf)
+            seen = np.flatnonzero(np.diag(xtx))
+            if len(seen):
+                sub = np.ix_(seen, seen)
+                variance[seen] = np.diag(np.linalg.pinv(xtx[sub], hermitian=True))
+            variances[hand] = variance
+        return variances
+
+    def is_identified(self) -> bool:
+        """True when there is enough data to solve all the coefficients."""
+        return all(
+            np.linalg.matrix_rank(self.xtx[hand]) == len(self.chars[hand])
+            for hand in HANDS
+        )
+
+    def print_efforts(self):
+        if not self.is_identified():
+            n_seen = sum(int(np.count_nonzero(np.diag(x))) for x in self.xtx.values())
+            n_chars = sum(len(chars) for chars in self.chars.values())
+            print(
+                f"Effort grid: not enough data yet ({n_seen}/{n_chars} characters recorded)"
+            )
+            return
+        print_model_efforts(self.coefficients())
+
+    def save(self, file):
+        """Saves the model state, so that new data can be added later without
+        rereading the already recorded timings. The state is written to a
+        temporary file which then replaces the file, so an interrupted save
+        does not leave a broken state behind."""
+        state = {"n_best": self.n_best, "n_trigrams": self.n_trigrams}
+        for hand in HANDS:
+            state[f"chars_{hand}"] = self.chars[hand]
+            state[f"xtx_{hand}"] = self.xtx[hand]
+            state[f"xty_{hand}"] = self.xty[hand]
+            state[f"xtw_{hand}"] = self.xtw[hand]
+        path = Path(file)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                np.savez(f, **state)
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def load(cls, file, config: dict) -> OnlineEffortModel:
+        """Loads a model state saved with save. The bias is taken from the
+        config; the characters and trigram_use_n_best must match the ones used
+        when the state was saved."""
+        model = cls(config)
+        with np.load(Path(file)) as state:
+            if int(state["n_best"]) != model.n_best:
+                raise ValueError(
+                    f"Model state {file} uses trigram_use_n_best={int(state['n_best'])}, but the config has {model.n_best}"
+                )
+            for hand in HANDS:
+                if str(state[f"chars_{hand}"]) != model.chars[hand]:
+                    raise ValueError(
+                        f"Model state {file} has different {hand} hand characters than the config"
+                    )
+                model.xtx[hand] = state[f"xtx_{hand}"].copy()
+                model.xty[hand] = state[f"xty_{hand}"].copy()
+                model.xtw[hand] = state[f"xtw_{hand}"].copy()
+            model.n_trigrams = int(state["n_trigrams"])
+        return model
@@ -0,0 +1,254 @@
+"""Layout optimization with simulated annealing.
+
+A layout assigns each character of the config to a key. The keys are the
+positions of the characters in the config (in get_layout_chars order), and
+each key has the effort of the character on it in the effort grid and a
+finger. The cost of a layout for a corpus is
+
+    Σ_c f[c] effort[key(c)] + sfb_penalty * (number of same finger bigrams)
+
+divided by the number of characters, where f are the character counts of
+the corpus (see effort.score.CorpusCounts).
+"""
+
+from __future__ import annotations
+
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import yaml
+
+from effort.config import FINGERS
+from effort.grid import EffortGrid
+from effort.score import HANDS, CorpusCounts, get_finger_ids, get_layout_chars
+
+# Number of random swaps used for choosing the initial temperature.
+N_CALIBRATION_SWAPS = 1000
+
+
+class LayoutProblem:
+    """The precomputed arrays of a layout optimization problem.
+
+    Attributes
+    ----------
+    chars : str
+        The characters to place, in the order of the keys of the config.
+    key_effort : np.ndarray
+        The effort of each key.
+    key_finger : np.ndarray
+        The finger index of each key.
+    char_freq : np.ndarray
+        The count of each character, divided by the total count.
+    bigram_sym : np.ndarray
+        Symmetric bigram frequencies B + Bᵀ (same normalization), with a zero
+        diagonal (repeating a key is not a same finger bigram).
+    movable : np.ndarray
+        Indices of the characters which may be moved. The characters of the
+        home key sequences (and the fixed characters) are kept on their keys,
+        so that the layouts can be recorded with the same sequences.
+    """
+
+    def __init__(
+        self,
+        counts: CorpusCounts,
+        grid: EffortGrid,
+        config: dict,
+        sfb_penalty: float = 1.0,
+        fixed: str = "",
+    ):
+        self.config = config
+        self.chars = get_layout_chars(config)
+        efforts = grid.as_dict()
+        key_effort = np.array([efforts.get(c, np.nan) for c in self.chars])
+        # Keys without an effort get the largest effort.
+        self.key_effort = np.where(
+            np.isnan(key_effort), np.nanmax(key_effort), key_effort
+        )
+        _, self.key_finger = get_finger_ids(config)
+        total = max(int(counts.char_counts.sum()), 1)
+        self.char_freq = counts.char_counts / total
+        bigram_sym = (counts.bigram_counts + counts.bigram_counts.T) / total
+        np.fill_diagonal(bigram_sym, 0)
+        self.bigram_sym = bigram_sym
+        self.sfb_penalty = sfb_penalty
+        fixed += "".join(config[f"home_key_sequence_{hand}"] for hand in HANDS)
+        self.movable = np.array(
+            [i for i, c in enumerate(self.chars) if c not in fixed], dtype=np.intp
+        )
+        if len(self.movable) < 2:
+            raise ValueError(
+                "At least two characters must be movable (not fixed and not in the home key sequences)"
+            )
+
+    def cost(self, keys: np.ndarray) -> float:
+        """The cost of a layout, where keys[c] is the key of character c."""
+        fingers = self.key_finger[keys]
+        same_finger = fingers[:, None] == fingers[None, :]
+        sfb = (self.bigram_sym * same_finger).sum() / 2
+        return float(self.char_freq @ self.key_effort[keys] + self.sfb_penalty * sfb)
+
+    def to_config(self, keys: np.ndarray) -> dict:
+        """The layout as a config (same schema as read_config_file)."""
+        config = copy.deepcopy(self.config)
+        placed = [""] * len(self.chars)
+        for char, key in zip(self.chars, keys):
+            placed[key] = char
+        position = 0
+        for hand in HANDS:
+            for finger in FINGERS:
+                n = len(self.config[hand][finger])
+                config[hand][finger] = "".join(placed[position : position + n])
+                position += n
+        return config
+
+
+def get_finger_bigrams(problem: LayoutProblem, fingers: np.ndarray) -> np.ndarray:
+    """F[c, g]: the bigram frequency of character c with the characters on
+    finger g, when fingers[c] is the finger of character c."""
+    n_fingers = int(problem.key_finger.max()) + 1
+    F = np.zeros((len(fingers), n_fingers))
+    for g in range(n_fingers):
+        F[:, g] = problem.bigram_sym[:, fingers == g].sum(axis=1)
+    return F
+
+
+def get_swap_delta(
+    problem: LayoutProblem, keys: np.ndarray, fingers: np.ndarray, F: np.ndarray
+) -> Callable[[int, int], float]:
+    """The function giving the change of the cost when characters a and b
+    swap keys. keys, fingers and F (see get_finger_bigrams) are read when
+    it is called, so they must be updated in place (see apply_swap)."""
+    effort = problem.key_effort
+    freq = problem.char_freq
+    sym = problem.bigram_sym
+    penalty = problem.sfb_penalty
+
+    def delta(a: int, b: int) -> float:
+        ka, kb = keys[a], keys[b]
+        d = (freq[a] - freq[b]) * (effort[kb] - effort[ka])
+        ga, gb = fingers[a], fingers[b]
+        if ga != gb:
+            d_sfb = F[a, gb] + F[b, ga] - F[a, ga] - F[b, gb] - 2 * sym[a, b]
+            d += penalty * d_sfb
+        return d
+
+    return delta
+
+
+def apply_swap(
+    problem: LayoutProblem,
+    keys: np.ndarray,
+    fingers: np.ndarray,
+    F: np.ndarray,
+    a: int,
+    b: int,
+):
+    """Swaps the keys of characters a and b, updating fingers and F."""
+    ga, gb = fingers[a], fingers[b]
+    if ga != gb:
+        diff = problem.bigram_sym[:, b] - problem.bigram_sym[:, a]
+        F[:, ga] += diff
+        F[:, gb] -= diff
+    keys[a], keys[b] = keys[b], keys[a]
+    fingers[a], fingers[b] = gb, ga
+
+
+def anneal(
+    problem: LayoutProblem,
+    n_iterations: int,
+    seed: np.random.SeedSequence | int | None = None,
+    final_temperature_ratio: float = 1e-3,
+) -> tuple[float, np.ndarray]:
+    """Simulated annealing over swaps of two characters, starting from a
+    random layout.
+
+    The effort part of the cost delta of a swap is O(1). For the same finger
+    bigrams, F[c, g] (the bigram frequency of character c with the
+    characters on finger g) is kept up to date, which makes the delta O(1)
+    as well; F is updated (O(n)) only when a swap is accepted.
+
+    Returns
+    -------
+    cost, keys : float, np.ndarray
+        The best layout found (keys[c] is the key of character c) and its
+        cost.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(problem.chars)
+    movable = problem.movable
+    keys = np.arange(n)
+    keys[movable] = rng.permutation(keys[movable])
+
+    fingers = problem.key_finger[keys]
+    F = get_finger_bigrams(problem, fingers)
+    delta = get_swap_delta(problem, keys, fingers, F)
+
+    pairs = rng.choice(movable, size=(N_CALIBRATION_SWAPS, 2))
+    deltas = [abs(delta(a, b)) for a, b in pairs if a != b]
+    temperature = float(np.mean(deltas)) if deltas else 0.0
+    cooling = final_temperature_ratio ** (1 / max(n_iterations, 1))
+
+    cost = problem.cost(keys)
+    best_cost, best_keys = cost, keys.copy()
+    pairs = rng.choice(movable, size=(n_iterations, 2)).tolist()
+    thresholds = rng.random(n_iterations).tolist()
+    for (a, b), threshold in zip(pairs, thresholds):
+        temperature *= cooling
+        if a == b:
+            continue
+        d = delta(a, b)
+        if d > 0 and (temperature <= 0 or threshold >= np.exp(-d / temperature)):
+            continue
+        apply_swap(problem, keys, fingers, F, a, b)
+        cost += d
+        if cost < best_cost:
+            best_cost, best_keys = cost, keys.copy()
+    # Recalculate, to not accumulate rounding errors of the deltas.
+    return problem.cost(best_keys), best_keys
+
+
+def optimize_layout(
+    problem: LayoutProblem,
+    n_restarts: int = 8,
+    n_iterations: int = 200_000,
+    seed: int | None = None,
+    n_jobs: int | None = None,
+) -> list[tuple[float, np.ndarray]]:
+    """Runs n_restarts independent annealing runs in n_jobs worker processes.
+    Returns the (cost, keys) of each run, best first."""
+    n_jobs = n_jobs or os.cpu_count() or 1
+    seeds = np.random.SeedSequence(seed).spawn(n_restarts)
+    if n_jobs == 1 or n_restarts == 1:
+        results = [anneal(problem, n_iterations, s) for s in seeds]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, n_restarts)) as executor:
+            results = list(
+                executor.map(
+                    anneal, [problem] * n_restarts, [n_iterations] * n_restarts, seeds
+                )
+            )
+    return sorted(results, key=lambda result: result[0])
+
+
+def write_layout_configs(
+    problem: LayoutProblem,
+    results: list[tuple[float, np.ndarray]],
+    directory,
+    n_best: int = 3,
+) -> list[Path]:
+    """Writes the n_best layouts as config files layout-<rank>.yaml."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    files = []
+    for rank, (cost, keys) in enumerate(results[:n_best], start=1):
+        file = directory / f"layout-{rank}.yaml"
+        text = f"# Layout cost (effort per character): {cost:.4f}\n" + yaml.safe_dump(
+            problem.to_config(keys), allow_unicode=True, sort_keys=False
+        )
+        file.write_text(text)
+        files.append(file)
+    return files
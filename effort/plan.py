@@ -0,0 +1,212 @@
+"""Recording plans split into shards, for recording with many people or
+machines at the same time.
+
+A plan file is a JSON file with the recording order of effort_grid_record
+(the characters and their trigrams, see effort.effort.get_recording_plan),
+generated with a seed so that it can be reproduced. The trigrams are split
+into shards of (almost) the same size, and each shard has trigrams of every
+finger of both hands. Each shard is recorded into its own record file with
+effort_grid_record --plan <plan file> --shard <shard>, and the record files
+are combined into one binary record file with merge_shards. The merged file
+has the provenance of each trigram as extra columns (see
+effort.records.load_binary_columns):
+
+    shard       the shard of the trigram
+    plan_index  the index of the trigram in the plan (-1 for the trigrams
+                added during the recording, see effort.adaptive)
+    source      the record file of the trigram
+"""
+
+from __future__ import annotations
+
+import json
+import random
+from pathlib import Path
+
+import numpy as np
+
+from effort.config import FINGERS
+from effort.layout import HANDS, compile_layout
+from effort.records import concat_records, load_records, save_binary_records
+
+PLAN_VERSION = 1
+PROVENANCE_COLUMNS = ("shard", "plan_index", "source")
+
+
+def create_plan(config: dict, n_shards: int = 1, seed: int | None = None) -> dict:
+    """Creates a recording plan with n_shards shards. Without a seed, a
+    random seed is used (and saved into the plan)."""
+    from effort.effort import get_recording_plan
+
+    if n_shards < 1:
+        raise ValueError("The number of shards must be at least 1")
+    if seed is None:
+        seed = random.SystemRandom().randrange(2**32)
+    plan = get_recording_plan(config, rng=random.Random(seed))
+    return {
+        "version": PLAN_VERSION,
+        "seed": seed,
+        "n_repeats": config["trigram_repeat_times"],
+        "trigram_selection": config.get("trigram_selection", "random"),
+        "layout": compile_layout(config).chars,
+        "shards": partition_plan(plan, n_shards),
+    }
+
+
+def partition_plan(plan: list[dict], n_shards: int) -> list[list[dict]]:
+    """Splits the trigrams of a plan into n_shards plans.
+
+    The trigrams are grouped by the finger of their middle character, and
+    dealt to the shards in turns, so that the shards differ by at most one
+    trigram and every shard gets trigrams of every finger. The recording
+    order of the plan is kept in each shard. Raises ValueError if a finger
+    has fewer trigrams than there are shards.
+    """
+    finger_order = {
+        (hand, finger): i
+        for i, (hand, finger) in enumerate((h, f) for h in HANDS for f in FINGERS)
+    }
+    for hand, finger in finger_order:
+        n = sum(
+            len(item["trigrams"])
+            for item in plan
+            if item["hand"] == hand and item["finger"] == finger
+        )
+        if 0 < n < n_shards:
+            raise ValueError(
+                f"Cannot split the plan into {n_shards} shards with every finger: {hand} {finger} has only {n} trigrams"
+            )
+    trigrams = [
+        (i, trigram) for i, item in enumerate(plan) for trigram in item["trigrams"]
+    ]
+    trigrams.sort(key=lambda t: finger_order[plan[t[0]]["hand"], plan[t[0]]["finger"]])
+
+    assigned: list[dict[int, list[str]]] = [{} for _ in range(n_shards)]
+    for k, (i, trigram) in enumerate(trigrams):
+        assigned[k % n_shards].setdefault(i, []).append(trigram)
+
+    return [
+        [{**plan[i], "trigrams": shard[i]} for i in sorted(shard)] for shard in assigned
+    ]
+
+
+def save_plan(plan: dict, file):
+    with open(file, "w") as f:
+        json.dump(plan, f, indent=1)
+        f.write("\n")
+
+
+def load_plan(file) -> dict:
+    with open(file) as f:
+        plan = json.load(f)
+    if plan.get("version", 0) > PLAN_VERSION:
+        raise ValueError(f"Unsupported plan file version {plan['version']} in {file}")
+    return plan
+
+
+def get_shard(plan: dict, shard: int, config: dict) -> list[dict]:
+    """The recording plan of a shard. Raises ValueError if the plan was not
+    made for the layout and the number of repetitions of the config."""
+    if plan["layout"] != compile_layout(config).chars:
+        raise ValueError("The plan was created for a different layout")
+    if plan["n_repeats"] != config["trigram_repeat_times"]:
+        raise ValueError(
+            f"The plan has {plan['n_repeats']} repetitions per trigram, but the config has {config['trigram_repeat_times']}"
+        )
+    if not 0 <= shard < len(plan["shards"]):
+        raise ValueError(
+            f"Shard {shard} is not in the plan (shards 0-{len(plan['shards']) - 1})"
+        )
+    return plan["shards"][shard]
+
+
+def get_plan_trigrams(plan: dict) -> dict[str, tuple[int, int]]:
+    """The shard and the plan index of each trigram of the plan."""
+    trigrams = {}
+    for shard, items in enumerate(plan["shards"]):
+        for item in items:
+            for trigram in item["trigrams"]:
+                trigrams[trigram] = (shard, -1)
+    # The plan index runs over the trigrams of all the shards in shard order.
+    for plan_index, trigram in enumerate(trigrams):
+        trigrams[trigram] = (trigrams[trigram][0], plan_index)
+    return trigrams
+
+
+def merge_shards(plan: dict, record_files: list[Path], output_file: Path) -> dict:
+    """Merges the record files of the shards of a plan into one binary record
+    file with the provenance columns (see the module docstring).
+
+    The shard of each record file is found from its trigrams. Raises
+    ValueError if a record file has trigrams of more than one shard, if two
+    record files are of the same shard, or if a record file has no trigrams
+    of the plan.
+
+    Returns
+    -------
+    dict
+        The number of trigrams recorded and planned for each shard.
+    """
+    planned = get_plan_trigrams(plan)
+    n_shards = len(plan["shards"])
+    shard_files: dict[int, Path] = {}
+    n_planned = np.bincount([s for s, _ in planned.values()], minlength=n_shards)
+    n_recorded = np.zeros(n_shards, dtype=int)
+    parts, shards, plan_indices, sources = [], [], [], []
+    for file in record_files:
+        records = load_records(file)
+        found = [
+            planned.get(trigram, (-1, -1)) for trigram in records.trigrams.tolist()
+        ]
+        file_shards = {shard for shard, _ in found if shard >= 0}
+        if len(file_shards) != 1:
+            raise ValueError(
+                f"{file} has trigrams of shards {sorted(file_shards)} of the plan"
+                if file_shards
+                else f"{file} has no trigrams of the plan"
+            )
+        shard = file_shards.pop()
+        if shard in shard_files:
+            raise ValueError(
+                f"{shard_files[shard]} and {file} are both recordings of shard {shard}"
+            )
+        shard_files[shard] = file
+        parts.append(records)
+        shards.append(np.full(len(records), shard, dtype=np.int64))
+        plan_indices.append(np.array([i for _, i in found], dtype=np.int64))
+        sources.append(np.full(len(records), str(file)))
+        n_recorded[shard] = np.count_nonzero(plan_indices[-1] >= 0)
+
+    columns = (shards, plan_indices, sources)
+    save_binary_records(
+        concat_records(parts),
+        output_file,
+        extra_columns={
+            name: np.concatenate(values)
+            for name, values in zip(PROVENANCE_COLUMNS, columns)
+        },
+        metadata={
+            "plan_seed": plan["seed"],
+            "plan_version": plan["version"],
+            "shard_files": {str(k): str(v) for k, v in sorted(shard_files.items())},
+        },
+    )
+    return {
+        shard: (int(n_recorded[shard]), int(n_planned[shard]))
+        for shard in range(n_shards)
+    }
+
+
+def format_plan_summary(plan: dict) -> str:
+    """The number of trigrams and repetitions of each shard, and the fewest
+    trigrams of a finger in the shard."""
+    lines = [f"Plan with seed {plan['seed']}, {len(plan['shards'])} shard(s):"]
+    for shard, items in enumerate(plan["shards"]):
+        n_trigrams = sum(len(item["trigrams"]) for item in items)
+        per_finger = {(hand, finger): 0 for hand in HANDS for finger in FINGERS}
+        for item in items:
+            per_finger[item["hand"], item["finger"]] += len(item["trigrams"])
+        lines.append(
+            f"  shard {shard}: {len(items)} characters, {n_trigrams} trigrams, {n_trigrams * plan['n_repeats']} recordings (at least {min(per_finger.values())} trigrams per finger)"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,235 @@
+"""The state machine recording the timing of one trigram trial.
+
+The key events (press or release, the key and the time it was captured in
+nanoseconds) are fed to TrigramTimingRecorder with process_events. This
+module does not depend on pynput or the wall clock: effort.keyboard feeds it
+the events of a live keyboard listener, and effort.replay recorded or
+synthetic events.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from typing import TYPE_CHECKING, Literal
+
+from effort import metrics
+from effort.eventlog import PRESS_CODE, RELEASE_CODE
+
+if TYPE_CHECKING:
+    from queue import SimpleQueue
+    from typing import TextIO
+
+    from effort.eventlog import EventLogWriter
+
+logger = logging.getLogger(__name__)
+
+PRESS = "press"
+RELEASE = "release"
+
+State = Literal[
+    "NOT_STARTED",
+    "RECORDING_STARTING_SEQUENCE",
+    "RECORDING_TRIGRAM",
+    "RECORDING_FINAL_SEQUENCE",
+]
+
+
+class TrigramTimingRecorder:
+    """State machine for recording the timing of a trigram.
+
+    The key events are fed with on_press and on_release, together with the
+    time (time.perf_counter_ns) when the event was captured. The timing is
+    calculated from these timestamps only, so the time used for processing
+    the events (and printing) is not part of the recorded timing.
+
+    The recorder does not depend on pynput: the keys only need a char
+    attribute (like pynput.keyboard.KeyCode), or a name (like
+    pynput.keyboard.Key) for special keys. See effort.replay for feeding it
+    events without a keyboard.
+    """
+
+    def __init__(
+        self,
+        trigram: str,
+        wait_sequence: str,
+        wait_text: str = "",
+        out: TextIO | None = None,
+    ):
+        # Where the prompts and the echoed keys are printed (None: stdout).
+        self.out = out
+        self.reset(trigram, wait_sequence, wait_text)
+
+    def reset(self, trigram: str, wait_sequence: str, wait_text: str = ""):
+        """Resets the state machine for recording a new trial."""
+        self.trigram = trigram
+        self.sequence = wait_sequence
+        self.sequence_keys = list(wait_sequence)
+        self.trigram_keys = list(trigram)
+        self.delta_time: float = 0
+        self.start_time_ns: int = 0
+        self.done = False
+        self.state: State = "NOT_STARTED"
+        self.pressed_keys: list[str] = []
+        self.wait_text = wait_text
+        self.ctrl_pressed = False
+        self.asked_quit = False
+        self.start_recording_starting_sequence()
+
+    def start_recording_starting_sequence(self):
+        if self.wait_text:
+            print("\r" + self.wait_text, file=self.out)
+        else:
+            print(
+                f'\rType sequence "{self.sequence}" to start recording', file=self.out
+            )
+        self.restart_recording_sequence("RECORDING_STARTING_SEQUENCE")
+
+    def start_recording_final_sequence(self):
+        print(f'\rType sequence "{self.sequence}" to end recording', file=self.out)
+        self.restart_recording_sequence("RECORDING_FINAL_SEQUENCE")
+
+    def restart_recording_sequence(self, state: State):
+        self.state = state
+        self.pressed_keys = []
+        self.expected_keys = self.sequence_keys
+
+    def start_recording_trigram(self, t_ns: int):
+        self.state = "RECORDING_TRIGRAM"
+        self.pressed_keys = []
+        self.expected_keys = self.trigram_keys
+        self.start_time_ns = t_ns
+        print(f'\rType: "{self.trigram}":', file=self.out)
+
+    def finalize(self, t_ns: int):
+        self.delta_time = (t_ns - self.start_time_ns) / 1e9
+        self.done = True
+        print(f"\r OK! ({self.delta_time*1000:.0f} ms)", file=self.out)
+
+    def on_press(self, key, t_ns: int):
+        char = get_char(key)
+        self.pressed_keys.append(char)
+
+        if is_ctrl(key):
+            self.ctrl_pressed = True
+        elif char:
+            print(char, end="", flush=True, file=self.out)
+
+        if self.ctrl_pressed and char == "c":
+            print("\nCtrl-C pressed, exiting...", file=self.out)
+            self.asked_quit = True
+            return False
+
+        if self.pressed_keys != self.expected_keys[: len(self.pressed_keys)]:
+            self._act_on_error()
+
+    def _act_on_error(self):
+
+        if self.state == "RECORDING_STARTING_SEQUENCE":
+            self.restart_recording_sequence("RECORDING_STARTING_SEQUENCE")
+        elif (
+            self.state == "RECORDING_TRIGRAM"
+            or self.state == "RECORDING_FINAL_SEQUENCE"
+        ):
+            print(
+                ' Pressed wrong key! Pressed: "{}", expecting: "{}"'.format(
+                    self.pressed_keys, self.expected_keys
+                ),
+                file=self.out,
+            )
+            self.start_recording_starting_sequence()
+
+    def on_release(self, key, t_ns: int):
+
+        if is_ctrl(key):
+            self.ctrl_pressed = False
+
+        if self.pressed_keys == self.expected_keys:
+            if self.state == "RECORDING_STARTING_SEQUENCE":
+                self.start_recording_trigram(t_ns)
+            elif self.state == "RECORDING_TRIGRAM":
+                self.start_recording_final_sequence()
+            elif self.state == "RECORDING_FINAL_SEQUENCE":
+                self.finalize(t_ns)
+                return False  # stop listening
+
+
+class LatencyStats:
+    """Collects the latency (ns) from capturing a key event (timestamp taken in
+    the listener callback) to processing it in the recorder."""
+
+    def __init__(self):
+        self.latencies_ns: list[int] = []
+
+    def add(self, latency_ns: int):
+        self.latencies_ns.append(latency_ns)
+
+    def summary(self) -> str:
+        if not self.latencies_ns:
+            return "Event latency: no events"
+        latencies_ms = sorted(latency / 1e6 for latency in self.latencies_ns)
+        n = len(latencies_ms)
+        median = latencies_ms[n // 2]
+        p99 = latencies_ms[min(n - 1, int(n * 0.99))]
+        return f"Event latency (capture to processing): median {median:.3f} ms, p99 {p99:.3f} ms, max {latencies_ms[-1]:.3f} ms ({n} events)"
+
+
+def process_events(
+    events: SimpleQueue,
+    recorder: TrigramTimingRecorder,
+    latency: LatencyStats | None = None,
+    since_ns: int = 0,
+    event_log: EventLogWriter | None = None,
+    trial: int = 0,
+):
+    """Feeds the key events to the recorder until it is done (or quitting was
+    asked). Events captured before since_ns are skipped. If event_log is
+    given, each event is added to it (with the state of the recorder before
+    the event) under the given trial number."""
+    while True:
+        kind, key, t_ns = events.get()
+        if t_ns < since_ns:
+            continue
+        if event_log is not None:
+            event_log.add(
+                trial,
+                t_ns,
+                PRESS_CODE if kind == PRESS else RELEASE_CODE,
+                recorder.state,
+                get_char(key, warn=False),
+                recorder.trigram,
+            )
+        if kind == PRESS:
+            keep_going = recorder.on_press(key, t_ns)
+        else:
+            keep_going = recorder.on_release(key, t_ns)
+        if latency is not None:
+            latency_ns = time.perf_counter_ns() - t_ns
+            latency.add(latency_ns)
+            metrics.observe("record.event_latency", latency_ns / 1e9)
+        if keep_going is False:
+            return
+
+
+def is_ctrl(key) -> bool:
+    # pynput.keyboard.Key.ctrl_l and ctrl_r (compared by name, so that
+    # pynput is not needed here).
+    return getattr(key, "name", None) in ("ctrl_l", "ctrl_r")
+
+
+def get_char(key, warn: bool = True) -> str | None:
+
+    try:
+        char = key.char.lower()
+    except AttributeError:
+        if not warn:
+            return None
+        logger.warning(
+            f"Special key '{key}' pressed! If you did not press a special key, something is wrong."
+        )
+        return None  # special key
+
+    if len(char) != 1:
+        return None  # something is wrong. (should not happen?)
+
+    return char
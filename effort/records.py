@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+import json
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+from effort.layout import CompiledLayout
+
+BINARY_MAGIC = b"EFFGRID\x01"
+BINARY_VERSION = 1
+BINARY_COLUMNS = ("trigrams", "timings", "n_repeats")
+_BINARY_ALIGN = 64
+
+
+class TrigramRecords:
+    """Raw trigram timing records parsed into NumPy arrays.
+
+    Attributes
+    ----------
+    trigrams : np.ndarray
+        The recorded trigrams as a unicode array of shape (n_trigrams,).
+    timings : np.ndarray
+        The recorded timings (seconds) as a float array of shape
+        (n_trigrams, n_repeats). Rows with fewer repetitions than the widest
+        row are padded with NaN.
+    n_repeats : np.ndarray
+        Number of recorded repetitions for each trigram.
+    """
+
+    def __init__(
+        self, trigrams: np.ndarray, timings: np.ndarray, n_repeats: np.ndarray
+    ):
+        self.trigrams = trigrams
+        self.timings = timings
+        self.n_repeats = n_repeats
+
+    def __len__(self) -> int:
+        return len(self.trigrams)
+
+    @property
+    def codes(self) -> np.ndarray:
+        """The trigram characters as unicode code points; an array of shape
+        (n_trigrams, trigram_length)."""
+        n = len(self.trigrams)
+        length = self.trigrams.dtype.itemsize // 4
+        return self.trigrams.view(np.uint32).reshape(n, length)
+
+    def char_indices(
+        self, layout: CompiledLayout, hand: str, unique: bool = False
+    ) -> np.ndarray:
+        """Index of each trigram character in the characters of the hand
+        (layout.hand_chars[hand]); an integer array of shape (n_trigrams,
+        trigram_length). The characters are encoded with layout.encode, and
+        characters which are not keys of the hand get -1.
+
+        Parameters
+        ----------
+        unique : bool
+            If True, a character occurring more than once in a trigram gets
+            its index only at its first occurrence (and -1 elsewhere).
+        """
+        codes = self.codes
+        keys = layout.hand_slice(hand)
+        idx = layout.encode(codes).astype(np.intp)
+        idx = np.where((idx >= keys.start) & (idx < keys.stop), idx - keys.start, -1)
+        if unique:
+            for i in range(1, codes.shape[1]):
+                is_repeat = (codes[:, :i] == codes[:, i : i + 1]).any(axis=1)
+                idx[is_repeat, i] = -1
+        return idx
+
+    def best_timings(self, n_best: int) -> np.ndarray:
+        """The n_best smallest timings of each trigram in an array of shape
+        (n_trigrams, n_best), in no particular order. Trigrams with less than
+        n_best repetitions are padded with NaN."""
+        n_best = int(n_best)
+        timings = self.timings
+        if timings.shape[1] < n_best:
+            pad = np.full((len(self), n_best - timings.shape[1]), np.nan)
+            return np.hstack((timings, pad))
+        if n_best == timings.shape[1]:
+            return timings
+        # np.partition places NaN (missing repetitions) last.
+        return np.partition(timings, n_best - 1, axis=1)[:, :n_best]
+
+    def mean_best_timings(self, n_best: int) -> np.ndarray:
+        """Mean of the n_best smallest timings of each trigram (NaN for the
+        trigrams without timings)."""
+        best = self.best_timings(n_best)
+        with np.errstate(invalid="ignore"):
+            return np.nansum(best, axis=1) / self.n_used(n_best)
+
+    def n_used(self, n_best: int) -> np.ndarray:
+        """Number of timings used for each trigram when using n_best timings."""
+        return np.minimum(self.n_repeats, int(n_best))
+
+
+def load_records(file, mmap: bool = False) -> TrigramRecords:
+    """Reads an effort grid record file. Both the text format (each line has a
+    trigram and the recorded timings in seconds, separated by whitespace) and
+    the binary format (see save_binary_records) are supported.
+
+    Parameters
+    ----------
+    mmap : bool
+        If True, binary record files are memory-mapped instead of read into
+        memory. Has no effect on text files.
+    """
+    if is_binary_record_file(file):
+        return load_binary_records(file, mmap=mmap)
+    return parse_records(Path(file).read_bytes())
+
+
+def parse_records(text: str | bytes) -> TrigramRecords:
+    """Parses the text record file format.
+
+    The whole text is parsed with array operations: the tokens (separated by
+    ASCII whitespace) are found from the bytes of the text, the first token
+    of each line is the trigram, and all the timings are converted to floats
+    with a single np.fromstring call.
+    """
+    data = text.encode() if isinstance(text, str) else text
+    buf = np.frombuffer(data, dtype=np.uint8)
+
+    # Token boundaries: every change between whitespace and other bytes. The
+    # bytes of multi-byte UTF-8 characters are all above 127.
+    is_token = buf > 32
+    bounds = np.flatnonzero(is_token[1:] != is_token[:-1]) + 1
+    if len(buf) and is_token[0]:
+        bounds = np.concatenate(([0], bounds))
+    if len(bounds) % 2:
+        bounds = np.append(bounds, len(buf))
+    starts, ends = bounds[::2], bounds[1::2]
+    del is_token, bounds
+
+    line = np.searchsorted(np.flatnonzero(buf == ord("\n")), starts)
+    is_first = np.ones(len(starts), dtype=bool)
+    is_first[1:] = line[1:] != line[:-1]
+    first = np.flatnonzero(is_first)
+    n = len(first)
+    n_repeats = np.diff(np.append(first, len(starts))).astype(np.intp) - 1
+    width = int(n_repeats.max()) if n else 0
+
+    # The trigrams, as a (n, longest) byte matrix padded with zeros.
+    lengths = ends[first] - starts[first]
+    columns = np.arange(lengths.max() if n else 1)
+    in_trigram = columns < lengths[:, None]
+    trigram_bytes = (starts[first, None] + columns)[in_trigram]
+    padded = np.zeros(in_trigram.shape, dtype=np.uint8)
+    padded[in_trigram] = buf[trigram_bytes]
+    names = padded.view(f"S{len(columns)}").ravel().tolist()
+    trigrams = np.array(b"\n".join(names).decode().split("\n") if n else [], dtype=str)
+    if not n:
+        trigrams = trigrams.astype("U3")
+
+    # The timings: everything else but the trigrams.
+    numbers = buf.copy()
+    numbers[trigram_bytes] = ord(" ")
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            values = np.fromstring(numbers.tobytes(), dtype=np.float64, sep=" ")
+    except ValueError:
+        values = None
+    if values is None or len(values) != n_repeats.sum():
+        raise ValueError("The records have timings which are not numbers")
+
+    timings = np.full((n, width), np.nan)
+    timings[np.arange(width) < n_repeats[:, None]] = values
+    return TrigramRecords(trigrams, timings, n_repeats)
+
+
+def concat_records(records: list[TrigramRecords]) -> TrigramRecords:
+    """Concatenates records (for example from several record files)."""
+    width = max((r.timings.shape[1] for r in records), default=0)
+    length = max((_width(r) for r in records), default=3)
+    timings = [
+        np.pad(
+            r.timings, ((0, 0), (0, width - r.timings.shape[1])), constant_values=np.nan
+        )
+        for r in records
+    ]
+    return TrigramRecords(
+        np.concatenate([r.trigrams.astype(f"U{length}") for r in records]),
+        np.concatenate(timings) if timings else np.zeros((0, 0)),
+        np.concatenate([r.n_repeats for r in records]).astype(np.intp),
+    )
+
+
+def format_records(records: TrigramRecords) -> str:
+    """Formats records in the text record file format."""
+    lines = []
+    timings = records.timings.tolist()
+    n_repeats = records.n_repeats.tolist()
+    for trigram, row, n in zip(records.trigrams.tolist(), timings, n_repeats):
+        timingstxt = " ".join(str(t) for t in row[:n])
+        lines.append(f"{trigram} {timingstxt}\n")
+    return "".join(lines)
+
+
+def save_text_records(records: TrigramRecords, file):
+    Path(file).write_text(format_records(records))
+
+
+def is_binary_record_file(file) -> bool:
+    with open(file, "rb") as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def save_binary_records(
+    records: TrigramRecords,
+    file,
+    extra_columns: dict[str, np.ndarray] | None = None,
+    metadata: dict | None = None,
+):
+    """Saves records in the binary (columnar) record file format.
+
+    The file starts with BINARY_MAGIC, followed by the length of a JSON header
+    as a little-endian uint32 and the JSON header itself. The header lists the
+    dtype, shape and byte offset of each column, relative to the start of the
+    data section. The data section starts at the first 64 byte boundary after
+    the header. The columns are raw C-ordered arrays, each aligned to 64
+    bytes, so that they can be read with np.memmap.
+
+    Parameters
+    ----------
+    extra_columns : dict[str, np.ndarray] | None
+        Additional columns with a value for each trigram (like the source of
+        each trigram, see effort.plan.merge_shards). They are ignored by
+        load_records; read them with load_binary_columns.
+    metadata : dict | None
+        Saved as "metadata" in the header (must be JSON serializable).
+    """
+    columns = {
+        "trigrams": np.ascontiguousarray(
+            records.trigrams, dtype=f"<U{_width(records)}"
+        ),
+        "timings": np.ascontiguousarray(records.timings, dtype="<f8"),
+        "n_repeats": np.ascontiguousarray(records.n_repeats, dtype="<i8"),
+    }
+    for name, arr in (extra_columns or {}).items():
+        if name in columns:
+            raise ValueError(f"Column {name} is already a record column")
+        if len(arr) != len(records):
+            raise ValueError(f"Column {name} must have a value for each trigram")
+        columns[name] = np.ascontiguousarray(
+            arr, dtype=np.asarray(arr).dtype.newbyteorder("<")
+        )
+
+    header = {"version": BINARY_VERSION, "columns": {}}
+    if metadata is not None:
+        header["metadata"] = metadata
+    offset = 0
+    for name, arr in columns.items():
+        header["columns"][name] = {
+            "dtype": arr.dtype.str,
+            "shape": list(arr.shape),
+            "offset": offset,
+        }
+        offset = _align(offset + arr.nbytes)
+    headertxt = json.dumps(header).encode()
+    data_start = _align(len(BINARY_MAGIC) + 4 + len(headertxt))
+
+    with open(file, "wb") as f:
+        f.write(BINARY_MAGIC)
+        f.write(len(headertxt).to_bytes(4, "little"))
+        f.write(headertxt)
+        for name, arr in columns.items():
+            f.seek(data_start + header["columns"][name]["offset"])
+            f.write(arr.tobytes())
+
+
+def load_binary_records(file, mmap: bool = True) -> TrigramRecords:
+    return TrigramRecords(**load_binary_columns(file, BINARY_COLUMNS, mmap=mmap))
+
+
+def load_binary_columns(file, names=None, mmap: bool = True) -> dict[str, np.ndarray]:
+    """Reads columns of a binary record file by name (all of them by
+    default), including the extra columns (see save_binary_records)."""
+    header = read_binary_header(file)
+    if names is None:
+        names = list(header["columns"])
+    columns = {}
+    for name in names:
+        if name not in header["columns"]:
+            raise ValueError(f"File {file} has no column {name}")
+        spec = header["columns"][name]
+        offset = header["data_start"] + spec["offset"]
+        dtype = np.dtype(spec["dtype"])
+        shape = tuple(spec["shape"])
+        if mmap and np.prod(shape) > 0:
+            arr = np.memmap(file, dtype=dtype, mode="r", offset=offset, shape=shape)
+        else:
+            with open(file, "rb") as f:
+                f.seek(offset)
+                arr = np.fromfile(f, dtype=dtype, count=int(np.prod(shape)))
+            arr = arr.reshape(shape)
+        columns[name] = arr
+    return columns
+
+
+def read_binary_header(file) -> dict:
+    with open(file, "rb") as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"File {file} is not a binary effort grid record file")
+        header_length = int.from_bytes(f.read(4), "little")
+        header = json.loads(f.read(header_length))
+    header["data_start"] = _align(len(BINARY_MAGIC) + 4 + header_length)
+    if header["version"] > BINARY_VERSION:
+        raise ValueError(
+            f"Unsupported binary record file version {header['version']} in {file}"
+        )
+    return header
+
+
+def convert_record_file(source, target, to_binary: bool | None = None):
+    """Converts a record file between the text and the binary format. By
+    default, the target format is the opposite of the source format."""
+    source_is_binary = is_binary_record_file(source)
+    if to_binary is None:
+        to_binary = not source_is_binary
+    records = load_records(source)
+    if to_binary:
+        save_binary_records(records, target)
+    else:
+        save_text_records(records, target)
+
+
+def _width(records: TrigramRecords) -> int:
+    return max(records.trigrams.dtype.itemsize // 4, 1)
+
+
+def _align(offset: int) -> int:
+    return -(-offset // _BINARY_ALIGN) * _BINARY_ALIGN
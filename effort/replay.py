@@ -0,0 +1,212 @@
+"""Replaying key events into the trigram timing recorder.
+
+The recorder state machine (effort.recorder.TrigramTimingRecorder) is fed
+with key events that have virtual timestamps, without pynput or the wall
+clock. The events can be synthetic (generate_trial_events), or recorded
+with effort_grid_record --event-log (replay_event_log).
+
+An event is a tuple (kind, key, t_ns), like the events of a live keyboard
+session: kind is PRESS or RELEASE, key a ReplayKey and t_ns the timestamp
+in nanoseconds.
+"""
+
+from __future__ import annotations
+
+import io
+from typing import TYPE_CHECKING, Iterable
+
+import numpy as np
+
+from effort.eventlog import PRESS_CODE, STATE_CODES, get_trial_timings
+from effort.layout import HANDS, compile_layout
+from effort.recorder import PRESS, RELEASE, TrigramTimingRecorder, process_events
+
+if TYPE_CHECKING:
+    from effort.eventlog import EventLogWriter
+
+Event = tuple[str, "ReplayKey", int]
+
+
+class ReplayKey:
+    """A key like the ones given by pynput: a character key has char, and a
+    special key (like ctrl_l) has name."""
+
+    __slots__ = ("char", "name")
+
+    def __init__(self, char: str | None = None, name: str | None = None):
+        self.char = char
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"ReplayKey({self.char or self.name!r})"
+
+
+class ReplayError(RuntimeError):
+    """The events ran out before the recorder finished the trial."""
+
+
+class EventSource:
+    """Gives the events of an iterable like a queue (see process_events)."""
+
+    def __init__(self, events: Iterable[Event]):
+        self._events = iter(events)
+
+    def get(self) -> Event:
+        try:
+            return next(self._events)
+        except StopIteration:
+            raise ReplayError("The events ended before the trial was completed")
+
+
+def replay_trial(
+    events: Iterable[Event],
+    trigram: str,
+    wait_sequence: str,
+    recorder: TrigramTimingRecorder | None = None,
+    out=None,
+    event_log: EventLogWriter | None = None,
+) -> float:
+    """Feeds the events of one trial to the recorder, and returns the timing
+    (seconds) it recorded.
+
+    Parameters
+    ----------
+    recorder : TrigramTimingRecorder | None
+        The recorder to reset and use, to not create a new one for each
+        trial.
+    out : TextIO | None
+        Where the recorder prints. By default the output is discarded.
+    event_log : EventLogWriter | None
+        If given, the events are written to it as a new trial, like when
+        recording.
+    """
+    if out is None:
+        out = io.StringIO()
+    if recorder is None:
+        recorder = TrigramTimingRecorder(trigram, wait_sequence, out=out)
+    else:
+        recorder.out = out
+        recorder.reset(trigram, wait_sequence)
+    trial = event_log.new_trial() if event_log is not None else 0
+    process_events(EventSource(events), recorder, event_log=event_log, trial=trial)
+    if recorder.asked_quit:
+        raise ReplayError("Quitting (Ctrl-C) was asked during the trial")
+    return recorder.delta_time
+
+
+def type_keys(
+    keys: str, t_ns: int, rng: np.random.Generator, interval_ns: int, hold_ns: int
+) -> tuple[list[Event], int, int]:
+    """Events of typing the keys one at a time: each key is pressed
+    (randomly) about interval_ns after the release of the previous one, and
+    held for about hold_ns.
+
+    Returns
+    -------
+    events, last_release_ns, t_ns
+        The events, the time of the last release and the time after it.
+    """
+    events = []
+    for char in keys:
+        t_ns += int(rng.integers(interval_ns // 2, interval_ns * 3 // 2 + 1))
+        key = ReplayKey(char)
+        events.append((PRESS, key, t_ns))
+        t_ns += int(rng.integers(hold_ns // 2, hold_ns * 3 // 2 + 1))
+        events.append((RELEASE, key, t_ns))
+    return events, t_ns, t_ns
+
+
+def generate_trial_events(
+    trigram: str,
+    wait_sequence: str,
+    rng: np.random.Generator,
+    start_ns: int = 0,
+    interval_ns: int = 80_000_000,
+    hold_ns: int = 60_000_000,
+    error_rate: float = 0.0,
+    wrong_key: str = "\x7f",
+) -> tuple[list[Event], int]:
+    """Synthetic key events of one trial: the starting sequence, the
+    trigram and the final sequence. With probability error_rate, a wrong key
+    is typed in the middle of the trigram; the trial then starts again from
+    the starting sequence, like when recording. The wrong key must not be a
+    key of the layout.
+
+    Returns
+    -------
+    events, expected_ns
+        The events, and the timing (ns) the recorder should give: from the
+        release completing the starting sequence to the release completing
+        the final sequence.
+    """
+    events: list[Event] = []
+    t_ns = start_ns
+    while True:
+        typed, start, t_ns = type_keys(wait_sequence, t_ns, rng, interval_ns, hold_ns)
+        events += typed
+        if rng.random() < error_rate:
+            cut = int(rng.integers(0, len(trigram)))
+            keys = trigram[:cut] + wrong_key
+            typed, _, t_ns = type_keys(keys, t_ns, rng, interval_ns, hold_ns)
+            events += typed
+            continue
+        typed, _, t_ns = type_keys(
+            trigram + wait_sequence, t_ns, rng, interval_ns, hold_ns
+        )
+        events += typed
+        return events, t_ns - start
+
+
+def replay_event_log(
+    events: np.ndarray, config: dict
+) -> list[tuple[int, str, float, float]]:
+    """Replays the events of an event log (see effort.eventlog).
+
+    The wait sequence of a trial is the home key sequence of the hand of the
+    middle character of its trigram (or the trigram itself, if it is a home
+    key sequence, like in estimate_bias). Special keys are logged without
+    their name, so they are replayed as unknown special keys.
+
+    Returns
+    -------
+    list[tuple]
+        For each completed trial: the trial number, the trigram, the timing
+        given by the replayed recorder and the timing calculated from the
+        logged timestamps (effort.eventlog.get_trial_timings); the timings
+        should be the same.
+    """
+    layout = compile_layout(config)
+    sequences = [config[f"home_key_sequence_{hand}"] for hand in HANDS]
+    logged = dict(zip(*get_trial_timings(events)))
+    final_state = STATE_CODES["RECORDING_FINAL_SEQUENCE"]
+
+    results = []
+    recorder = None
+    boundaries = np.flatnonzero(np.diff(events["trial"])) + 1
+    for trial_events in np.split(events, boundaries):
+        if not len(trial_events) or trial_events["state"][-1] != final_state:
+            continue
+        trial = int(trial_events["trial"][0])
+        trigram = str(trial_events["trigram"][0])
+        if trigram in sequences:
+            sequence = trigram
+        else:
+            key_index = layout.encode(np.array([ord(trigram[1])]))[0]
+            sequence = sequences[layout.key_hand[key_index]]
+        replayed = [
+            (
+                PRESS if kind == PRESS_CODE else RELEASE,
+                ReplayKey(chr(key)) if key else ReplayKey(name="unknown"),
+                int(t_ns),
+            )
+            for kind, key, t_ns in zip(
+                trial_events["kind"].tolist(),
+                trial_events["key"].tolist(),
+                trial_events["t_ns"].tolist(),
+            )
+        ]
+        if recorder is None:
+            recorder = TrigramTimingRecorder(trigram, sequence, out=io.StringIO())
+        timing = replay_trial(replayed, trigram, sequence, recorder=recorder)
+        results.append((trial, trigram, timing, float(logged.get(trial, np.nan))))
+    return results
@@ -0,0 +1,143 @@
+"""Combined report of several calculation types (effort_grid_show --type all).
+
+The record file is parsed once, and the efforts of all the calculation types
+are calculated from the same records (the character statistics are shared
+between "average" and "average-center").
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import math
+
+from effort import metrics
+from effort.calculate import (
+    get_average_grid,
+    get_char_timing_stats,
+    get_model_grid,
+)
+from effort.grid import HANDS, EffortGrid
+from effort.layout import compile_layout
+from effort.records import TrigramRecords, load_records
+
+CALCULATION_TYPES = ("model", "average", "average-center")
+FORMATS = ("text", "json", "csv")
+
+
+def get_effort_grids(
+    records: TrigramRecords, config: dict, calctypes=CALCULATION_TYPES
+) -> dict[str, EffortGrid]:
+    """The effort grid of each of the calculation types."""
+    grids = {}
+    stats = None
+    for calctype in calctypes:
+        if calctype == "model":
+            grids[calctype] = get_model_grid(records, config)
+        elif calctype in ("average", "average-center"):
+            if stats is None:
+                with metrics.stage("show.averages"):
+                    stats = {
+                        hand: get_char_timing_stats(
+                            records,
+                            compile_layout(config),
+                            hand,
+                            config["trigram_use_n_best"],
+                        )
+                        for hand in HANDS
+                    }
+            grids[calctype] = get_average_grid(
+                records, config, center=calctype == "average-center", stats=stats
+            )
+        else:
+            raise ValueError(f"Unknown calculation type: {calctype}")
+    return grids
+
+
+def get_table_rows(grids: dict[str, EffortGrid]) -> tuple[list[str], list[list]]:
+    """One row per character: the hand, the character, and the normalized
+    effort and the sample size (number of trigrams) of each calculation
+    type."""
+    header = ["hand", "char"]
+    for calctype in grids:
+        header += [calctype, f"{calctype}_count"]
+    normalized = {calctype: grid.as_dict() for calctype, grid in grids.items()}
+
+    first = next(iter(grids.values()))
+    rows = []
+    for hand, (chars, _) in first.efforts.items():
+        for char in chars:
+            row = [hand, char]
+            for calctype, grid in grids.items():
+                row += [normalized[calctype][char], (grid.sample_sizes or {})[char]]
+            rows.append(row)
+    return header, rows
+
+
+def format_table(grids: dict[str, EffortGrid], fmt: str = "text") -> str:
+    header, rows = get_table_rows(grids)
+    if fmt == "json":
+        scales = {calctype: grid.scale for calctype, grid in grids.items()}
+        return (
+            json.dumps(
+                {
+                    "scale": scales,
+                    "rows": [dict(zip(header, map(_json_value, row))) for row in rows],
+                },
+                ensure_ascii=False,
+                indent=2,
+            )
+            + "\n"
+        )
+    if fmt == "csv":
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(header)
+        writer.writerows(rows)
+        return out.getvalue()
+    if fmt == "text":
+        cells = [header] + [
+            [
+                f"{value:.2f}" if isinstance(value, float) else str(value)
+                for value in row
+            ]
+            for row in rows
+        ]
+        widths = [max(len(row[i]) for row in cells) for i in range(len(header))]
+        lines = ["  ".join(c.rjust(w) for c, w in zip(row, widths)) for row in cells]
+        scales = "  ".join(
+            f"{calctype}: {grid.scale}" for calctype, grid in grids.items()
+        )
+        return f"Effort scale: {scales}\n\n" + "\n".join(lines) + "\n"
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+def _json_value(value):
+    # NaN (a character without data) is not valid JSON.
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def show_report(
+    file,
+    config: dict,
+    calctypes=CALCULATION_TYPES,
+    fmt: str = "text",
+    output_file=None,
+    mmap: bool = True,
+) -> dict[str, EffortGrid]:
+    """Calculates the efforts of all calctypes from one parse of the record
+    file, and prints (or writes into output_file) the combined table."""
+    with metrics.stage("show.parse"):
+        records = load_records(file, mmap=mmap)
+    grids = get_effort_grids(records, config, calctypes)
+    with metrics.stage("show.report"):
+        table = format_table(grids, fmt)
+    if output_file is None:
+        print(table, end="")
+    else:
+        with open(output_file, "w") as f:
+            f.write(table)
+    return grids
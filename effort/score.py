@@ -0,0 +1,247 @@
+"""Scoring text corpora with an effort grid.
+
+The characters of the corpus are mapped to the keys (characters) of the
+config with a lookup table indexed by the Unicode code point, and the counts
+of the characters and the bigrams are calculated with np.bincount in large
+chunks. The files are split (at newlines) into parts which are counted in
+worker processes.
+"""
+
+from __future__ import annotations
+
+import codecs
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from effort.config import FINGERS
+from effort.grid import EffortGrid
+from effort.layout import HANDS, compile_layout, get_char_lut, lookup
+
+# Bytes decoded and counted at once.
+CHUNK_SIZE = 2**24
+
+# Files are split into parts of at least this many bytes for the workers.
+MIN_PART_SIZE = 2**24
+
+
+class CorpusCounts:
+    """Character and bigram counts of a corpus, for the keys of a config.
+
+    Attributes
+    ----------
+    chars : str
+        The key characters (in key index order, see effort.layout).
+    char_counts : np.ndarray
+        The count of each key character.
+    bigram_counts : np.ndarray
+        Array of shape (n_chars, n_chars), where [i, j] is the count of the
+        bigram chars[i] + chars[j]. Bigrams with other characters (like
+        space) are not counted.
+    n_total : int
+        The number of all characters in the corpus.
+    """
+
+    def __init__(
+        self,
+        chars: str,
+        char_counts: np.ndarray,
+        bigram_counts: np.ndarray,
+        n_total: int,
+    ):
+        self.chars = chars
+        self.char_counts = char_counts
+        self.bigram_counts = bigram_counts
+        self.n_total = n_total
+
+    def __add__(self, other: CorpusCounts) -> CorpusCounts:
+        return CorpusCounts(
+            self.chars,
+            self.char_counts + other.char_counts,
+            self.bigram_counts + other.bigram_counts,
+            self.n_total + other.n_total,
+        )
+
+
+def get_layout_chars(config: dict) -> str:
+    return compile_layout(config).chars
+
+
+def count_codes(
+    codes: np.ndarray, lut: np.ndarray, previous: int = -1
+) -> tuple[np.ndarray, np.ndarray, int]:
+    """Counts the characters and bigrams of an array of code points.
+
+    Parameters
+    ----------
+    previous : int
+        The key index of the character before the codes (-1 for none), so
+        that bigrams spanning two chunks are counted.
+
+    Returns
+    -------
+    char_counts, bigram_counts : np.ndarray
+        See CorpusCounts. The bigram counts are flattened.
+    last : int
+        The key index of the last code.
+    """
+    n = int(lut.max()) + 1
+    idx = lookup(lut, codes)
+    char_counts = np.bincount(idx[idx >= 0], minlength=n)
+    pairs = np.concatenate(([previous], idx))
+    first, second = pairs[:-1], pairs[1:]
+    is_bigram = (first >= 0) & (second >= 0)
+    bigram_counts = np.bincount(
+        first[is_bigram].astype(np.intp) * n + second[is_bigram], minlength=n * n
+    )
+    last = int(idx[-1]) if len(idx) else previous
+    return char_counts, bigram_counts, last
+
+
+def count_file_part(file, start: int, end: int, chars: str) -> CorpusCounts:
+    """Counts the characters of the bytes start..end of a UTF-8 text file."""
+    # The upper case characters are counted on the same keys as the lower
+    # case ones, as the shift key is not recorded.
+    lut = get_char_lut(chars, fold_case=True)
+    n = len(chars)
+    char_counts = np.zeros(n, dtype=np.int64)
+    bigram_counts = np.zeros(n * n, dtype=np.int64)
+    n_total = 0
+    previous = -1
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with open(file, "rb") as f:
+        if end > start:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for pos in range(start, end, CHUNK_SIZE):
+                    chunk = data[pos : min(pos + CHUNK_SIZE, end)]
+                    text = decoder.decode(chunk, final=pos + CHUNK_SIZE >= end)
+                    codes = np.frombuffer(text.encode("utf-32-le"), dtype="<u4")
+                    chunk_chars, chunk_bigrams, previous = count_codes(
+                        codes, lut, previous
+                    )
+                    char_counts += chunk_chars
+                    bigram_counts += chunk_bigrams
+                    n_total += len(codes)
+    return CorpusCounts(chars, char_counts, bigram_counts.reshape(n, n), n_total)
+
+
+def split_file(file, part_size: int) -> list[tuple[int, int]]:
+    """Splits a file into (start, end) byte ranges of about part_size bytes,
+    ending at newlines (so that no character or bigram is split)."""
+    size = os.path.getsize(file)
+    parts = []
+    start = 0
+    with open(file, "rb") as f:
+        while start < size:
+            end = min(start + part_size, size)
+            if end < size:
+                f.seek(end)
+                rest = f.readline()
+                end += len(rest)
+            parts.append((start, end))
+            start = end
+    return parts
+
+
+def count_corpus(files, chars: str, n_jobs: int | None = None) -> CorpusCounts:
+    """Counts the characters and bigrams of the text files in n_jobs worker
+    processes."""
+    n_jobs = n_jobs or os.cpu_count() or 1
+    total_size = sum(os.path.getsize(file) for file in files)
+    part_size = max(MIN_PART_SIZE, -(-total_size // n_jobs))
+    tasks = [
+        (str(file), start, end, chars)
+        for file in files
+        for start, end in split_file(file, part_size)
+    ]
+    n = len(chars)
+    counts = CorpusCounts(
+        chars, np.zeros(n, dtype=np.int64), np.zeros((n, n), dtype=np.int64), 0
+    )
+    if n_jobs == 1 or len(tasks) <= 1:
+        results = [count_file_part(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks))) as executor:
+            results = list(executor.map(count_file_part, *zip(*tasks)))
+    for result in results:
+        counts = counts + result
+    return counts
+
+
+def get_finger_ids(config: dict) -> tuple[list[str], np.ndarray]:
+    """The fingers ("<hand> <finger>") and the finger index of each character
+    of get_layout_chars."""
+    fingers = [f"{hand} {finger}" for hand in HANDS for finger in FINGERS]
+    return fingers, compile_layout(config).finger_ids
+
+
+def show_score(counts: CorpusCounts, grid: EffortGrid, config: dict):
+    """Prints the effort of the corpus per character, finger and hand, and
+    the same finger bigram (SFB) counts."""
+    chars = counts.chars
+    efforts = grid.as_dict()
+    effort = np.array([efforts.get(char, np.nan) for char in chars])
+    missing = [char for char, e in zip(chars, effort) if np.isnan(e)]
+    if missing:
+        print(f"WARNING: No effort for characters: {''.join(missing)}")
+    char_effort = counts.char_counts * np.nan_to_num(effort)
+
+    fingers, finger_ids = get_finger_ids(config)
+    n_fingers = len(fingers)
+    finger_counts = np.bincount(finger_ids, counts.char_counts, minlength=n_fingers)
+    finger_effort = np.bincount(finger_ids, char_effort, minlength=n_fingers)
+    same_finger = finger_ids[:, None] == finger_ids[None, :]
+    np.fill_diagonal(same_finger, False)  # repeating a key is not an SFB
+    sfb = np.bincount(
+        np.broadcast_to(finger_ids[:, None], same_finger.shape)[same_finger],
+        counts.bigram_counts[same_finger],
+        minlength=n_fingers,
+    )
+
+    n_keys = int(counts.char_counts.sum())
+    n_bigrams = int(counts.bigram_counts.sum())
+    total_effort = float(char_effort.sum())
+    print(f"Characters: {counts.n_total} (on the keys: {n_keys})")
+    print(f"Total effort: {total_effort:.1f}")
+    if n_keys:
+        print(f"Effort per character: {total_effort / n_keys:.3f}")
+    print(
+        f"Same finger bigrams: {int(sfb.sum())} ({100 * sfb.sum() / max(n_bigrams, 1):.2f}% of {n_bigrams} bigrams)"
+    )
+
+    print("\nHand:")
+    for i, hand in enumerate(HANDS):
+        hand_fingers = slice(i * len(FINGERS), (i + 1) * len(FINGERS))
+        hand_effort = finger_effort[hand_fingers].sum()
+        print(
+            f"{hand}: count {int(finger_counts[hand_fingers].sum())}  effort {hand_effort:.1f} ({_percent(hand_effort, total_effort)})"
+        )
+
+    print("\nFinger:")
+    for finger, count, finger_total, finger_sfb in zip(
+        fingers, finger_counts, finger_effort, sfb
+    ):
+        print(
+            f"{finger}: count {int(count)}  effort {finger_total:.1f} ({_percent(finger_total, total_effort)})  SFB {int(finger_sfb)}"
+        )
+
+    print("\nChar:")
+    for i in np.argsort(-char_effort, kind="stable"):
+        print(
+            f"Char {chars[i]}: count {int(counts.char_counts[i])}  effort {char_effort[i]:.1f} ({_percent(char_effort[i], total_effort)})"
+        )
+
+
+def _percent(value: float, total: float) -> str:
+    return f"{100 * value / total:.1f}%" if total else "-"
+
+
+def score_files(files, grid: EffortGrid, config: dict, n_jobs: int | None = None):
+    counts = count_corpus(
+        [Path(file) for file in files], get_layout_chars(config), n_jobs
+    )
+    show_score(counts, grid, config)
+    return counts
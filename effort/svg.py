@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from effort.colors import DEFAULT_MAX_COLOR, DEFAULT_MIN_COLOR, values_to_hex
+from effort.grid import EffortGrid
+
+# The 42 key Glove80 setup used in this repo (see effortconfig.yaml). Each
+# row is a tuple of the left hand and right hand keys (from left to right).
+# The last row has the thumb keys.
+GLOVE80_42_KEYS = (
+    ("1qwert", "uyiop4"),
+    ("2asdfg", "hjklö5"),
+    ("3zxcvb", "nm,.-6"),
+    ("789", "=+§"),
+)
+
+KEY_SIZE = 40
+KEY_PITCH = 46
+# Vertical offset of each column of the left hand (from the outer column to
+# the inner column), following the column stagger of the Glove80.
+COLUMN_STAGGER = (12, 12, 6, 0, 6, 10)
+HALF_GAP = 90
+MARGIN = 20
+THUMB_ROW_GAP = 24
+
+
+def get_layout(config: dict | None = None) -> tuple[tuple[str, str], ...]:
+    """Gets the key layout for the heatmaps. The layout may be given in the
+    config as "keyboard_layout": a list of rows, where each row has the left
+    and right hand keys separated by a space, for example "1qwert uyiop4".
+    The last row has the thumb keys."""
+    if config is None or "keyboard_layout" not in config:
+        return GLOVE80_42_KEYS
+    return tuple(tuple(row.split(" ", 1)) for row in config["keyboard_layout"])
+
+
+def get_key_positions(layout=GLOVE80_42_KEYS) -> dict[str, tuple[float, float]]:
+    """Maps each key (character) to the (x, y) position of its upper left
+    corner in the heatmap."""
+    positions = {}
+    *rows, thumbs = layout
+    n_cols = max(max(len(left), len(right)) for left, right in rows)
+    stagger = np.resize(COLUMN_STAGGER, n_cols).tolist()
+    right_x0 = MARGIN + n_cols * KEY_PITCH + HALF_GAP
+
+    for i, (left, right) in enumerate(rows):
+        y = MARGIN + i * KEY_PITCH
+        for j, char in enumerate(left.rjust(n_cols)):
+            if char != " ":
+                positions[char] = (MARGIN + j * KEY_PITCH, y + stagger[j])
+        for j, char in enumerate(right.ljust(n_cols)):
+            if char != " ":
+                positions[char] = (right_x0 + j * KEY_PITCH, y + stagger[-1 - j])
+
+    # The thumb keys are below the inner columns, curving towards the center.
+    thumb_y = MARGIN + len(rows) * KEY_PITCH + THUMB_ROW_GAP
+    left_thumbs, right_thumbs = thumbs
+    for j, char in enumerate(left_thumbs):
+        x = MARGIN + (n_cols - len(left_thumbs) + j) * KEY_PITCH + KEY_PITCH // 2
+        positions[char] = (x, thumb_y + 6 * j)
+    for j, char in enumerate(right_thumbs):
+        x = right_x0 + j * KEY_PITCH - KEY_PITCH // 2
+        positions[char] = (x, thumb_y + 6 * (len(right_thumbs) - 1 - j))
+    return positions
+
+
+def render_svg(
+    grid: EffortGrid,
+    layout=GLOVE80_42_KEYS,
+    title: str | None = None,
+    value_range: tuple[float, float] | None = None,
+    min_color=DEFAULT_MIN_COLOR,
+    max_color=DEFAULT_MAX_COLOR,
+    n_bins=100,
+) -> str:
+    """Renders the normalized efforts of the grid as an SVG keyboard heatmap.
+
+    Parameters
+    ----------
+    value_range : tuple[float, float] | None
+        The normalized efforts mapped to min_color and max_color. Defaults to
+        the range of the efforts in the grid.
+    """
+    return render_svgs(
+        {title or "": grid},
+        layout=layout,
+        value_range=value_range,
+        min_color=min_color,
+        max_color=max_color,
+        n_bins=n_bins,
+        titles=title is not None,
+    )[title or ""]
+
+
+def render_svgs(
+    grids: dict[str, EffortGrid],
+    layout=GLOVE80_42_KEYS,
+    common_scale: bool = False,
+    value_range: tuple[float, float] | None = None,
+    min_color=DEFAULT_MIN_COLOR,
+    max_color=DEFAULT_MAX_COLOR,
+    n_bins=100,
+    titles: bool = True,
+) -> dict[str, str]:
+    """Renders many effort grids as SVG heatmaps. The colors of all the grids
+    are mapped in a single vectorized lookup.
+
+    Parameters
+    ----------
+    grids : dict
+        Maps a name (used as the title) to an effort grid.
+    common_scale : bool
+        If True, all the heatmaps use the same color scale (from 1.0 to the
+        largest normalized effort of all the grids), so that they can be
+        compared. Otherwise each heatmap uses the range of its own efforts.
+    """
+    positions = get_key_positions(layout)
+    chars = list(positions)
+    efforts = np.full((len(grids), len(chars)), np.nan)
+    for i, grid in enumerate(grids.values()):
+        grid_efforts = grid.as_dict()
+        efforts[i] = [grid_efforts.get(char, np.nan) for char in chars]
+
+    if value_range is not None:
+        ranges = np.tile(value_range, (len(grids), 1))
+    elif common_scale:
+        ranges = np.tile((np.nanmin(efforts), np.nanmax(efforts)), (len(grids), 1))
+    else:
+        ranges = np.column_stack(
+            (np.nanmin(efforts, axis=1), np.nanmax(efforts, axis=1))
+        )
+    # Map every grid to 0..1 with its own range, then color all at once.
+    with np.errstate(invalid="ignore", divide="ignore"):
+        span = ranges[:, 1:] - ranges[:, :1]
+        scaled = np.where(span > 0, (efforts - ranges[:, :1]) / span, 0.0)
+    colors = values_to_hex(scaled, 0.0, 1.0, min_color, max_color, n_bins)
+
+    width = max(x for x, _ in positions.values()) + KEY_SIZE + MARGIN
+    height = max(y for _, y in positions.values()) + KEY_SIZE + MARGIN
+    svgs = {}
+    for i, name in enumerate(grids):
+        top = MARGIN if titles and name else 0
+        parts = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height + top}" viewBox="0 0 {width} {height + top}">',
+            f'<rect width="{width}" height="{height + top}" fill="#000000"/>',
+        ]
+        if top:
+            parts.append(
+                f'<text x="{MARGIN}" y="{MARGIN + 4}" font-family="sans-serif" font-size="14" fill="#ffffff">{escape(str(name))}</text>'
+            )
+        for j, char in enumerate(chars):
+            x, y = positions[char]
+            y += top
+            effort = efforts[i, j]
+            label = "" if np.isnan(effort) else f"{effort:.2f}"
+            cx = x + KEY_SIZE / 2
+            parts.append(
+                f'<rect x="{x}" y="{y}" width="{KEY_SIZE}" height="{KEY_SIZE}" rx="4" fill="{colors[i, j]}" stroke="#444444"/>'
+                f'<text x="{cx}" y="{y + 17}" font-family="sans-serif" font-size="14" text-anchor="middle">{escape(char)}</text>'
+                f'<text x="{cx}" y="{y + 33}" font-family="sans-serif" font-size="10" text-anchor="middle">{label}</text>'
+            )
+        parts.append("</svg>\n")
+        svgs[name] = "\n".join(parts)
+    return svgs
+
+
+def write_svgs(svgs: dict[str, str], directory) -> list[Path]:
+    """Writes the heatmaps from render_svgs into directory as <name>.svg,
+    where name is the file name of the grid without the suffix. Raises
+    ValueError (before writing anything) if two grids would be written into
+    the same file, like dir1/grid.txt and dir2/grid.txt."""
+    directory = Path(directory)
+    files: dict[Path, str] = {}
+    for name in svgs:
+        file = directory / f"{Path(name).stem}.svg"
+        if file in files:
+            raise ValueError(f"{files[file]} and {name} would both be saved as {file}")
+        files[file] = name
+    directory.mkdir(parents=True, exist_ok=True)
+    for file, name in files.items():
+        file.write_text(svgs[name])
+    return list(files)
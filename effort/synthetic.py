@@ -0,0 +1,124 @@
+"""Synthetic effort grid records with known efforts.
+
+The trigrams are generated like in effort_record (see
+effort.effort.get_trigrams): the middle character is any character of the
+layout, and the first and the last characters are on two other fingers of
+the same hand. Each timing is
+
+    bias + effort[c1] + effort[c2] + effort[c3] + noise
+
+where bias is the home key sequence timing of the hand in the config and
+the noise is normally distributed. This is the effort model of
+effort.calculate, so fitting the model should recover the efforts (see
+get_expected_coefficients).
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from effort.config import FINGERS
+from effort.grid import EffortGrid
+from effort.layout import HANDS, compile_layout
+from effort.records import TrigramRecords
+
+DEFAULT_NOISE = 0.03
+
+
+def get_ground_truth(config: dict, seed=None, low=0.05, high=0.2) -> EffortGrid:
+    """Random efforts (seconds) between low and high for the characters of
+    the config."""
+    rng = np.random.default_rng(seed)
+    efforts = {}
+    for hand, chars in compile_layout(config).hand_chars.items():
+        efforts[hand] = (chars, rng.uniform(low, high, len(chars)))
+    return EffortGrid(efforts)
+
+
+def generate_records(
+    config: dict,
+    n_trigrams: int,
+    efforts: EffortGrid,
+    n_repeats: int | None = None,
+    noise: float = DEFAULT_NOISE,
+    seed=None,
+) -> TrigramRecords:
+    """Generates n_trigrams trigrams (not necessarily unique), each with
+    n_repeats timings (trigram_repeat_times of the config by default).
+
+    Parameters
+    ----------
+    efforts : EffortGrid
+        The efforts (seconds) of the characters, like from get_ground_truth.
+    noise : float
+        Standard deviation of the noise of each timing (seconds).
+    """
+    rng = np.random.default_rng(seed)
+    layout = compile_layout(config)
+    if n_repeats is None:
+        n_repeats = config["trigram_repeat_times"]
+    hand_of = rng.integers(0, len(HANDS), n_trigrams)
+    codes = np.zeros((n_trigrams, 3), dtype=np.uint32)
+    total_effort = np.zeros(n_trigrams)
+    for h, hand in enumerate(HANDS):
+        rows = np.flatnonzero(hand_of == h)
+        chars, char_efforts = efforts.efforts[hand]
+        char_efforts = np.asarray(char_efforts, dtype=float)
+        finger_of = layout.key_finger[layout.hand_slice(hand)]
+        finger_lengths = np.bincount(finger_of, minlength=len(FINGERS))
+        finger_starts = np.concatenate(([0], np.cumsum(finger_lengths)[:-1]))
+
+        middle = rng.integers(0, len(chars), len(rows))
+        # Two different fingers out of the other four: pick the first out of
+        # four and the second out of the remaining three, skipping over the
+        # finger of the middle character (and the first finger).
+        first = rng.integers(0, len(FINGERS) - 1, len(rows))
+        second = rng.integers(0, len(FINGERS) - 2, len(rows))
+        second += second >= first
+        middle_finger = finger_of[middle]
+        first += first >= middle_finger
+        second += second >= middle_finger
+
+        def random_char_on(finger: np.ndarray) -> np.ndarray:
+            u = rng.random(len(finger))
+            return finger_starts[finger] + (u * finger_lengths[finger]).astype(int)
+
+        indices = np.stack((random_char_on(first), middle, random_char_on(second)), 1)
+        char_codes = np.array([ord(c) for c in chars], dtype=np.uint32)
+        codes[rows] = char_codes[indices]
+        total_effort[rows] = char_efforts[indices].sum(axis=1) + get_bias(config, hand)
+
+    timings = total_effort[:, None] + rng.normal(0, noise, (n_trigrams, n_repeats))
+    trigrams = codes.view("U3").ravel()
+    return TrigramRecords(trigrams, timings, np.full(n_trigrams, n_repeats))
+
+
+def get_bias(config: dict, hand: str) -> float:
+    return config[f"home_key_sequence_timing_{hand}"]
+
+
+def get_expected_coefficients(
+    efforts: EffortGrid,
+    n_repeats: int,
+    n_best: int,
+    noise: float = DEFAULT_NOISE,
+    n_samples: int = 100_000,
+    seed: int = 0,
+) -> EffortGrid:
+    """The effort model coefficients expected when fitting records from
+    generate_records.
+
+    The model uses the mean of the n_best smallest of the n_repeats timings,
+    which is smaller than the mean timing by a constant (estimated here by
+    simulation). Every trigram has three different characters, so each
+    coefficient gets a third of it.
+    """
+    rng = np.random.default_rng(seed)
+    samples = np.sort(rng.normal(0, noise, (n_samples, n_repeats)), axis=1)
+    offset = float(samples[:, :n_best].mean())
+    return EffortGrid(
+        {
+            hand: (chars, np.asarray(values, dtype=float) + offset / 3)
+            for hand, (chars, values) in efforts.efforts.items()
+        }
+    )
@@ -0,0 +1,24 @@
+from pathlib import Path
+
+import pytest
+
+from effort.config import read_config_file
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="session")
+def config_file() -> Path:
+    return ROOT / "effortconfig.yaml"
+
+
+@pytest.fixture(scope="session")
+def config(config_file) -> dict:
+    return read_config_file(config_file)
+
+
+@pytest.fixture(scope="session")
+def effort_grid(config):
+    from effort.grid import read_effort_file
+
+    return read_effort_file(ROOT / "effort-grid-estimates.txt", config)
@@ -0,0 +1,43 @@
+import pytest
+
+from effort.adaptive import AdaptiveRepetitions, is_adaptive
+from effort.online import OnlineEffortModel
+
+
+@pytest.fixture
+def adaptive(config):
+    return AdaptiveRepetitions(
+        {
+            **config,
+            "trigram_use_n_best": 2,
+            "trigram_repeat_times": 6,
+            "adaptive_tolerance": 0.01,
+        }
+    )
+
+
+def test_is_stable(adaptive):
+    assert adaptive.min_repeats == 3
+    # Not before min_repeats repetitions.
+    assert not adaptive.is_stable([0.5, 0.5])
+    # The mean of the two best timings did not change with the last one.
+    assert adaptive.is_stable([0.5, 0.5, 0.6])
+    # The last timing is a new best, changing the mean by 0.05.
+    assert not adaptive.is_stable([0.5, 0.5, 0.4])
+    assert adaptive.is_stable([0.5, 0.5, 0.4, 0.6])
+    # Always stopped at trigram_repeat_times.
+    assert adaptive.is_stable([0.1, 0.2, 0.3, 0.4, 0.5, 0.05])
+
+
+def test_pick_uncertain_char(config, adaptive):
+    model = OnlineEffortModel(config)
+    for char in model.chars["left"] + model.chars["right"]:
+        if char != "q":
+            model.update(char * 3, [0.5, 0.5])
+    finger, hand, char = adaptive.pick_uncertain_char(model)
+    assert (finger, hand, char) == ("pinky", "left", "q")
+
+
+def test_is_adaptive(config):
+    assert not is_adaptive(config)
+    assert is_adaptive({**config, "adaptive_repetitions": True})
@@ -0,0 +1,82 @@
+import csv
+
+import numpy as np
+import pytest
+
+from effort.batch import (
+    COLUMNS,
+    POOLED,
+    find_record_files,
+    get_table_rows,
+    run_batch,
+    write_table,
+)
+from effort.records import concat_records, save_text_records
+from effort.synthetic import generate_records, get_ground_truth
+
+CALCTYPES = ("model", "average")
+
+
+@pytest.fixture(scope="module")
+def records(config):
+    truth = get_ground_truth(config, seed=0)
+    return [generate_records(config, 1000, truth, seed=seed) for seed in (1, 2)]
+
+
+@pytest.fixture
+def record_files(records, tmp_path):
+    files = []
+    for i, r in enumerate(records):
+        file = tmp_path / f"records-{i}.txt"
+        save_text_records(r, file)
+        files.append(file)
+    return files
+
+
+def test_find_record_files(record_files, tmp_path):
+    (tmp_path / ".hidden").write_text("")
+    (tmp_path / "subdir").mkdir()
+    assert find_record_files([tmp_path]) == record_files
+    assert find_record_files([tmp_path / "*-1.txt", record_files[1]]) == [
+        record_files[1]
+    ]
+
+
+def test_run_batch_pools_the_records(config, records, record_files):
+    rows = run_batch(record_files, {"cfg": config}, CALCTYPES, n_jobs=1)
+    sources = list(dict.fromkeys(row[0] for row in rows))
+    assert sources == [str(f) for f in record_files] + [POOLED]
+
+    expected = get_table_rows(POOLED, "cfg", concat_records(records), config, CALCTYPES)
+    pooled = [row for row in rows if row[0] == POOLED]
+    assert [row[:5] for row in pooled] == [row[:5] for row in expected]
+    np.testing.assert_allclose(
+        [row[5:] for row in pooled], [row[5:] for row in expected]
+    )
+
+
+def test_run_batch_without_pooling_skips_bad_files(config, record_files, tmp_path):
+    bad = tmp_path / "empty.txt"
+    bad.write_text("")
+    rows = run_batch(
+        record_files + [bad], {"cfg": config}, CALCTYPES, pool=False, n_jobs=2
+    )
+    assert {row[0] for row in rows} == {str(f) for f in record_files}
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".npz"])
+def test_write_table(config, records, tmp_path, suffix):
+    rows = get_table_rows("a", "cfg", records[0], config, CALCTYPES)
+    file = tmp_path / f"table{suffix}"
+    write_table(rows, file)
+    if suffix == ".npz":
+        with np.load(file) as data:
+            assert data["char"].tolist() == [row[4] for row in rows]
+            assert data["count"].tolist() == [row[7] for row in rows]
+            np.testing.assert_allclose(data["seconds"], [row[6] for row in rows])
+    else:
+        with open(file, newline="") as f:
+            table = list(csv.reader(f))
+        assert tuple(table[0]) == COLUMNS
+        assert [r[4] for r in table[1:]] == [row[4] for row in rows]
+        assert len(table) == len(rows) + 1
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+
+from effort.cache import ResultCache, get_cache_key, is_cacheable
+from effort.calculate import calculate
+from effort.grid import EffortGrid
+from effort.records import save_text_records
+from effort.synthetic import generate_records, get_ground_truth
+
+GRID = EffortGrid(
+    {"left": ("ab", np.array([0.1, np.nan])), "right": ("c", np.array([0.3]))},
+    sample_sizes={"a": 3, "b": 0, "c": 5},
+)
+
+
+def test_put_and_get(tmp_path):
+    cache = ResultCache(tmp_path)
+    assert cache.get("key") is None
+    cache.put("key", "printed\n", GRID)
+    output, grid = cache.get("key")
+    assert output == "printed\n"
+    assert grid.sample_sizes == GRID.sample_sizes
+    for hand, (chars, values) in GRID.efforts.items():
+        assert grid.efforts[hand][0] == chars
+        np.testing.assert_array_equal(grid.efforts[hand][1], values)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(tmp_path)
+    for i, key in enumerate(("a", "b", "c")):
+        cache.put(key, "x" * 1000, GRID)
+        os.utime(tmp_path / f"{key}.npz", (i, i))
+    # Using an entry makes it the most recently used one.
+    assert cache.get("a") is not None
+    size = (tmp_path / "a.npz").stat().st_size
+    cache.max_bytes = 2 * size
+    cache.evict()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.npz", "c.npz"]
+
+
+def test_unwritable_cache(tmp_path, caplog):
+    not_a_directory = tmp_path / "file"
+    not_a_directory.write_text("")
+    cache = ResultCache(not_a_directory / "cache")
+    cache.put("key", "printed\n", GRID)
+    assert cache.get("key") is None
+    assert "Could not write the result cache" in caplog.text
+
+
+def test_cache_key(config, tmp_path):
+    file = tmp_path / "records.txt"
+    file.write_text("abc 0.5\n")
+    key = get_cache_key(file, config, "model", {"n_jobs": 1})
+    assert key == get_cache_key(file, config, "model", {"n_jobs": 4})
+    assert key != get_cache_key(file, config, "average", {})
+    assert key != get_cache_key(file, {**config, "trigram_use_n_best": 1}, "model", {})
+    file.write_text("abc 0.6\n")
+    assert key != get_cache_key(file, config, "model", {})
+    assert not is_cacheable("model", {"bootstrap": 100})
+    assert is_cacheable("model", {"bootstrap": 100, "seed": 1})
+
+
+def test_calculate_uses_cache(config, tmp_path, capsys):
+    file = tmp_path / "records.txt"
+    records = generate_records(config, 300, get_ground_truth(config, seed=0), seed=0)
+    save_text_records(records, file)
+    cache = ResultCache(tmp_path / "cache")
+
+    grid = calculate(file, config, "model", cache=cache)
+    printed = capsys.readouterr().out
+    assert len(list((tmp_path / "cache").glob("*.npz"))) == 1
+
+    cached = calculate(file, config, "model", cache=cache)
+    assert capsys.readouterr().out == printed
+    assert cached.as_dict() == grid.as_dict()
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from effort.calculate import (
+    get_average_grid,
+    get_char_timing_stats,
+    get_bootstrap_intervals,
+    get_model_grid,
+    read_xy_data,
+    show_model,
+)
+from effort.layout import compile_layout
+from effort.records import TrigramRecords, concat_records
+from effort.synthetic import generate_records, get_ground_truth
+
+
+@pytest.fixture(scope="module")
+def records(config):
+    return generate_records(config, 300, get_ground_truth(config, seed=0), seed=0)
+
+
+@pytest.fixture(scope="module")
+def with_bare_line(config, records):
+    """The records and a trigram without timings (a line with just "sdf")."""
+    bare = TrigramRecords(np.array(["sdf"]), np.zeros((1, 0)), np.zeros(1, dtype=int))
+    return concat_records([records, bare])
+
+
+def assert_same_grid(a, b):
+    for hand, (chars, values) in a.efforts.items():
+        assert b.efforts[hand][0] == chars
+        np.testing.assert_allclose(b.efforts[hand][1], values)
+
+
+def test_trigrams_without_timings_are_left_out(config, records, with_bare_line):
+    layout = compile_layout(config)
+    n_best = config["trigram_use_n_best"]
+    X, y, weights = read_xy_data(with_bare_line, n_best, layout, "left")
+    assert np.all(np.isfinite(y)) and np.all(weights > 0)
+    assert X.shape == read_xy_data(records, n_best, layout, "left")[0].shape
+
+    model = get_model_grid(with_bare_line, config)
+    assert all(np.all(np.isfinite(v)) for _, v in model.efforts.values())
+    assert_same_grid(get_model_grid(records, config), model)
+    assert_same_grid(
+        get_average_grid(records, config), get_average_grid(with_bare_line, config)
+    )
+
+    stats = get_char_timing_stats(with_bare_line, layout, "left", n_best)
+    expected = get_char_timing_stats(records, layout, "left", n_best)
+    np.testing.assert_array_equal(stats.count, expected.count)
+
+
+def test_show_model_prints_model_grid(config, records, capsys):
+    grid = show_model(records, config, bootstrap=200, seed=0, n_jobs=1)
+    assert_same_grid(get_model_grid(records, config), grid)
+    out = capsys.readouterr().out
+    assert out.count("CI: [") == len(grid.as_dict())
+
+    intervals = get_bootstrap_intervals(records, config, 200, seed=0, n_jobs=1)
+    for hand, (_, values) in grid.efforts.items():
+        low, high = intervals[hand]
+        assert np.all(low <= high)
+        # Most of the estimates are within their confidence intervals.
+        assert np.mean((low <= values) & (values <= high)) > 0.8
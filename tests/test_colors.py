@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from effort.colors import BAD_COLOR, get_hex_func, to_rgb, values_to_hex
+
+
+@pytest.mark.parametrize(
+    "color, rgb",
+    [
+        ("#ff0000", (1.0, 0.0, 0.0)),
+        ("#F00", (1.0, 0.0, 0.0)),
+        ("#00ff0080", (0.0, 1.0, 0.0)),
+        ("red", (1.0, 0.0, 0.0)),
+        ("Purple", (128 / 255, 0.0, 128 / 255)),
+        ("g", (0.0, 0.5, 0.0)),
+        ("0.25", (0.25, 0.25, 0.25)),
+    ],
+)
+def test_to_rgb(color, rgb):
+    assert to_rgb(color) == pytest.approx(rgb)
+
+
+@pytest.mark.parametrize("color", ["nope", "#12345", "#ggg", "1.5", ""])
+def test_to_rgb_invalid(color):
+    with pytest.raises(ValueError):
+        to_rgb(color)
+
+
+def test_values_to_hex():
+    colors = values_to_hex(
+        np.array([[0.0, 0.5], [1.0, np.nan]]), 0.0, 1.0, (1, 1, 1), (0, 0, 0)
+    )
+    assert colors.shape == (2, 2)
+    assert colors[0, 0] == "#ffffff"
+    assert colors[1, 0] == "#000000"
+    assert colors[1, 1] == BAD_COLOR
+    get_color = get_hex_func(0.0, 1.0, (1, 1, 1), (0, 0, 0))
+    assert [get_color(v) for v in (0.0, 0.5, 1.0)] == colors.ravel()[:3].tolist()
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from effort.compare import compare_records, show_comparison
+from effort.records import TrigramRecords, concat_records
+from effort.synthetic import generate_records, get_ground_truth
+
+MISSING = "q"
+
+
+def without_char(records: TrigramRecords, char: str) -> TrigramRecords:
+    keep = np.array([char not in trigram for trigram in records.trigrams.tolist()])
+    return TrigramRecords(
+        records.trigrams[keep], records.timings[keep], records.n_repeats[keep]
+    )
+
+
+@pytest.fixture(scope="module")
+def records(config):
+    truth = get_ground_truth(config, seed=0)
+    a = generate_records(config, 2000, truth, seed=1)
+    b = without_char(generate_records(config, 2000, truth, seed=2), MISSING)
+    return a, b
+
+
+@pytest.mark.parametrize("calctype", ["model", "average"])
+def test_missing_char_has_no_pvalue(config, records, calctype):
+    results = compare_records(
+        *records, config, calctype=calctype, n_permutations=200, seed=0, n_jobs=1
+    )
+    hand = next(hand for hand, r in results.items() if MISSING in r.chars)
+    result = results[hand]
+    i = result.chars.index(MISSING)
+    assert np.isfinite(result.effort_a[i])
+    assert np.isnan(result.effort_b[i])
+    assert np.isnan(result.pvalues[i])
+
+    tested = np.ones(len(result.chars), dtype=bool)
+    tested[i] = False
+    pvalues = result.pvalues[tested]
+    assert np.all((pvalues > 0) & (pvalues <= 1))
+    for other in results.values():
+        if other is not result:
+            assert np.all(np.isfinite(other.pvalues))
+
+
+def test_show_comparison_prints_na(config, records, capsys):
+    results = compare_records(*records, config, n_permutations=50, seed=0, n_jobs=1)
+    show_comparison(results)
+    lines = capsys.readouterr().out.splitlines()
+    line = next(line for line in lines if line.startswith(f"Char {MISSING}:"))
+    assert "B n/a" in line and "p=n/a" in line
+    assert sum("p=n/a" in line for line in lines) == 1
+
+
+@pytest.mark.parametrize("calctype", ["model", "average"])
+def test_permutations_without_char_count_as_extreme(config, calctype):
+    """MISSING is in one (slow) trigram of A and one of B, so about half of the
+    permutations leave it out of one group. Those must count as extreme."""
+
+    def with_one(records: TrigramRecords, extra: float) -> TrigramRecords:
+        has = np.array([MISSING in t for t in records.trigrams.tolist()])
+        one = np.flatnonzero(has)[:1]
+        return concat_records(
+            [
+                without_char(records, MISSING),
+                TrigramRecords(
+                    records.trigrams[one],
+                    records.timings[one] + extra,
+                    records.n_repeats[one],
+                ),
+            ]
+        )
+
+    truth = get_ground_truth(config, seed=0)
+    a = with_one(generate_records(config, 2000, truth, seed=1), 0.5)
+    b = with_one(generate_records(config, 2000, truth, seed=2), 0.0)
+    results = compare_records(
+        a, b, config, calctype=calctype, n_permutations=500, seed=0, n_jobs=1
+    )
+    result = next(r for r in results.values() if MISSING in r.chars)
+    assert result.pvalues[result.chars.index(MISSING)] > 0.4
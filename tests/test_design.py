@@ -0,0 +1,24 @@
+from effort.cli import effort_grid_design
+from effort.design import estimate_noise_variance
+from effort.records import save_text_records
+from effort.synthetic import generate_records, get_ground_truth
+
+
+def test_estimate_noise_variance(config):
+    records = generate_records(
+        config, 3000, get_ground_truth(config, seed=0), noise=0.02, seed=0
+    )
+    # The noise is estimated from the n_best fastest timings, so it is a bit
+    # smaller than the noise of all the timings.
+    sigma = estimate_noise_variance(records, config) ** 0.5
+    assert 0.01 < sigma < 0.02
+
+
+def test_design_with_records(config, config_file, tmp_path, capsys):
+    records = generate_records(config, 1000, get_ground_truth(config, seed=0), seed=0)
+    file = tmp_path / "records.txt"
+    save_text_records(records, file)
+    effort_grid_design(config_file, recordings=200, records=file, seed=0)
+    out = capsys.readouterr().out
+    assert out.startswith("Timing noise (std of a single timing):")
+    assert "Total recordings:" in out
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from effort.eventlog import (
+    PRESS_CODE,
+    RELEASE_CODE,
+    STATE_CODES,
+    EventLogWriter,
+    get_trial_timings,
+    read_event_log,
+)
+from effort.replay import generate_trial_events, replay_trial
+
+# A trial: the starting sequence "sdf", the trigram "abc" and the final
+# sequence "sdf" (one press and release for each key).
+KEYS = "sdfabcsdf"
+STATES = ["RECORDING_STARTING_SEQUENCE"] * 3 + ["RECORDING_TRIGRAM"] * 3
+STATES += ["RECORDING_FINAL_SEQUENCE"] * 3
+
+
+def write_trial(writer: EventLogWriter, start_ns: int, complete: bool = True):
+    trial = writer.new_trial()
+    keys = KEYS if complete else KEYS[:5]
+    for i, (char, state) in enumerate(zip(keys, STATES)):
+        t_ns = start_ns + i * 100_000_000
+        writer.add(trial, t_ns, PRESS_CODE, state, char, "abc")
+        writer.add(trial, t_ns + 50_000_000, RELEASE_CODE, state, char, "abc")
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_round_trip(tmp_path, mmap):
+    file = tmp_path / "events.bin"
+    # A small buffer, so that the events are written in several parts.
+    with EventLogWriter(file, buffer_size=4) as writer:
+        write_trial(writer, 0)
+        write_trial(writer, 10**9, complete=False)
+    # The events are appended to an existing log, continuing the trials.
+    with EventLogWriter(file) as writer:
+        assert writer.next_trial == 2
+        write_trial(writer, 2 * 10**9)
+        writer.add(writer.new_trial(), 3 * 10**9, PRESS_CODE, "NOT_STARTED", None, "")
+
+    events = read_event_log(file, mmap=mmap)
+    assert len(events) == 2 * 9 * 2 + 2 * 5 + 1
+    assert events["trial"].tolist() == [0] * 18 + [1] * 10 + [2] * 18 + [3]
+    assert "".join(chr(k) for k in events["key"][:18:2]) == KEYS
+    assert events["key"][-1] == 0
+    assert events["state"][-1] == STATE_CODES["NOT_STARTED"]
+    assert np.all(np.diff(events["t_ns"]) > 0)
+
+    trials, timings = get_trial_timings(events)
+    # From the release of the last "f" of the starting sequence to the
+    # release of the last "f" of the final sequence.
+    assert trials.tolist() == [0, 2]
+    np.testing.assert_allclose(timings, [0.6, 0.6])
+
+
+def test_read_other_file(tmp_path):
+    file = tmp_path / "records.txt"
+    file.write_text("abc 0.5\n")
+    with pytest.raises(ValueError):
+        read_event_log(file)
+
+
+def test_recorded_timings_match_log(tmp_path):
+    rng = np.random.default_rng(0)
+    file = tmp_path / "events.bin"
+    expected = []
+    with EventLogWriter(file) as writer:
+        for trigram in ("abc", "xyz", "abc"):
+            events, expected_ns = generate_trial_events(
+                trigram, "sdf", rng, error_rate=0.5
+            )
+            timing = replay_trial(events, trigram, "sdf", event_log=writer)
+            assert timing == expected_ns / 1e9
+            expected.append(timing)
+    _, timings = get_trial_timings(read_event_log(file))
+    assert timings.tolist() == expected
@@ -0,0 +1,65 @@
+import pytest
+
+from effort.journal import RecordingJournal, get_journal_file
+
+PLAN = [
+    {"char": "a", "hand": "left", "finger": "pinky", "trigrams": ["abc", "bca"]},
+    {"char": "k", "hand": "right", "finger": "middle", "trigrams": ["kjl"]},
+]
+
+
+def write_journal(file) -> None:
+    with RecordingJournal.create(file, [dict(item) for item in PLAN], 3) as journal:
+        journal.add(0, 0.25)
+        journal.add(0, 0.5)
+        journal.add(1, 0.125)
+        journal.stop(1)
+        journal.add_plan_item(
+            {"char": "j", "hand": "right", "finger": "index", "trigrams": ["jkl"]}
+        )
+        journal.add(3, 0.75)
+
+
+def test_resume(tmp_path):
+    file = get_journal_file(tmp_path / "records.txt")
+    assert file.name == "records.txt.journal"
+    write_journal(file)
+
+    with RecordingJournal.open(file) as journal:
+        assert journal.n_repeats == 3
+        assert journal.budget == 9
+        assert journal.completed == {0: [0.25, 0.5], 1: [0.125], 3: [0.75]}
+        assert journal.stopped == {1}
+        assert [t for _, _, t in journal.trigrams()] == ["abc", "bca", "kjl", "jkl"]
+        assert not journal.is_complete(0) and journal.is_complete(1)
+        assert journal.n_completed == 4
+        journal.add(0, 1.0)
+
+    with RecordingJournal.open(file) as journal:
+        assert journal.completed[0] == [0.25, 0.5, 1.0]
+        assert journal.is_complete(0)
+
+
+def test_resume_after_truncated_last_line(tmp_path):
+    file = tmp_path / "records.txt.journal"
+    write_journal(file)
+    with open(file, "a") as f:
+        # A crash in the middle of writing a repetition.
+        f.write("0 2 0.12")
+
+    with RecordingJournal.open(file) as journal:
+        assert journal.completed[0] == [0.25, 0.5]
+        journal.add(0, 0.375)
+    assert file.read_text().endswith("\n3 0 0.75\n0 2 0.375\n")
+
+    with RecordingJournal.open(file) as journal:
+        assert journal.completed[0] == [0.25, 0.5, 0.375]
+
+
+def test_repetition_out_of_order(tmp_path):
+    file = tmp_path / "records.txt.journal"
+    write_journal(file)
+    with open(file, "a") as f:
+        f.write("2 1 0.5\n")
+    with pytest.raises(ValueError):
+        RecordingJournal.open(file)
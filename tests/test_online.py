@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from effort.calculate import get_model_grid
+from effort.online import OnlineEffortModel
+from effort.synthetic import generate_records, get_ground_truth
+
+
+@pytest.fixture(scope="module")
+def records(config):
+    return generate_records(config, 1000, get_ground_truth(config, seed=0), seed=0)
+
+
+def assert_same_coefficients(a: dict, b: dict):
+    for hand, (chars, values) in a.items():
+        assert b[hand][0] == chars
+        np.testing.assert_allclose(b[hand][1], values, atol=1e-12)
+
+
+def test_update_matches_batch_fit(config, records):
+    expected = get_model_grid(records, config).efforts
+
+    batch = OnlineEffortModel(config)
+    batch.update_records(records)
+    assert_same_coefficients(expected, batch.coefficients())
+
+    online = OnlineEffortModel(config)
+    n_repeats = records.n_repeats.tolist()
+    for trigram, timings, n in zip(
+        records.trigrams.tolist(), records.timings.tolist(), n_repeats
+    ):
+        online.update(trigram, timings[:n])
+    assert online.n_trigrams == batch.n_trigrams == len(records)
+    assert_same_coefficients(expected, online.coefficients())
+
+
+def test_save_and_load(config, records, tmp_path):
+    model = OnlineEffortModel(config)
+    model.update_records(records)
+    file = tmp_path / "state.npz"
+    model.save(file)
+    assert [p.name for p in tmp_path.iterdir()] == ["state.npz"]
+
+    loaded = OnlineEffortModel.load(file, config)
+    assert loaded.n_trigrams == model.n_trigrams
+    assert_same_coefficients(model.coefficients(), loaded.coefficients())
+
+    with pytest.raises(ValueError):
+        OnlineEffortModel.load(file, {**config, "trigram_use_n_best": 1})
+
+
+def test_not_identified_without_data(config):
+    model = OnlineEffortModel(config)
+    assert not model.is_identified()
+    assert all(np.all(np.isinf(v)) for v in model.coefficient_variances().values())
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from effort.optimize import (
+    LayoutProblem,
+    anneal,
+    apply_swap,
+    get_finger_bigrams,
+    get_swap_delta,
+)
+from effort.score import CorpusCounts, get_layout_chars
+
+
+@pytest.fixture(scope="module")
+def problem(config, effort_grid):
+    chars = get_layout_chars(config)
+    rng = np.random.default_rng(0)
+    bigram_counts = rng.integers(0, 100, (len(chars), len(chars)))
+    counts = CorpusCounts(
+        chars, bigram_counts.sum(axis=1), bigram_counts, int(bigram_counts.sum())
+    )
+    return LayoutProblem(counts, effort_grid, config, sfb_penalty=2.0, fixed="123")
+
+
+def test_swap_delta_matches_cost(problem):
+    rng = np.random.default_rng(1)
+    keys = rng.permutation(len(problem.chars))
+    fingers = problem.key_finger[keys]
+    F = get_finger_bigrams(problem, fingers)
+    delta = get_swap_delta(problem, keys, fingers, F)
+    for _ in range(200):
+        a, b = rng.choice(len(problem.chars), 2, replace=False)
+        cost = problem.cost(keys)
+        d = delta(a, b)
+        apply_swap(problem, keys, fingers, F, a, b)
+        assert problem.cost(keys) - cost == pytest.approx(d, abs=1e-12)
+        # F is kept up to date by apply_swap.
+        np.testing.assert_allclose(F, get_finger_bigrams(problem, fingers))
+
+
+def test_anneal_keeps_fixed_and_home_keys(config, problem):
+    cost, keys = anneal(problem, 5000, seed=0)
+    assert cost == pytest.approx(problem.cost(keys))
+    assert sorted(keys) == list(range(len(problem.chars)))
+    kept = "123" + config["home_key_sequence_left"] + config["home_key_sequence_right"]
+    for i, char in enumerate(problem.chars):
+        if char in kept:
+            assert keys[i] == i
+    layout = problem.to_config(keys)
+    for hand in ("left", "right"):
+        for finger, chars in config[hand].items():
+            for char in kept:
+                assert (char in chars) == (char in layout[hand][finger])
+
+
+def test_too_few_movable_chars(config, problem, effort_grid):
+    counts = CorpusCounts(
+        problem.chars,
+        np.ones(len(problem.chars)),
+        np.zeros((len(problem.chars),) * 2),
+        len(problem.chars),
+    )
+    with pytest.raises(ValueError):
+        LayoutProblem(counts, effort_grid, config, fixed=problem.chars[1:])
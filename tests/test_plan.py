@@ -0,0 +1,140 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from effort.plan import (
+    PROVENANCE_COLUMNS,
+    create_plan,
+    get_plan_trigrams,
+    get_shard,
+    load_plan,
+    merge_shards,
+    partition_plan,
+    save_plan,
+)
+from effort.records import (
+    TrigramRecords,
+    load_binary_columns,
+    load_records,
+    save_text_records,
+)
+
+N_SHARDS = 3
+
+
+def shard_trigrams(shard: list[dict]) -> list[str]:
+    return [trigram for item in shard for trigram in item["trigrams"]]
+
+
+def fingers(shard: list[dict]) -> set[tuple[str, str]]:
+    return {(item["hand"], item["finger"]) for item in shard if item["trigrams"]}
+
+
+@pytest.fixture(scope="module")
+def plan(config):
+    return create_plan(config, n_shards=N_SHARDS, seed=1)
+
+
+def test_create_plan_is_reproducible(config, plan):
+    assert create_plan(config, n_shards=N_SHARDS, seed=1) == plan
+    assert create_plan(config, n_shards=N_SHARDS, seed=2) != plan
+
+
+def test_partition_plan(config, plan):
+    (whole,) = create_plan(config, n_shards=1, seed=1)["shards"]
+    shards = plan["shards"]
+    assert len(shards) == N_SHARDS
+
+    # Every trigram of the plan is in exactly one shard.
+    sharded = Counter(t for shard in shards for t in shard_trigrams(shard))
+    assert sharded == Counter(shard_trigrams(whole))
+    sizes = [len(shard_trigrams(shard)) for shard in shards]
+    assert max(sizes) - min(sizes) <= 1
+    for shard in shards:
+        assert fingers(shard) == fingers(whole)
+        # The recording order of the plan is kept.
+        order = {t: i for i, t in enumerate(shard_trigrams(whole))}
+        assert sorted(shard_trigrams(shard), key=order.get) == shard_trigrams(shard)
+
+
+def test_partition_plan_too_many_shards(config):
+    (whole,) = create_plan(config, n_shards=1, seed=1)["shards"]
+    with pytest.raises(ValueError):
+        partition_plan(whole, len(shard_trigrams(whole)) + 1)
+
+
+def test_save_and_get_shard(config, plan, tmp_path):
+    file = tmp_path / "plan.json"
+    save_plan(plan, file)
+    assert load_plan(file) == plan
+    assert get_shard(plan, 1, config) == plan["shards"][1]
+    with pytest.raises(ValueError):
+        get_shard(plan, N_SHARDS, config)
+    with pytest.raises(ValueError):
+        get_shard(plan, 0, {**config, "trigram_repeat_times": 99})
+
+
+def record_shard(plan: dict, shard: int, file, extra=()) -> TrigramRecords:
+    """Records of the trigrams of a shard (and the extra trigrams) with
+    made up timings."""
+    trigrams = shard_trigrams(plan["shards"][shard]) + list(extra)
+    n = len(trigrams)
+    records = TrigramRecords(
+        np.array(trigrams),
+        np.arange(n * 2, dtype=float).reshape(n, 2) / 1000,
+        np.full(n, 2),
+    )
+    save_text_records(records, file)
+    return records
+
+
+def test_merge_shards(plan, tmp_path):
+    files = [tmp_path / f"shard-{shard}.txt" for shard in range(N_SHARDS)]
+    # Not in the order of the shards, and with a trigram added during the
+    # recording to the last file.
+    order = [2, 0, 1]
+    for shard in order:
+        extra = ["###"] if shard == order[-1] else ()
+        record_shard(plan, shard, files[shard], extra)
+    output = tmp_path / "merged.bin"
+    counts = merge_shards(plan, [files[s] for s in order], output)
+
+    planned = get_plan_trigrams(plan)
+    for shard in range(N_SHARDS):
+        n = len(shard_trigrams(plan["shards"][shard]))
+        assert counts[shard] == (n, n)
+
+    merged = load_records(output)
+    columns = load_binary_columns(output, PROVENANCE_COLUMNS)
+    assert len(merged) == len(planned) + 1
+    for trigram, shard, plan_index, source in zip(
+        merged.trigrams.tolist(),
+        columns["shard"].tolist(),
+        columns["plan_index"].tolist(),
+        columns["source"].tolist(),
+    ):
+        assert source == str(files[shard])
+        if trigram == "###":
+            assert (shard, plan_index) == (order[-1], -1)
+        else:
+            assert (shard, plan_index) == planned[trigram]
+
+
+def test_merge_shards_errors(plan, tmp_path):
+    a, b = tmp_path / "a.txt", tmp_path / "b.txt"
+    record_shard(plan, 0, a)
+    record_shard(plan, 0, b)
+    with pytest.raises(ValueError, match="both recordings of shard 0"):
+        merge_shards(plan, [a, b], tmp_path / "merged.bin")
+
+    mixed = TrigramRecords(
+        np.array(
+            [shard_trigrams(plan["shards"][0])[0], shard_trigrams(plan["shards"][1])[0]]
+        ),
+        np.ones((2, 1)),
+        np.ones(2, dtype=int),
+    )
+    save_text_records(mixed, b)
+    with pytest.raises(ValueError, match="trigrams of shards"):
+        merge_shards(plan, [b], tmp_path / "merged.bin")
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from effort.records import (
+    TrigramRecords,
+    convert_record_file,
+    is_binary_record_file,
+    load_binary_columns,
+    load_records,
+    parse_records,
+    save_binary_records,
+)
+
+TEXT = "abc 0.25 0.5 1e-1\nxyz 0.125\n\n ÄÖü 0.75 2\n"
+
+
+def assert_same_records(a: TrigramRecords, b: TrigramRecords):
+    assert a.trigrams.tolist() == b.trigrams.tolist()
+    np.testing.assert_array_equal(a.n_repeats, b.n_repeats)
+    np.testing.assert_array_equal(a.timings, b.timings)
+
+
+def test_parse_records():
+    records = parse_records(TEXT)
+    assert records.trigrams.tolist() == ["abc", "xyz", "ÄÖü"]
+    assert records.n_repeats.tolist() == [3, 1, 2]
+    np.testing.assert_array_equal(
+        records.timings,
+        [[0.25, 0.5, 0.1], [0.125, np.nan, np.nan], [0.75, 2.0, np.nan]],
+    )
+    assert_same_records(parse_records(TEXT.encode()), records)
+
+
+def test_parse_records_rejects_non_numbers():
+    with pytest.raises(ValueError):
+        parse_records("abc 0.25 x\n")
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_binary_round_trip(tmp_path, mmap):
+    text_file = tmp_path / "records.txt"
+    text_file.write_text(TEXT)
+    binary_file = tmp_path / "records.bin"
+    convert_record_file(text_file, binary_file)
+    assert is_binary_record_file(binary_file)
+    assert not is_binary_record_file(text_file)
+    assert_same_records(load_records(binary_file, mmap=mmap), load_records(text_file))
+
+    back = tmp_path / "back.txt"
+    convert_record_file(binary_file, back)
+    assert_same_records(load_records(back), load_records(text_file))
+
+
+def test_binary_extra_columns(tmp_path):
+    records = parse_records(TEXT)
+    file = tmp_path / "records.bin"
+    save_binary_records(
+        records,
+        file,
+        extra_columns={"shard": np.array([0, 1, 0])},
+        metadata={"seed": 1},
+    )
+    assert_same_records(load_records(file), records)
+    assert load_binary_columns(file, ["shard"])["shard"].tolist() == [0, 1, 0]
+    with pytest.raises(ValueError):
+        save_binary_records(records, file, extra_columns={"shard": np.zeros(2)})
@@ -0,0 +1,79 @@
+import csv
+import io
+import json
+
+import numpy as np
+import pytest
+
+from effort.calculate import get_average_grid, get_model_grid
+from effort.records import save_text_records
+from effort.report import format_table, get_effort_grids, show_report
+from effort.synthetic import generate_records, get_ground_truth
+
+
+@pytest.fixture(scope="module")
+def records(config):
+    return generate_records(config, 2000, get_ground_truth(config, seed=0), seed=1)
+
+
+@pytest.fixture(scope="module")
+def grids(records, config):
+    return get_effort_grids(records, config)
+
+
+def test_grids_match_single_calctypes(records, config, grids):
+    expected = {
+        "model": get_model_grid(records, config),
+        "average": get_average_grid(records, config),
+        "average-center": get_average_grid(records, config, center=True),
+    }
+    assert list(grids) == list(expected)
+    for calctype, grid in expected.items():
+        assert grids[calctype].chars == grid.chars
+        np.testing.assert_allclose(grids[calctype].values, grid.values)
+
+
+def test_csv_and_json_have_the_same_rows(grids):
+    rows = list(csv.DictReader(io.StringIO(format_table(grids, "csv"))))
+    data = json.loads(format_table(grids, "json"))
+    assert set(data["scale"]) == set(grids)
+    assert len(rows) == len(data["rows"]) == len(grids["model"].chars)
+    for row, item in zip(rows, data["rows"]):
+        assert row["char"] == item["char"]
+        for calctype in grids:
+            assert int(row[f"{calctype}_count"]) == item[f"{calctype}_count"]
+            if item[calctype] is None:
+                assert row[calctype] == "nan"
+            else:
+                assert float(row[calctype]) == pytest.approx(item[calctype])
+
+
+def test_text_format(grids):
+    lines = format_table(grids, "text").splitlines()
+    assert lines[0].startswith("Effort scale: model:")
+    assert lines[2].split() == [
+        "hand",
+        "char",
+        "model",
+        "model_count",
+        "average",
+        "average_count",
+        "average-center",
+        "average-center_count",
+    ]
+    assert len(lines) == 3 + len(grids["model"].chars)
+
+
+def test_unknown_format_and_calctype(records, config, grids):
+    with pytest.raises(ValueError):
+        format_table(grids, "xml")
+    with pytest.raises(ValueError):
+        get_effort_grids(records, config, ["median"])
+
+
+def test_show_report_writes_output_file(records, config, grids, tmp_path):
+    record_file = tmp_path / "records.txt"
+    save_text_records(records, record_file)
+    output_file = tmp_path / "report.csv"
+    show_report(record_file, config, fmt="csv", output_file=output_file)
+    assert output_file.read_text() == format_table(grids, "csv")
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from effort import score
+from effort.score import count_corpus, get_layout_chars, score_files
+
+TEXT = "Hello, wörld!\nThe quick brown fox jumps over the lazy dog.\nÖljy 1234 §\n"
+
+
+def count_naive(text: str, chars: str):
+    index = {}
+    for i, char in enumerate(chars):
+        index[char] = index[char.upper()] = i
+    char_counts = np.zeros(len(chars), dtype=int)
+    bigram_counts = np.zeros((len(chars), len(chars)), dtype=int)
+    previous = None
+    for char in text:
+        i = index.get(char)
+        if i is not None:
+            char_counts[i] += 1
+            if previous is not None:
+                bigram_counts[previous, i] += 1
+        previous = i
+    return char_counts, bigram_counts
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_count_corpus(config, tmp_path, monkeypatch, n_jobs):
+    # Small chunks and parts, so that bigrams and UTF-8 characters are split
+    # between the chunks and the files are counted in several parts.
+    monkeypatch.setattr(score, "CHUNK_SIZE", 7)
+    monkeypatch.setattr(score, "MIN_PART_SIZE", 16)
+    files = [tmp_path / "a.txt", tmp_path / "b.txt"]
+    for file in files:
+        file.write_text(TEXT * 5, encoding="utf-8")
+
+    chars = get_layout_chars(config)
+    counts = count_corpus(files, chars, n_jobs=n_jobs)
+    char_counts, bigram_counts = count_naive(TEXT * 10, chars)
+    assert counts.n_total == len(TEXT) * 10
+    np.testing.assert_array_equal(counts.char_counts, char_counts)
+    np.testing.assert_array_equal(counts.bigram_counts, bigram_counts)
+
+
+def test_score_files(config, effort_grid, tmp_path, capsys):
+    file = tmp_path / "text.txt"
+    file.write_text("ff fr\n")
+    score_files([file], effort_grid, config, n_jobs=1)
+    out = capsys.readouterr().out
+    efforts = effort_grid.as_dict()
+    assert "Characters: 6 (on the keys: 4)" in out
+    assert f"Total effort: {3 * efforts['f'] + efforts['r']:.1f}" in out
+    # "ff" repeats a key and "fr" is a same finger bigram.
+    assert "Same finger bigrams: 1 (50.00% of 2 bigrams)" in out
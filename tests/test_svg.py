@@ -0,0 +1,71 @@
+import re
+
+import numpy as np
+import pytest
+
+from effort.colors import BAD_COLOR
+from effort.grid import EffortGrid
+from effort.svg import get_key_positions, render_svg, render_svgs, write_svgs
+
+WHITE = (1.0, 1.0, 1.0)
+BLACK = (0.0, 0.0, 0.0)
+
+
+def get_fills(svg: str) -> dict[str, str]:
+    """Maps each key of the heatmap to its fill color."""
+    keys = re.findall(
+        r'<rect x="[^"]*" y="[^"]*" width="\d+" height="\d+" rx="4" fill="([^"]*)"[^>]*/>'
+        r'<text [^>]*font-size="14"[^>]*>([^<]*)</text>',
+        svg,
+    )
+    return {char: fill for fill, char in keys}
+
+
+@pytest.fixture
+def grid():
+    return EffortGrid(
+        {
+            "left": ("asdf", np.array([1.0, 2.0, 3.0, np.nan])),
+            "right": ("jkl", np.array([1.5, 2.5, 2.0])),
+        }
+    )
+
+
+def test_render_svg(grid):
+    svg = render_svg(grid, title="a & b", min_color=WHITE, max_color=BLACK)
+    assert svg.startswith("<svg ") and svg.endswith("</svg>\n")
+    assert "a &amp; b" in svg
+    fills = get_fills(svg)
+    assert set(fills) == set(get_key_positions())
+    assert fills["a"] == "#ffffff"
+    assert fills["d"] == "#000000"
+    assert fills["f"] == BAD_COLOR
+    assert fills["q"] == BAD_COLOR
+
+
+def test_common_scale(grid):
+    doubled = EffortGrid(
+        {hand: (chars, 2 * values) for hand, (chars, values) in grid.efforts.items()}
+    )
+    grids = {"a": grid, "b": EffortGrid({"left": ("as", np.array([1.0, 6.0]))})}
+    own = render_svgs(grids, min_color=WHITE, max_color=BLACK)
+    common = render_svgs(grids, common_scale=True, min_color=WHITE, max_color=BLACK)
+    assert get_fills(own["a"])["d"] == "#000000"
+    assert get_fills(common["a"])["d"] != "#000000"
+    assert get_fills(common["b"])["s"] == "#000000"
+    # The normalized efforts do not depend on the unit of the grid.
+    assert render_svgs({"a": doubled}) == render_svgs({"a": grid})
+
+
+def test_write_svgs(grid, tmp_path):
+    svgs = render_svgs({"dir1/x.txt": grid, "y.txt": grid})
+    files = write_svgs(svgs, tmp_path / "out")
+    assert files == [tmp_path / "out" / "x.svg", tmp_path / "out" / "y.svg"]
+    assert files[0].read_text() == svgs["dir1/x.txt"]
+
+
+def test_write_svgs_name_collision(grid, tmp_path):
+    svgs = render_svgs({"dir1/x.txt": grid, "dir2/x.txt": grid})
+    with pytest.raises(ValueError):
+        write_svgs(svgs, tmp_path / "out")
+    assert not (tmp_path / "out").exists()